@@ -5,20 +5,73 @@ Main script for analyzing Google Forms text data with spaCy
 import os
 import sys
 import argparse
+import contextlib
+from collections import Counter
 import pandas as pd
 
 # Add src directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from src.data_loader import load_data, preprocess_dataframe, save_results
-from src.text_analyzer import TextAnalyzer
-from src.visualizer import (plot_word_frequency, create_wordcloud, 
-                           plot_entity_distribution, plot_multiple_statistics,
-                           save_plot)
+from src.data_loader import (load_data, read_header, iter_chunks, preprocess_dataframe, save_results,
+                             find_near_duplicates, detect_timestamp_format, ResultWriter,
+                             EXPORT_FORMATS, NEAR_DUPLICATE_MODES)
+from src import metrics
+from src.entity_buffer import EntityBuffer
+from src.time_windows import WINDOW_FREQUENCIES
+from src.incremental import load_state, save_state, filter_new_rows, merge_word_counts
+from src.visualizer import (plot_word_frequency, create_wordcloud, wordcloud_image,
+                           plot_entity_distribution, plot_multiple_statistics, plot_time_series,
+                           PlotJob, PLOT_MODES, render_plots, save_plot_jobs)
 import config
 
 
-def main(input_file: str, text_column: str = None, output_prefix: str = "analysis"):
+def plot_jobs(output_prefix: str, top_words, entity_counts: pd.Series,
+              stats_df: pd.DataFrame, series_df: pd.DataFrame = None):
+    """
+    Plots created at the end of an analysis.
+    
+    Args:
+        output_prefix: Prefix for output files
+        top_words: List of (word, count) tuples
+        entity_counts: Number of entities per label (may be empty)
+        stats_df: DataFrame with text statistics
+        series_df: Time series of the responses per window (optional)
+    
+    Returns:
+        List of PlotJob objects, independent of each other
+    """
+    jobs = []
+    
+    if top_words:
+        jobs.append(PlotJob(plot_word_frequency, (top_words, "Most Frequent Words"),
+                            f"{output_prefix}_word_frequency"))
+        if config.WORDCLOUD_DIRECT:
+            jobs.append(PlotJob(wordcloud_image, (top_words, config.WORDCLOUD_PREVIEW),
+                                f"{output_prefix}_wordcloud"))
+        else:
+            jobs.append(PlotJob(create_wordcloud, (top_words, "Word Cloud", config.WORDCLOUD_PREVIEW),
+                                f"{output_prefix}_wordcloud"))
+    
+    if not entity_counts.empty:
+        jobs.append(PlotJob(plot_entity_distribution, (entity_counts,),
+                            f"{output_prefix}_entities"))
+    
+    # Only the plotted columns are sent to the rendering processes
+    jobs.append(PlotJob(plot_multiple_statistics, (stats_df.drop(columns='text_id', errors='ignore'),),
+                        f"{output_prefix}_statistics"))
+    
+    if series_df is not None and not series_df.empty:
+        jobs.append(PlotJob(plot_time_series, (series_df,), f"{output_prefix}_time_series"))
+    
+    return jobs
+
+
+def main(input_file: str, text_column: str = None, output_prefix: str = "analysis",
+         workers: int = None, use_cache: bool = None, incremental: bool = False,
+         chunksize: int = None, stats_only: bool = False, fast_stats: bool = False,
+         plots: str = None, export_format: str = None, phrases: bool = None,
+         group_by: str = None, near_duplicates: str = None, clusters: int = None,
+         time_window: str = None):
     """
     Main analysis function.
     
@@ -26,6 +79,36 @@ def main(input_file: str, text_column: str = None, output_prefix: str = "analysi
         input_file: Path to input CSV/Excel file
         text_column: Name of the column containing text responses
         output_prefix: Prefix for output files
+        workers: Number of spaCy worker processes (uses config default if None)
+        use_cache: Whether to reuse cached parsed docs (uses config default if None)
+        incremental: Only analyze rows not seen by earlier incremental runs and
+            merge them into the existing outputs
+        chunksize: Stream the input in chunks of this many rows, writing
+            results as each chunk finishes (None loads the whole file)
+        stats_only: Only compute per-text statistics, running just the
+            pipeline components they need
+        fast_stats: Compute statistics with the tokenizer and a rule-based
+            sentencizer only (implies stats_only; no entity counts)
+        plots: How to render plots: 'parallel', 'serial', 'defer' (store
+            them for `python -m src.visualizer`) or 'skip' (uses config
+            default if None)
+        export_format: Format of the result tables, e.g. 'csv' or 'parquet'
+            (uses config default if None)
+        phrases: Also count frequent n-grams and noun chunks (uses config
+            default if None)
+        group_by: Column whose values group the responses (the timestamp
+            column groups them by day); the distinctive keywords of each
+            group are saved
+        near_duplicates: 'flag' or 'collapse' clusters of near-identical
+            responses before analyzing them (uses config default if None;
+            with chunksize, clusters are found within each chunk)
+        clusters: Group the responses into this many topic clusters from
+            their document vectors, which are saved as a memory-mapped
+            matrix for similar-response queries (uses config default if None)
+        time_window: Aggregate statistics, top lemmas and entities per
+            'hour', 'day' or 'week' of the timestamp column into a time
+            series (uses config default if None; with incremental, open
+            windows are continued by later runs)
     """
     print("=" * 60)
     print("Google Forms Text Analysis with spaCy")
@@ -34,102 +117,290 @@ def main(input_file: str, text_column: str = None, output_prefix: str = "analysi
     # Ensure output directory exists
     os.makedirs(config.OUTPUT_DIR, exist_ok=True)
     
-    # Load data
-    print(f"\n1. Loading data from: {input_file}")
-    df = load_data(input_file)
-    print(f"   Loaded {len(df)} rows and {len(df.columns)} columns")
-    print(f"   Columns: {df.columns.tolist()}")
-    
-    # Preprocess
-    print("\n2. Preprocessing data...")
-    df_clean = preprocess_dataframe(df, text_column)
-    print(f"   {len(df_clean)} rows after cleaning")
-    
-    # Get text column
     if text_column is None:
         text_column = config.TEXT_COLUMN
+    if export_format is None:
+        export_format = config.EXPORT_FORMAT
+    if phrases is None:
+        phrases = config.PHRASE_ANALYSIS
+    if near_duplicates is None:
+        near_duplicates = config.NEAR_DUPLICATES
+    if clusters is None:
+        clusters = config.NUM_CLUSTERS
+    if time_window is None:
+        time_window = config.TIME_WINDOW
     
-    if text_column not in df_clean.columns:
-        print(f"\nError: Column '{text_column}' not found!")
-        print(f"Available columns: {df_clean.columns.tolist()}")
+    if incremental and export_format != 'csv':
+        print(f"\nError: incremental runs append to csv outputs, not {export_format}")
         return
     
-    texts = df_clean[text_column].tolist()
+    if group_by and (incremental or stats_only or fast_stats):
+        print("\nError: --group-by needs word counts over every row (not with --incremental or --stats-only)")
+        return
     
-    # Initialize analyzer
+    if clusters and (stats_only or fast_stats):
+        print("\nError: --clusters needs lemmas and word vectors (not with --stats-only)")
+        return
+    
+    if time_window and (stats_only or fast_stats):
+        print("\nError: --time-window needs lemmas and entities (not with --stats-only)")
+        return
+    
+    if chunksize:
+        # Stream the file so memory is bounded by the chunk size
+        print(f"\n1. Streaming data from: {input_file} ({chunksize} rows per chunk)")
+        print("\n2. Preprocessing data chunk by chunk...")
+        columns = None
+        if group_by or time_window:
+            available, _ = read_header(input_file)
+            for column in (group_by, config.TIMESTAMP_COLUMN if time_window else None):
+                if column and column not in available:
+                    print(f"\nError: Column '{column}' not found!")
+                    print(f"Available columns: {available.tolist()}")
+                    return
+        if group_by:
+            columns = [column for column in available
+                       if column in (text_column, config.ID_COLUMN, config.TIMESTAMP_COLUMN, group_by)]
+        chunks = iter_chunks(input_file, text_column, chunksize, columns=columns)
+    else:
+        # Load data
+        print(f"\n1. Loading data from: {input_file}")
+        df = load_data(input_file)
+        print(f"   Loaded {len(df)} rows and {len(df.columns)} columns")
+        print(f"   Columns: {df.columns.tolist()}")
+        
+        # Preprocess
+        print("\n2. Preprocessing data...")
+        df_clean = preprocess_dataframe(df, text_column)
+        print(f"   {len(df_clean)} rows after cleaning")
+        
+        if text_column not in df_clean.columns:
+            print(f"\nError: Column '{text_column}' not found!")
+            print(f"Available columns: {df_clean.columns.tolist()}")
+            return
+        
+        for column in (group_by, config.TIMESTAMP_COLUMN if time_window else None):
+            if column and column not in df_clean.columns:
+                print(f"\nError: Column '{column}' not found!")
+                print(f"Available columns: {df_clean.columns.tolist()}")
+                return
+        
+        chunks = [df_clean]
+    
+    state = load_state(output_prefix, text_column) if incremental else None
+    # Earlier incremental runs already wrote text_ids below this value
+    start_id = state['num_texts'] if state else 0
+    next_id = start_id
+    
+    embeddings = None
+    if clusters:
+        from src.embeddings import EmbeddingWriter, load_embeddings, cluster_responses
+        # Vectors of earlier incremental runs are kept and clustered again with the new ones
+        try:
+            embeddings = EmbeddingWriter(f"{output_prefix}_embeddings", append=start_id > 0)
+        except ValueError as error:
+            print(f"\nError: {error}")
+            return
+        if embeddings.rows != start_id:
+            print(f"\nError: {embeddings.path} has {embeddings.rows} rows for {start_id} earlier texts; "
+                  "run once without --incremental to cluster every response")
+            return
+    
+    # Initialize analyzer (spaCy is only imported here, and the model is
+    # loaded when the first chunk is parsed)
     print(f"\n3. Initializing spaCy with model: {config.SPACY_MODEL}")
-    analyzer = TextAnalyzer()
+    from src.text_analyzer import TextAnalyzer, ALL_OUTPUTS
+    analyzer = TextAnalyzer(n_process=workers, use_cache=use_cache)
     
     # Perform analysis
     print("\n4. Analyzing texts...")
     
-    # Get statistics
-    print("   - Computing text statistics...")
-    stats_df = analyzer.get_sentiment_statistics(texts)
-    
-    # Get top words
-    print("   - Extracting top words...")
-    top_words = analyzer.get_top_words(texts, n=30)
+    stats_only = stats_only or fast_stats
+    outputs = ['statistics'] if stats_only else list(ALL_OUTPUTS)
+    if phrases and not stats_only:
+        outputs.append('phrases')
+    if embeddings is not None:
+        outputs.append('embeddings')
+    # Rare phrases can only be dropped early when one parse sees every text
+    phrase_min_count = config.NGRAM_MIN_COUNT if not chunksize and state is None else 1
+    word_counts = {}
+    phrase_counts = {}
+    keywords = None
+    # Detected on the first chunk so every chunk reads timestamps the same way
+    timestamp_format = None
+    if group_by:
+        from src.keywords import KeywordScorer, group_labels
+        keywords = KeywordScorer()
+    windows = None
+    if time_window:
+        from src.time_windows import WindowAggregator, series_frame
+        windows = WindowAggregator(time_window)
+        if state is not None and not windows.load_state(state.get('time_windows')) and start_id > 0:
+            print(f"   Earlier runs kept no {time_window} windows; the time series starts with the new rows")
+    near_duplicate_clusters = []
+    # Per-row results are written as each chunk finishes; entity rows are
+    # buffered as typed arrays and written once the buffer is full
+    stats_writer = ResultWriter(f"{output_prefix}_statistics", export_format, append=start_id > 0)
+    entities = EntityBuffer(f"{output_prefix}_entities", export_format, append=start_id > 0)
     
-    # Get top nouns
-    print("   - Extracting top nouns...")
-    top_nouns = analyzer.get_top_words(texts, n=30, pos_filter=['NOUN'])
+    for chunk in chunks:
+        if state is not None:
+            chunk = filter_new_rows(chunk, state, text_column)
+            print(f"   {len(chunk)} new rows since the last run")
+        
+        if near_duplicates and len(chunk):
+            chunk, dup_rows = find_near_duplicates(chunk, text_column, near_duplicates)
+            if not dup_rows.empty:
+                near_duplicate_clusters.append(dup_rows)
+                action = "kept once" if near_duplicates == 'collapse' else "flagged"
+                print(f"   - {len(dup_rows)} near-duplicate responses in "
+                      f"{dup_rows['cluster'].nunique()} clusters {action}")
+        
+        texts = chunk[text_column].tolist()
+        if not texts:
+            continue
+        
+        # Parse the corpus once and derive every output from the same docs
+        if stats_only:
+            print("   - Computing statistics...")
+        else:
+            print("   - Computing statistics, top words and named entities...")
+        results = analyzer.analyze_corpus(texts, pos_filters=config.POS_FILTERS, start_id=next_id,
+                                          outputs=outputs, fast=fast_stats, entity_buffer=entities,
+                                          min_count=phrase_min_count, embedding_writer=embeddings)
+        stats_df = results['statistics']
+        store = results['store']
+        if store.num_docs < len(store):
+            print(f"   - {len(store) - store.num_docs} duplicate texts parsed once "
+                  f"({store.duplicate_ratio:.1%} of {len(store)})")
+        
+        for name, counts in results.get('word_counts', {}).items():
+            if name in word_counts:
+                word_counts[name].update(counts)
+            else:
+                word_counts[name] = counts
+        if keywords is not None:
+            if group_by == config.TIMESTAMP_COLUMN and timestamp_format is None:
+                timestamp_format = detect_timestamp_format(chunk[group_by])
+            keywords.add(store, group_labels(chunk[group_by], group_by, timestamp_format))
+        if windows is not None:
+            windows.add(store, chunk[config.TIMESTAMP_COLUMN])
+        
+        for name, counts in results.get('phrases', {}).items():
+            if name in phrase_counts:
+                phrase_counts[name].update(counts)
+            else:
+                phrase_counts[name] = counts
+        
+        # Save per-row results as each chunk finishes
+        print("   - Saving statistics and entities...")
+        stats_output = pd.concat([chunk.reset_index(drop=True),
+                                  stats_df.reset_index(drop=True)], axis=1)
+        stats_writer.write(stats_output)
+        
+        next_id += len(texts)
     
-    # Get top verbs
-    print("   - Extracting top verbs...")
-    top_verbs = analyzer.get_top_words(texts, n=30, pos_filter=['VERB'])
+    stats_writer.close()
+    entities.close()
+    if embeddings is not None:
+        embeddings.close()
     
-    # Extract entities
-    print("   - Extracting named entities...")
-    entities_df = analyzer.extract_entities(texts)
+    if near_duplicate_clusters:
+        save_results(pd.concat(near_duplicate_clusters, ignore_index=True),
+                     f"{output_prefix}_near_duplicates", format=export_format, append=start_id > 0)
+    entity_counts = entities.label_counts
     
-    # Save results
-    print("\n5. Saving results...")
+    if next_id == start_id:
+        print("\nNo new rows to analyze.")
+        return
     
-    # Save statistics
-    stats_output = df_clean.copy()
-    stats_output = pd.concat([stats_output.reset_index(drop=True), 
-                             stats_df.reset_index(drop=True)], axis=1)
-    save_results(stats_output, f"{output_prefix}_statistics", format='csv')
+    if state is not None:
+        # Phrase counts are kept in the state next to the word counts
+        phrase_names = set(phrase_counts)
+        word_counts = merge_word_counts(state, {**word_counts, **phrase_counts})
+        phrase_counts = {name: counts for name, counts in word_counts.items() if name in phrase_names}
+        state['num_texts'] = next_id
+        if windows is not None:
+            state['time_windows'] = windows.to_state()
+        save_state(state, output_prefix)
     
-    # Save entities
-    if not entities_df.empty:
-        save_results(entities_df, f"{output_prefix}_entities", format='csv')
+    top_words, top_nouns, top_verbs = [word_counts.get(name, Counter()).most_common(config.TOP_N)
+                                       for name in ('words', 'nouns', 'verbs')]
     
-    # Save word frequencies
-    words_df = pd.DataFrame(top_words, columns=['word', 'frequency'])
-    save_results(words_df, f"{output_prefix}_top_words", format='csv')
+    # Save results
+    if not stats_only:
+        print("\n5. Saving word frequencies...")
+        
+        words_df = pd.DataFrame(top_words, columns=['word', 'frequency'])
+        save_results(words_df, f"{output_prefix}_top_words", format=export_format)
+        
+        nouns_df = pd.DataFrame(top_nouns, columns=['noun', 'frequency'])
+        save_results(nouns_df, f"{output_prefix}_top_nouns", format=export_format)
+        
+        verbs_df = pd.DataFrame(top_verbs, columns=['verb', 'frequency'])
+        save_results(verbs_df, f"{output_prefix}_top_verbs", format=export_format)
+        
+        if phrase_counts:
+            phrases_df = pd.DataFrame(
+                [(name, phrase, count) for name, counts in phrase_counts.items()
+                 for phrase, count in counts.most_common(config.TOP_N) if count >= config.NGRAM_MIN_COUNT],
+                columns=['phrase_type', 'phrase', 'frequency'])
+            save_results(phrases_df, f"{output_prefix}_top_phrases", format=export_format)
+        
+        if keywords is not None:
+            keywords_df = keywords.keywords(config.KEYWORD_TOP_N, config.KEYWORD_METHOD,
+                                            config.KEYWORD_MIN_COUNT)
+            save_results(keywords_df, f"{output_prefix}_group_keywords", format=export_format)
+        
+        if embeddings is not None:
+            print(f"   - Clustering {embeddings.rows} responses into {clusters} topics "
+                  f"({analyzer.embedding_method} vectors)...")
+            assignments, summary = cluster_responses(load_embeddings(embeddings.path), clusters)
+            save_results(assignments, f"{output_prefix}_clusters", format=export_format)
+            # Show the example responses next to their text_id
+            texts_df = load_data(stats_writer.path, columns=['text_id', text_column], cache=False)
+            summary = summary.merge(texts_df, on='text_id', how='left')
+            save_results(summary, f"{output_prefix}_cluster_summary", format=export_format)
+            print(f"   Find similar responses with: python -m src.embeddings {embeddings.path} \"texto\"")
     
-    nouns_df = pd.DataFrame(top_nouns, columns=['noun', 'frequency'])
-    save_results(nouns_df, f"{output_prefix}_top_nouns", format='csv')
+    series_df = None
+    if windows is not None:
+        print(f"   - Saving the time series per {time_window}...")
+        series_df = windows.to_frame()
+        series_path = os.path.join(config.OUTPUT_DIR, f"{output_prefix}_time_series.{export_format}")
+        if start_id > 0 and os.path.exists(series_path):
+            # Finished windows of earlier runs are read back, not recomputed;
+            # the windows they left open are replaced by their updated rows
+            history = load_data(series_path, cache=False)
+            history = history[~pd.to_datetime(history['window']).isin(series_df['window'])]
+            series_df = series_frame(pd.concat([history, series_df], ignore_index=True))
+        save_results(series_df, f"{output_prefix}_time_series", format=export_format)
+        if windows.late or windows.missing:
+            print(f"   {windows.late} responses arrived after their window was closed and "
+                  f"{windows.missing} had no valid timestamp; they are not in the time series")
     
-    verbs_df = pd.DataFrame(top_verbs, columns=['verb', 'frequency'])
-    save_results(verbs_df, f"{output_prefix}_top_verbs", format='csv')
+    if chunksize or start_id > 0:
+        # Results were written in several pieces; plots and summary cover
+        # every row written so far, reading back only the needed columns
+        stats_df = load_data(stats_writer.path, columns=stats_df.columns.tolist(), cache=False)
+    if start_id > 0 and os.path.exists(entities.path) and not stats_only:
+        entity_counts = load_data(entities.path, columns=['label'], cache=False)['label'].value_counts()
     
     # Create visualizations
-    print("\n6. Creating visualizations...")
-    
-    # Word frequency plot
-    print("   - Creating word frequency plot...")
-    fig = plot_word_frequency(top_words, "Most Frequent Words")
-    save_plot(fig, f"{output_prefix}_word_frequency")
-    
-    # Word cloud
-    print("   - Creating word cloud...")
-    fig = create_wordcloud(top_words, "Word Cloud")
-    save_plot(fig, f"{output_prefix}_wordcloud")
-    
-    # Entity distribution
-    if not entities_df.empty:
-        print("   - Creating entity distribution plot...")
-        fig = plot_entity_distribution(entities_df)
-        if fig:
-            save_plot(fig, f"{output_prefix}_entities")
-    
-    # Statistics plots
-    print("   - Creating statistics plots...")
-    fig = plot_multiple_statistics(stats_df)
-    save_plot(fig, f"{output_prefix}_statistics")
+    if plots is None:
+        plots = config.PLOT_MODE
+    
+    if plots == 'skip':
+        print("\n6. Skipping visualizations")
+    else:
+        print("\n6. Creating visualizations...")
+        jobs = plot_jobs(output_prefix, top_words, entity_counts, stats_df, series_df)
+        
+        if plots == 'defer':
+            path = save_plot_jobs(jobs, f"{output_prefix}_plots")
+            print(f"   Render them later with: python -m src.visualizer {path}")
+        else:
+            render_plots(jobs, parallel=plots == 'parallel')
     
     print("\n" + "=" * 60)
     print("Analysis complete!")
@@ -138,12 +409,13 @@ def main(input_file: str, text_column: str = None, output_prefix: str = "analysi
     
     # Print summary
     print("\nSummary:")
-    print(f"  - Total texts analyzed: {len(texts)}")
+    print(f"  - Total texts analyzed: {len(stats_df)}")
     print(f"  - Average tokens per text: {stats_df['num_tokens'].mean():.2f}")
     print(f"  - Average sentences per text: {stats_df['num_sentences'].mean():.2f}")
-    print(f"  - Total entities found: {len(entities_df)}")
-    print(f"  - Unique entity types: {entities_df['label'].nunique() if not entities_df.empty else 0}")
-    print(f"\nTop 5 words: {', '.join([w for w, c in top_words[:5]])}")
+    print(f"  - Total entities found: {int(entity_counts.sum())}")
+    print(f"  - Unique entity types: {len(entity_counts)}")
+    if top_words:
+        print(f"\nTop 5 words: {', '.join([w for w, c in top_words[:5]])}")
 
 
 if __name__ == "__main__":
@@ -151,7 +423,67 @@ if __name__ == "__main__":
     parser.add_argument("input_file", help="Path to input CSV or Excel file")
     parser.add_argument("--text-column", "-c", help="Name of the column containing text responses")
     parser.add_argument("--output-prefix", "-o", default="analysis", help="Prefix for output files")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                        help=f"Number of processes for spaCy parsing, -1 for all cores (default: {config.N_PROCESS})")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false", default=None,
+                        help="Parse every text again instead of reusing the parsed document cache")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only analyze rows added since the last incremental run and update the outputs")
+    parser.add_argument("--chunksize", type=int, nargs="?", const=config.CHUNK_SIZE, default=None,
+                        help=f"Stream the input in chunks of rows to bound memory (default: {config.CHUNK_SIZE})")
+    parser.add_argument("--stats-only", action="store_true",
+                        help="Only compute per-text statistics (skips lemmatizer-based word counts and entity rows)")
+    parser.add_argument("--fast-stats", action="store_true",
+                        help="Statistics only, using just the tokenizer and a rule-based sentencizer (no entity counts)")
+    parser.add_argument("--plots", choices=PLOT_MODES, default=None,
+                        help=f"Render plots in parallel processes, serially, defer them to a job file, or skip them (default: {config.PLOT_MODE})")
+    parser.add_argument("--format", dest="export_format", choices=EXPORT_FORMATS, default=None,
+                        help=f"Format of the result tables; parquet and feather need pyarrow (default: {config.EXPORT_FORMAT})")
+    parser.add_argument("--no-phrases", dest="phrases", action="store_false", default=None,
+                        help="Do not count frequent n-grams and noun chunks")
+    parser.add_argument("--group-by", "-g",
+                        help=f"Column that groups the responses (e.g. '{config.TIMESTAMP_COLUMN}' for one group per day); "
+                             "saves the distinctive keywords of each group")
+    parser.add_argument("--near-duplicates", choices=NEAR_DUPLICATE_MODES, default=None,
+                        help="Flag near-identical responses (spam, copies) or keep only the first of each cluster "
+                             f"before analyzing (default: {config.NEAR_DUPLICATES})")
+    parser.add_argument("--clusters", type=int, default=None,
+                        help="Group the responses into this many topic clusters and save their vectors "
+                             "for similar-response queries (python -m src.embeddings)")
+    parser.add_argument("--time-window", choices=list(WINDOW_FREQUENCIES), default=None,
+                        help=f"Aggregate statistics, top lemmas and entities per hour, day or week of '{config.TIMESTAMP_COLUMN}' "
+                             f"into a time series with trend plots (default: {config.TIME_WINDOW})")
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=metrics.PROFILERS, default=None,
+                        help="Profile the run with cProfile (default) or pyinstrument and save the profile to the output directory")
     
     args = parser.parse_args()
     
-    main(args.input_file, args.text_column, args.output_prefix)
+    os.makedirs(config.OUTPUT_DIR, exist_ok=True)
+    if config.SAVE_METRICS:
+        metrics.start_recording(input_file=args.input_file, model=config.SPACY_MODEL,
+                                workers=args.workers if args.workers is not None else config.N_PROCESS,
+                                chunksize=args.chunksize, stats_only=args.stats_only,
+                                fast_stats=args.fast_stats, plots=args.plots or config.PLOT_MODE,
+                                export_format=args.export_format or config.EXPORT_FORMAT,
+                                near_duplicates=args.near_duplicates or config.NEAR_DUPLICATES,
+                                clusters=args.clusters or config.NUM_CLUSTERS,
+                                time_window=args.time_window or config.TIME_WINDOW)
+    
+    if args.profile:
+        profiler = metrics.profile(args.profile, os.path.join(config.OUTPUT_DIR, f"{args.output_prefix}_profile"))
+    else:
+        profiler = contextlib.nullcontext()
+    
+    try:
+        with profiler:
+            main(args.input_file, args.text_column, args.output_prefix, workers=args.workers,
+                 use_cache=args.use_cache, incremental=args.incremental, chunksize=args.chunksize,
+                 stats_only=args.stats_only, fast_stats=args.fast_stats, plots=args.plots,
+                 export_format=args.export_format, phrases=args.phrases, group_by=args.group_by,
+                 near_duplicates=args.near_duplicates, clusters=args.clusters,
+                 time_window=args.time_window)
+    finally:
+        recorder = metrics.stop_recording()
+        if recorder is not None:
+            path = recorder.save(os.path.join(config.OUTPUT_DIR, f"{args.output_prefix}_metrics.json"))
+            print(f"Metrics saved to: {path}")
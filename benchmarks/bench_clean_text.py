@@ -0,0 +1,88 @@
+"""
+Benchmark of row-wise vs vectorized text cleaning
+Run with: python benchmarks/bench_clean_text.py --rows 1000000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.data_loader import clean_text, clean_text_series
+
+
+WORDS = ("la innovación en geografía es fundamental para el desarrollo sostenible "
+         "de las ciudades necesitamos implementar tecnologías que permitan un mejor "
+         "análisis del territorio y sus recursos naturales").split()
+
+# Whitespace problems found in real form exports
+DIRTY_PATTERNS = ["  ", "\t", "\n", " \n ", "\xa0", "　"]
+
+
+def make_column(rows: int, dirty_fraction: float, missing_fraction: float, seed: int = 0) -> pd.Series:
+    """
+    Build a synthetic text column.
+
+    Args:
+        rows: Number of rows
+        dirty_fraction: Fraction of texts with extra or unusual whitespace
+        missing_fraction: Fraction of empty (NaN) cells
+        seed: Random seed
+    """
+    rng = random.Random(seed)
+    values = []
+
+    for _ in range(rows):
+        r = rng.random()
+        words = [rng.choice(WORDS) for _ in range(rng.randint(1, 40))]
+
+        if r < missing_fraction:
+            values.append(None)
+        elif r < missing_fraction + dirty_fraction:
+            text = rng.choice(DIRTY_PATTERNS).join(words)
+            values.append(" " + text + rng.choice(DIRTY_PATTERNS))
+        else:
+            values.append(" ".join(words))
+
+    return pd.Series(values, dtype=object, name="Respuesta")
+
+
+def time_call(func, *args):
+    """Return (result, seconds) of a single call."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark clean_text vs clean_text_series")
+    parser.add_argument("--rows", type=int, default=1000000, help="Number of rows")
+    parser.add_argument("--dirty-fraction", type=float, default=0.1,
+                        help="Fraction of texts with whitespace to normalize")
+    parser.add_argument("--missing-fraction", type=float, default=0.05, help="Fraction of empty cells")
+    parser.add_argument("--dtype", default="object", choices=["object", "str"],
+                        help="Column dtype ('str' is what pandas 3 read_csv returns)")
+    args = parser.parse_args()
+
+    print(f"Generating {args.rows} rows ({args.dirty_fraction:.0%} dirty, {args.missing_fraction:.0%} missing)...")
+    column = make_column(args.rows, args.dirty_fraction, args.missing_fraction).astype(args.dtype)
+
+    expected, row_wise = time_call(column.apply, clean_text)
+    result, vectorized = time_call(clean_text_series, column)
+
+    identical = expected.tolist() == result.tolist()
+
+    print(f"Series.apply(clean_text): {row_wise:.3f} s")
+    print(f"clean_text_series:        {vectorized:.3f} s")
+    print(f"Speedup:                  {row_wise / vectorized:.1f}x")
+    print(f"Identical output:         {identical}")
+
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
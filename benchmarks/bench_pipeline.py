@@ -0,0 +1,335 @@
+"""
+Benchmark of the analyze.py pipeline on synthetic form responses
+Run with: python benchmarks/bench_pipeline.py --sizes 1000 100000 --lengths mixed
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from queue import Empty
+from datetime import datetime, timedelta
+from typing import Dict, List
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+from src.metrics import peak_rss_mb
+
+
+SAMPLE_FILE = os.path.join(ROOT, "data", "ejemplo_formulario.csv")
+
+# Number of sentences per response for each length distribution:
+# list of (probability, min, max)
+LENGTH_DISTRIBUTIONS = {
+    'form': [(1.0, 1, 3)],
+    'short': [(1.0, 0, 1)],
+    'long': [(1.0, 4, 15)],
+    'mixed': [(0.6, 0, 1), (0.3, 1, 3), (0.1, 4, 15)],
+}
+
+# Stages that process the rows, whose throughput is reported
+ROW_STAGES = ('preprocess', 'parse', 'statistics', 'count', 'entities')
+
+# Fraction of words of a sample sentence replaced by other sample words,
+# so that responses are not exact repeats
+REPLACE_FRACTION = 0.3
+
+PLACES = ["Chile", "Santiago", "Valparaíso", "Concepción", "la Universidad de Chile"]
+
+
+def load_sample(path: str = SAMPLE_FILE):
+    """
+    Read the sentences, vocabulary and names of the example form.
+
+    Returns:
+        Tuple of (sentences, vocabulary, names)
+    """
+    sample = pd.read_csv(path)
+    sentences = []
+    for response in sample[config.TEXT_COLUMN]:
+        sentences.extend(s.strip().rstrip('.') for s in response.split('. ') if s.strip())
+
+    vocabulary = sorted({word.strip('.,').lower() for s in sentences for word in s.split()})
+    names = sample['Nombre'].tolist()
+    return sentences, vocabulary, names
+
+
+def make_sentence(rng: random.Random, sentences: List[str], vocabulary: List[str],
+                  names: List[str]) -> str:
+    """Perturb a sample sentence, sometimes mentioning a person or a place."""
+    words = rng.choice(sentences).split()
+    words = [rng.choice(vocabulary) if rng.random() < REPLACE_FRACTION else word for word in words]
+
+    r = rng.random()
+    if r < 0.1:
+        words = ["Según", rng.choice(names) + ","] + words[:1] + [w.lower() for w in words[1:]]
+    elif r < 0.2:
+        words += ["en", rng.choice(PLACES)]
+
+    sentence = " ".join(words)
+    return sentence[0].upper() + sentence[1:] + "."
+
+
+def make_short(rng: random.Random, vocabulary: List[str]) -> str:
+    """A short answer of a few words without final punctuation."""
+    return " ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 12))).capitalize()
+
+
+def make_corpus(rows: int, lengths: str = 'form', seed: int = 0) -> pd.DataFrame:
+    """
+    Build a synthetic form export shaped like data/ejemplo_formulario.csv.
+
+    Args:
+        rows: Number of responses
+        lengths: Name of a LENGTH_DISTRIBUTIONS entry
+        seed: Random seed
+
+    Returns:
+        DataFrame with timestamp, name, email and response columns
+    """
+    rng = random.Random(seed)
+    sentences, vocabulary, names = load_sample()
+    distribution = LENGTH_DISTRIBUTIONS[lengths]
+    start = datetime(2024, 1, 15, 8, 0)
+
+    timestamps, respondents, emails, responses = [], [], [], []
+    for i in range(rows):
+        r = rng.random()
+        for probability, low, high in distribution:
+            if r < probability:
+                break
+            r -= probability
+
+        num_sentences = rng.randint(low, high)
+        if num_sentences == 0:
+            response = make_short(rng, vocabulary)
+        else:
+            response = " ".join(make_sentence(rng, sentences, vocabulary, names)
+                                for _ in range(num_sentences))
+
+        name = rng.choice(names)
+        timestamps.append((start + timedelta(minutes=7 * i)).strftime("%Y-%m-%d %H:%M:%S"))
+        respondents.append(name)
+        emails.append(f"{name.split()[0].lower()}{i}@example.com")
+        responses.append(response)
+
+    return pd.DataFrame({
+        config.TIMESTAMP_COLUMN: timestamps,
+        'Nombre': respondents,
+        'Correo electrónico': emails,
+        config.TEXT_COLUMN: responses,
+    })
+
+
+def run_size(rows: int, args: argparse.Namespace) -> Dict:
+    """
+    Run every stage of analyze.py:main on one synthetic corpus.
+
+    Args:
+        rows: Number of responses
+        args: Parsed command-line arguments
+
+    Returns:
+        Dictionary with the corpus size and one entry per stage
+    """
+    # Imported here so the model is loaded in the measured process only
+    from src.data_loader import load_data, preprocess_dataframe, save_results
+    from src.text_analyzer import TextAnalyzer, ALL_OUTPUTS
+    from src.visualizer import render_plots
+    from analyze import plot_jobs
+
+    if args.model:
+        config.SPACY_MODEL = args.model
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config.OUTPUT_DIR = tmp_dir
+        input_path = os.path.join(tmp_dir, "corpus.csv")
+        make_corpus(rows, args.lengths, args.seed).to_csv(input_path, index=False)
+
+        stages = []
+        num_tokens = 0
+
+        def timed(stage, func, *func_args, **func_kwargs):
+            start = time.perf_counter()
+            result = func(*func_args, **func_kwargs)
+            seconds = time.perf_counter() - start
+            stages.append({
+                'stage': stage,
+                'seconds': round(seconds, 4),
+                'docs_per_sec': round(rows / seconds, 1) if stage in ROW_STAGES and seconds > 0 else None,
+                'peak_rss_mb': peak_rss_mb(),
+            })
+            print(f"   {stage:<11} {seconds:9.3f} s")
+            return result
+
+        df = timed('load', load_data, input_path)
+        df_clean = timed('preprocess', preprocess_dataframe, df, config.TEXT_COLUMN)
+        texts = df_clean[config.TEXT_COLUMN].tolist()
+
+        def load_model():
+            analyzer = TextAnalyzer(n_process=args.workers, use_cache=args.cache)
+            # The model is loaded lazily, on first use
+            analyzer.nlp
+            return analyzer
+
+        analyzer = timed('model', load_model)
+        store = timed('parse', analyzer.parse, texts, outputs=ALL_OUTPUTS, desc="Parsing")
+        num_tokens = store.num_tokens
+
+        stats_df = timed('statistics', store.statistics)
+        word_counts = timed('count', lambda: {name: store.word_counts(pos_filter).most_common(config.TOP_N)
+                                              for name, pos_filter in config.POS_FILTERS.items()})
+        entities_df = timed('entities', store.entities)
+
+        def save():
+            stats_output = pd.concat([df_clean.reset_index(drop=True), stats_df], axis=1)
+            save_results(stats_output, "bench_statistics", format='csv')
+            if not entities_df.empty:
+                save_results(entities_df, "bench_entities", format='csv')
+            save_results(pd.DataFrame(word_counts['words'], columns=['word', 'frequency']),
+                         "bench_top_words", format='csv')
+
+        timed('save', save)
+
+        if args.plots != 'skip':
+            entity_counts = entities_df['label'].value_counts() if not entities_df.empty else pd.Series(dtype='int64')
+            jobs = plot_jobs("bench", word_counts['words'], entity_counts, stats_df)
+            timed('plot', render_plots, jobs, parallel=args.plots == 'parallel')
+
+    return {
+        'rows': rows,
+        'tokens': num_tokens,
+        'total_seconds': round(sum(stage['seconds'] for stage in stages), 4),
+        'peak_rss_mb': peak_rss_mb(),
+        'children_peak_rss_mb': peak_rss_mb(children=True),
+        'stages': stages,
+    }
+
+
+def _run_size_worker(rows: int, args: argparse.Namespace, queue):
+    """Entry point of the per-size process."""
+    queue.put(run_size(rows, args))
+
+
+def run_isolated(rows: int, args: argparse.Namespace) -> Dict:
+    """Run one size in a fresh process, so peak RSS is not shared between sizes."""
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_size_worker, args=(rows, args, queue))
+    process.start()
+    # Poll, so a child that dies before sending its result is noticed
+    while True:
+        try:
+            result = queue.get(timeout=1)
+            break
+        except Empty:
+            if not process.is_alive():
+                process.join()
+                raise RuntimeError(f"Benchmark of {rows} rows exited with code {process.exitcode} "
+                                   "without a result")
+    process.join()
+    return result
+
+
+def environment(args: argparse.Namespace) -> Dict:
+    """Describe the machine, versions and settings of a run."""
+    import spacy
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'spacy': spacy.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'model': args.model or config.SPACY_MODEL,
+        'lengths': args.lengths,
+        'workers': args.workers if args.workers is not None else config.N_PROCESS,
+        'batch_size': config.BATCH_SIZE,
+        'cache': args.cache,
+        'plots': args.plots,
+        'seed': args.seed,
+    }
+
+
+def compare(previous: Dict, current: Dict):
+    """Print stage timings of two runs side by side."""
+    print(f"\nComparison with {previous['environment'].get('commit')} "
+          f"({previous['environment'].get('timestamp')}):")
+
+    old_runs = {run['rows']: run for run in previous['runs']}
+    for run in current['runs']:
+        old = old_runs.get(run['rows'])
+        if old is None:
+            continue
+
+        old_stages = {stage['stage']: stage['seconds'] for stage in old['stages']}
+        print(f"  {run['rows']} rows")
+        for stage in run['stages']:
+            before = old_stages.get(stage['stage'])
+            if before:
+                print(f"    {stage['stage']:<11} {before:9.3f} s -> {stage['seconds']:9.3f} s "
+                      f"({before / max(stage['seconds'], 1e-9):.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic form corpora")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000],
+                        help="Corpus sizes in rows (e.g. 1000 100000 1000000)")
+    parser.add_argument("--lengths", default="form", choices=sorted(LENGTH_DISTRIBUTIONS),
+                        help="Response length distribution")
+    parser.add_argument("--model", help=f"spaCy model (default: {config.SPACY_MODEL})")
+    parser.add_argument("--workers", "-w", type=int, default=None, help="Number of spaCy worker processes")
+    parser.add_argument("--cache", action="store_true",
+                        help="Use the parsed document cache (off by default so runs are comparable)")
+    parser.add_argument("--plots", default="serial", choices=["parallel", "serial", "skip"],
+                        help="How to render plots")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic corpus")
+    parser.add_argument("--output", help="JSON results file (default: benchmarks/results/pipeline_<time>.json)")
+    parser.add_argument("--compare", help="Earlier JSON results file to compare against")
+    args = parser.parse_args()
+
+    results = {'environment': environment(args), 'runs': []}
+
+    for rows in args.sizes:
+        print(f"\n{rows} rows ({args.lengths} lengths):")
+        run = run_isolated(rows, args)
+        results['runs'].append(run)
+        print(f"   total       {run['total_seconds']:9.3f} s, "
+              f"{run['rows'] / max(run['total_seconds'], 1e-9):.1f} docs/s, peak RSS {run['peak_rss_mb']} MB")
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(ROOT, "benchmarks", "results", f"pipeline_{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\nResults saved to: {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), results)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
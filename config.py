@@ -6,6 +6,7 @@ Configuration file for the text analysis project
 DATA_DIR = "data"
 OUTPUT_DIR = "output"
 MODELS_DIR = "models"
+CACHE_DIR = "cache"
 
 # spaCy configuration
 SPACY_MODEL = "es_core_news_sm"  # Spanish model for text analysis
@@ -16,16 +17,97 @@ SPACY_MODEL = "es_core_news_sm"  # Spanish model for text analysis
 
 # Analysis settings
 MAX_TEXT_LENGTH = 1000000  # Maximum text length for spaCy processing
-BATCH_SIZE = 50  # Batch size for processing multiple texts
+BATCH_SIZE = None  # Texts per nlp.pipe batch (None = choose from average text length)
+N_PROCESS = 1  # Worker processes for spaCy parsing (-1 = all CPU cores)
+TARGET_BATCH_CHARS = 100000  # Characters per batch aimed at by the automatic batch size
+MIN_BATCH_SIZE = 16
+MAX_BATCH_SIZE = 2000
+MAX_TRACKED_LEMMAS = None  # Keep only about this many most frequent lemmas per count (None = exact)
+ENTITY_BUFFER_MB = 64  # Entity rows buffered in memory before being written to disk
+ENTITY_BATCH_ROWS = 100000  # Entity rows decoded and written at a time
+DEDUPLICATE_TEXTS = True  # Parse identical texts once and share their results
+NEAR_DUPLICATES = None  # Near-identical responses: None, "flag" or "collapse" (--near-duplicates)
+NEAR_DUPLICATE_THRESHOLD = 0.8  # Estimated Jaccard similarity of responses counted as near-duplicates
+MINHASH_PERMUTATIONS = 64  # Hash functions per MinHash signature
+SHINGLE_SIZE = 5  # Characters per shingle compared between responses
+CHUNK_SIZE = 10000  # Rows per chunk when streaming large files (--chunksize)
+# Word counts computed for every analysis, keyed by output name
+POS_FILTERS = {
+    'words': None,
+    'nouns': ['NOUN'],
+    'verbs': ['VERB'],
+}
+TOP_N = 30  # Words, nouns, verbs and phrases listed in the results
+
+# Phrase analysis (n-grams and noun chunks)
+PHRASE_ANALYSIS = True  # Also count frequent phrases in analyze.py (needs the parser for noun chunks)
+NGRAM_SIZES = (2, 3)  # Lengths of the lemma n-grams to count
+NGRAM_MIN_COUNT = 2  # Phrases seen fewer times are left out of the results
+# POS sequences counted separately, e.g. "desarrollo sostenible" (NOUN ADJ)
+PHRASE_PATTERNS = {
+    'noun_adj': ['NOUN', 'ADJ'],
+    'noun_adp_noun': ['NOUN', 'ADP', 'NOUN'],
+}
+
+# Keywords per group of responses (--group-by)
+KEYWORD_METHOD = "log_odds"  # Ranking of distinctive keywords: "log_odds" or "tfidf"
+KEYWORD_TOP_N = 15  # Keywords per group
+KEYWORD_MIN_COUNT = 2  # Words used fewer times in a group are not keywords of it
+
+# Topic clusters and similar responses (--clusters)
+NUM_CLUSTERS = None  # Topic clusters of the responses (None = no clustering)
+EMBEDDING_METHOD = "auto"  # Document vectors: "vectors" (word vectors of md/lg models), "hashing" (hashed bag of lemmas) or "auto"
+EMBEDDING_DIM = 512  # Dimensions of hashed bag-of-lemmas vectors
+KMEANS_BATCH_SIZE = 2048  # Responses per mini-batch k-means step
+KMEANS_MAX_ITER = 300  # Mini-batch k-means steps at most
+CLUSTER_EXAMPLES = 3  # Responses closest to each cluster center listed in the summary
+ANN_TRAIN_ITER = 30  # Mini-batch steps of the similarity index lists
+ANN_PROBES = 8  # Similarity index lists searched per query
+
+# Time series over TIMESTAMP_COLUMN (--time-window)
+TIME_WINDOW = None  # Window length: None, "hour", "day" or "week"
+TIME_WINDOW_KEEP = 3  # Most recent windows kept open for late responses; older windows are final
+TIME_WINDOW_TOP_N = 10  # Lemmas listed per window
+
+# Parsed document cache
+USE_DOC_CACHE = True  # Reuse parsed docs across runs (stored in CACHE_DIR)
+DOC_CACHE_MAX_MB = 1024  # Least recently used docs are evicted above this size
+
+# Excel input
+EXCEL_CACHE = True  # Convert Excel files once to Parquet copies in CACHE_DIR/excel (needs pyarrow)
+EXCEL_ENGINE = None  # pandas read_excel engine (None = "calamine" if python-calamine is installed)
 
 # Column names (customize based on your Google Forms structure)
 TEXT_COLUMN = "Respuesta"  # Default column name for text responses
-TIMESTAMP_COLUMN = "Marca temporal"  # Timestamp column
+TIMESTAMP_COLUMN = "Marca temporal"  # Timestamp column (--time-window, --group-by)
+TIMESTAMP_FORMAT = None  # e.g. "%d/%m/%Y %H:%M:%S" (None = detect from the values, day first before month first)
 ID_COLUMN = "ID"  # Optional ID column
 
 # Visualization settings
 FIGURE_SIZE = (12, 8)
 DPI = 100
+WORDCLOUD_SIZE = (800, 400)  # Word cloud canvas in pixels
+WORDCLOUD_MAX_WORDS = 200
+WORDCLOUD_CACHE = True  # Reuse word cloud layouts stored in CACHE_DIR/wordcloud
+WORDCLOUD_DIRECT = False  # Write the word cloud PNG without matplotlib (faster, no title)
+WORDCLOUD_PREVIEW = False  # Smaller canvas and fewer words, for quick looks
+WORDCLOUD_PREVIEW_SCALE = 0.5
+WORDCLOUD_PREVIEW_MAX_WORDS = 50
+PLOT_MODE = "parallel"  # Options: "parallel", "serial", "defer", "skip" (--plots)
+PLOT_WORKERS = None  # Processes for parallel plot rendering (None = one per plot, up to the CPU count)
+
+# Analysis server (python -m src.server)
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_MAX_BATCH_TEXTS = 2000  # Texts parsed together in one nlp.pipe call
+SERVER_MAX_BATCH_LATENCY_MS = 50  # Longest wait for more requests before parsing a batch
+SERVER_MAX_PENDING_TEXTS = 50000  # Queued texts above which new requests get HTTP 503
+SERVER_MAX_BODY_MB = 50  # Largest accepted request body
+
+# Run metrics
+SAVE_METRICS = True  # analyze.py writes <prefix>_metrics.json with per-stage timings
 
 # Export settings
-EXPORT_FORMAT = "csv"  # Options: "csv", "xlsx", "json"
+EXPORT_FORMAT = "csv"  # Options: "csv", "xlsx", "json", "parquet", "feather" (--format)
+PARQUET_COMPRESSION = "zstd"  # Options: "zstd", "snappy", "gzip", None
+FEATHER_COMPRESSION = "uncompressed"  # Options: "uncompressed" (memory-mappable without copies), "lz4", "zstd"
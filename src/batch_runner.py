@@ -0,0 +1,323 @@
+"""
+Batch analysis of several form exports and text columns
+Run with: python -m src.batch_runner data/ --text-columns "Pregunta 1" "Pregunta 2"
+"""
+
+import os
+import re
+import glob
+import argparse
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+import pandas as pd
+import config
+from src.data_loader import (load_data, read_header, preprocess_dataframe, save_results,
+                             ResultWriter, EXPORT_FORMATS)
+from src.entity_buffer import EntityBuffer
+
+INPUT_EXTENSIONS = ('.csv', '.xlsx', '.xls', '.parquet', '.feather', '.arrow')
+
+# Analyzer of a worker process, created once by _init_worker
+_worker_analyzer = None
+
+
+def find_input_files(path: str) -> List[str]:
+    """
+    Expand a directory or glob pattern into the form exports it contains.
+
+    Args:
+        path: Directory, glob pattern (e.g. "data/*.csv") or single file
+
+    Returns:
+        Sorted list of CSV, Excel, Parquet and Feather file paths
+    """
+    if os.path.isdir(path):
+        candidates = [os.path.join(path, name) for name in os.listdir(path)]
+    else:
+        candidates = glob.glob(path)
+
+    files = sorted(candidate for candidate in candidates
+                   if os.path.isfile(candidate) and candidate.lower().endswith(INPUT_EXTENSIONS))
+    if not files:
+        raise ValueError(f"No CSV, Excel, Parquet or Feather files found in: {path}")
+    return files
+
+
+def analyze_column(source_file: str, column: str, texts: List[str], stats_only: bool = False) -> Dict:
+    """
+    Analyze the texts of one (file, column) pair with the process' analyzer.
+
+    Args:
+        source_file: Name of the file the texts come from
+        column: Name of the text column
+        texts: Cleaned, non-empty texts
+        stats_only: Only compute per-text statistics
+
+    Returns:
+        Dictionary with 'statistics' and 'entities' DataFrames and
+        'word_counts' (collections.Counter objects keyed like config.POS_FILTERS)
+    """
+    from src.text_analyzer import TextAnalyzer, ALL_OUTPUTS
+
+    analyzer = _worker_analyzer or TextAnalyzer(show_progress=False)
+    outputs = ['statistics'] if stats_only else ALL_OUTPUTS
+    results = analyzer.analyze_corpus(texts, pos_filters=config.POS_FILTERS, outputs=outputs)
+
+    # LemmaCounters hold hashes of this process' StringStore; send words instead
+    word_counts = {name: counts.to_counter() for name, counts in results.get('word_counts', {}).items()}
+
+    return {
+        'source_file': source_file,
+        'column': column,
+        'statistics': results['statistics'],
+        'entities': results.get('entities', pd.DataFrame()),
+        'word_counts': word_counts,
+        'duplicate_ratio': results['store'].duplicate_ratio,
+    }
+
+
+def run_batch(input_path: str, text_columns: List[str] = None, output_prefix: str = "batch",
+              workers: int = None, use_cache: bool = None, stats_only: bool = False,
+              export_format: str = None) -> pd.DataFrame:
+    """
+    Analyze every text column of every file, in a shared pool of worker processes.
+
+    Each file is read once (only its ID, timestamp and text columns) and
+    each of its (file, column) pairs is analyzed by whichever worker is
+    free; every worker loads the spaCy model once. Results are written as
+    soon as they and the pairs before them are done, so only pairs that
+    finished out of order are held in memory.
+
+    Args:
+        input_path: Directory or glob pattern of CSV/Excel exports
+        text_columns: Text columns to analyze (uses config default if None);
+            columns missing from a file are skipped
+        output_prefix: Prefix for output files
+        workers: Number of worker processes (default: number of CPUs)
+        use_cache: Whether to reuse cached parsed docs (uses config default if None)
+        stats_only: Only compute per-text statistics
+        export_format: Format of the result tables (uses config default if None)
+
+    Returns:
+        Summary DataFrame with one row per analyzed (file, column) pair
+    """
+    if text_columns is None:
+        text_columns = [config.TEXT_COLUMN]
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    os.makedirs(config.OUTPUT_DIR, exist_ok=True)
+    files = find_input_files(input_path)
+    print(f"Analyzing {len(text_columns)} column(s) in {len(files)} file(s) with {workers} worker(s)")
+
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(config.SPACY_MODEL, config.CACHE_DIR, use_cache))
+    else:
+        _init_worker(config.SPACY_MODEL, config.CACHE_DIR, use_cache)
+        pool = None
+
+    writer = BatchWriter(text_columns, output_prefix, export_format, stats_only)
+    key_names = [config.ID_COLUMN, config.TIMESTAMP_COLUMN]
+    futures = {}
+    # (file, column) pairs in submission order, and finished ones waiting for earlier pairs
+    submitted = deque()
+    finished = {}
+    try:
+        for position, file_path in enumerate(files):
+            available, encoding = read_header(file_path)
+            columns = [column for column in text_columns if column in available]
+            missing = [column for column in text_columns if column not in available]
+            if missing:
+                print(f"   {os.path.basename(file_path)}: skipping missing column(s) {missing}")
+            if not columns:
+                continue
+
+            keys = [column for column in available if column in key_names]
+            df = load_data(file_path, encoding=encoding, columns=keys + columns)
+            source_file = os.path.basename(file_path)
+
+            for column in columns:
+                df_clean = preprocess_dataframe(df[keys + [column]], column)
+                texts = df_clean[column].tolist()
+                if not texts:
+                    continue
+
+                order = (position, text_columns.index(column))
+                # Key columns missing from this file are left empty, so pieces share one layout
+                key_columns = df_clean.reindex(columns=keys + [name for name in key_names if name not in keys])
+                key_columns = key_columns.reset_index(drop=True)
+                args = (source_file, column, texts, stats_only)
+                if pool is None:
+                    writer.add(analyze_column(*args), key_columns)
+                    print(f"   Done: {source_file} / {column} ({len(texts)} texts)")
+                else:
+                    # Workers start on this pair while the next files are read
+                    futures[pool.submit(analyze_column, *args)] = (order, key_columns)
+                    submitted.append(order)
+
+        for future in as_completed(futures):
+            result = future.result()
+            order, key_columns = futures.pop(future)
+            finished[order] = (result, key_columns)
+            print(f"   Done: {result['source_file']} / {result['column']} "
+                  f"({len(result['statistics'])} texts)")
+            while submitted and submitted[0] in finished:
+                writer.add(*finished.pop(submitted.popleft()))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    summary = writer.close()
+    if summary.empty:
+        print("No texts to analyze.")
+        return summary
+
+    print(f"\nResults saved to: {config.OUTPUT_DIR}/")
+    return summary
+
+
+class BatchWriter:
+    """
+    Writes the outputs of a batch run as (file, column) results arrive.
+
+    Per-text statistics go through a ResultWriter and entities through an
+    EntityBuffer, both labeled with their source file and column; word
+    counts are merged into running totals (overall and per column) and the
+    top words are written on close, with a summary of every pair.
+
+    Usage:
+        writer = BatchWriter(["Respuesta"], "batch", format='parquet')
+        for result, keys in results:
+            writer.add(result, keys)
+        summary = writer.close()
+    """
+
+    def __init__(self, text_columns: List[str], output_prefix: str, format: str = None,
+                 stats_only: bool = False):
+        """
+        Prepare the writers; files are created by the first result.
+
+        Args:
+            text_columns: Requested text columns
+            output_prefix: Prefix for output files
+            format: Output format (uses config default if None)
+            stats_only: Only statistics are computed
+        """
+        self.text_columns = text_columns
+        self.output_prefix = output_prefix
+        self.format = format or config.EXPORT_FORMAT
+        self.stats_only = stats_only
+        self.statistics = ResultWriter(f"{output_prefix}_statistics", self.format)
+        self.entities = EntityBuffer(f"{output_prefix}_entities", self.format)
+        self.summary_rows = []
+        # Word counts over everything (None) and over each column across files
+        self.word_counts = {column: {} for column in [None] + text_columns}
+
+    def add(self, result: Dict, keys: pd.DataFrame):
+        """
+        Write the outputs of one (file, column) pair.
+
+        Args:
+            result: Result of analyze_column
+            keys: ID/timestamp columns of the analyzed rows
+        """
+        self.statistics.write(pd.concat([_labels(result, len(result['statistics'])), keys,
+                                         result['statistics']], axis=1))
+        if not result['entities'].empty:
+            self.entities.add_frame(pd.concat([_labels(result, len(result['entities'])),
+                                               result['entities']], axis=1))
+
+        self.summary_rows.append(_summary_row(result))
+        for column in (None, result['column']):
+            for name, counts in result['word_counts'].items():
+                self.word_counts[column].setdefault(name, Counter()).update(counts)
+
+    def close(self) -> pd.DataFrame:
+        """
+        Finish the statistics and entity files and write the summary and top words.
+
+        Returns:
+            Summary DataFrame with one row per (file, column) pair
+        """
+        self.statistics.close()
+        self.entities.close()
+
+        summary = pd.DataFrame(self.summary_rows)
+        if summary.empty:
+            return summary
+        save_results(summary, f"{self.output_prefix}_summary", format=self.format)
+
+        if self.stats_only:
+            return summary
+
+        written = {result['column'] for result in self.summary_rows}
+        for column, counters in self.word_counts.items():
+            if column is not None and column not in written:
+                continue
+            name = self.output_prefix if column is None else f"{self.output_prefix}_{_slug(column)}"
+            for counts_name, label in (('words', 'word'), ('nouns', 'noun'), ('verbs', 'verb')):
+                counts = counters.get(counts_name, Counter())
+                top = pd.DataFrame(counts.most_common(config.TOP_N), columns=[label, 'frequency'])
+                save_results(top, f"{name}_top_{counts_name}", format=self.format)
+
+        return summary
+
+
+def _init_worker(model_name: str, cache_dir: str, use_cache: Optional[bool]):
+    """Create the analyzer of a worker process (the model loads on its first task)."""
+    global _worker_analyzer
+    from src.text_analyzer import TextAnalyzer
+
+    config.SPACY_MODEL = model_name
+    config.CACHE_DIR = cache_dir
+    # Parallelism comes from the pool, so each worker parses in-process
+    _worker_analyzer = TextAnalyzer(model_name, n_process=1, use_cache=use_cache, show_progress=False)
+
+
+def _labels(result: Dict, length: int) -> pd.DataFrame:
+    """Source file and column of every row of a result table."""
+    return pd.DataFrame({'source_file': [result['source_file']] * length,
+                         'column': [result['column']] * length})
+
+
+def _summary_row(result: Dict) -> Dict:
+    """One summary line for a (file, column) pair."""
+    stats = result['statistics']
+    top_words = result['word_counts'].get('words', Counter()).most_common(5)
+    return {
+        'source_file': result['source_file'],
+        'column': result['column'],
+        'num_texts': len(stats),
+        'avg_tokens': stats['num_tokens'].mean(),
+        'avg_sentences': stats['num_sentences'].mean(),
+        'num_entities': len(result['entities']),
+        'duplicate_ratio': round(result['duplicate_ratio'], 4),
+        'top_words': ', '.join(word for word, _ in top_words),
+    }
+
+
+def _slug(column: str) -> str:
+    """File-name friendly version of a column name."""
+    return re.sub(r'\W+', '_', column.lower()).strip('_') or 'column'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze several form exports and text columns in parallel")
+    parser.add_argument("input_path", help="Directory or glob pattern (quoted) of CSV, Excel, Parquet or Feather files")
+    parser.add_argument("--text-columns", "-c", nargs="+", default=None,
+                        help=f"Text columns to analyze (default: {config.TEXT_COLUMN})")
+    parser.add_argument("--output-prefix", "-o", default="batch", help="Prefix for output files")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                        help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false", default=None,
+                        help="Parse every text again instead of reusing the parsed document cache")
+    parser.add_argument("--stats-only", action="store_true", help="Only compute per-text statistics")
+    parser.add_argument("--format", dest="export_format", choices=EXPORT_FORMATS, default=None,
+                        help=f"Format of the result tables (default: {config.EXPORT_FORMAT})")
+
+    args = parser.parse_args()
+
+    run_batch(args.input_path, args.text_columns, args.output_prefix, workers=args.workers,
+              use_cache=args.use_cache, stats_only=args.stats_only, export_format=args.export_format)
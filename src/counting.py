@@ -0,0 +1,261 @@
+"""
+Lemma counting on StringStore hashes
+"""
+
+import heapq
+from collections import Counter
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from spacy.strings import get_string_id
+
+
+# Docs whose lemmas are gathered before each counting step
+_COUNT_BATCH = 1000
+
+
+class HashCounter(Mapping):
+    """
+    Base of the counters keyed by integer hashes (LemmaCounter, NgramCounter).
+
+    Counts are kept in a dict of hash -> count, in insertion order, and
+    only decoded into strings to build a result. It behaves like a
+    read-only collections.Counter (most_common, item lookup by string,
+    iteration), so it can be passed to Counter.update.
+
+    With a capacity, only about that many of the most frequent entries
+    are kept: whenever the table grows past twice the capacity, the least
+    frequent entries are dropped. Counts of the remaining entries may then
+    be underestimated by at most `error`, the sum of the largest count
+    dropped by each pruning (an entry can be dropped, come back and be
+    dropped again, losing at most that much each time).
+
+    Subclasses say how a string maps to a key (_key, _add_key) and back
+    (_decode).
+    """
+
+    def __init__(self, strings, capacity: Optional[int] = None):
+        """
+        Create an empty counter.
+
+        Args:
+            strings: spaCy StringStore the hashes belong to
+            capacity: Approximate number of entries to keep (None counts exactly)
+        """
+        self.strings = strings
+        self.capacity = capacity
+        self.error = 0
+        self._counts: Dict[int, int] = {}
+
+    def update(self, other):
+        """
+        Add counts from a counter of the same type or a mapping of string -> count.
+
+        Args:
+            other: Counter of the same type sharing the same StringStore, or a mapping
+        """
+        table = self._counts
+        if isinstance(other, type(self)) and other.strings is self.strings:
+            self._merge_keys(other)
+            for key, count in other._counts.items():
+                table[key] = table.get(key, 0) + count
+            self.error += other.error
+        else:
+            for text, count in other.items():
+                key = self._add_key(text)
+                table[key] = table.get(key, 0) + count
+
+        self._prune()
+
+    def most_common(self, n: Optional[int] = None, min_count: int = 1) -> List[Tuple[str, int]]:
+        """
+        The n most common entries and their counts, like Counter.most_common.
+
+        Args:
+            n: Number of entries to return (None returns all)
+            min_count: Leave out entries counted fewer times
+        """
+        items = self._counts.items()
+        if min_count > 1:
+            items = [item for item in items if item[1] >= min_count]
+        if n is None:
+            top = sorted(items, key=_count_of, reverse=True)
+        else:
+            top = heapq.nlargest(n, items, key=_count_of)
+        return [(self._decode(key), count) for key, count in top]
+
+    def to_counter(self) -> Counter:
+        """Decode every entry into a collections.Counter of strings."""
+        return Counter({self._decode(key): count for key, count in self._counts.items()})
+
+    def total(self) -> int:
+        """Sum of all counts."""
+        return sum(self._counts.values())
+
+    def __getitem__(self, text: str) -> int:
+        # Missing entries count 0, as in collections.Counter
+        return self._counts.get(self._key(text), 0)
+
+    def __contains__(self, text) -> bool:
+        return isinstance(text, str) and self._key(text) in self._counts
+
+    def __iter__(self) -> Iterable[str]:
+        return (self._decode(key) for key in self._counts)
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.most_common(10)}{', ...' if len(self) > 10 else ''})"
+
+    def _key(self, text: str) -> int:
+        """Key a string is counted under (without adding it to the StringStore)."""
+        raise NotImplementedError
+
+    def _add_key(self, text: str) -> int:
+        """Key a string is counted under, adding what decoding it needs."""
+        raise NotImplementedError
+
+    def _decode(self, key: int) -> str:
+        raise NotImplementedError
+
+    def _merge_keys(self, other: 'HashCounter'):
+        """Take what decoding the keys of another counter needs (before update adds them)."""
+
+    def _prune(self):
+        """Drop the least frequent entries once the table exceeds twice the capacity."""
+        if self.capacity is None or len(self._counts) <= 2 * self.capacity:
+            return
+
+        counts = np.fromiter(self._counts.values(), dtype=np.int64, count=len(self._counts))
+        threshold = np.partition(counts, -self.capacity)[-self.capacity]
+        dropped = counts[counts < threshold]
+        if len(dropped):
+            self.error += int(dropped.max())
+
+        # Survivors keep their insertion order
+        self._counts = {key: count for key, count in self._counts.items() if count >= threshold}
+        self._pruned()
+
+    def _pruned(self):
+        """Called after pruning, to drop what is kept per entry besides its count."""
+
+
+class LemmaCounter(HashCounter):
+    """
+    Counter of lowercased lemmas keyed by StringStore hashes.
+
+    Counting works on integer hashes; a lemma string is only decoded to
+    lowercase it once per distinct lemma, and to build the final top-n.
+    See HashCounter for the capacity and `error`.
+    """
+
+    def __init__(self, strings, capacity: Optional[int] = None):
+        """
+        Create an empty counter.
+
+        Args:
+            strings: spaCy StringStore the lemma hashes belong to
+            capacity: Approximate number of lemmas to keep (None counts exactly)
+        """
+        super().__init__(strings, capacity)
+        self._lowercase: Dict[int, int] = {}
+
+    def update_hashes(self, lemmas: np.ndarray, weights: Optional[np.ndarray] = None):
+        """
+        Count an array of lemma hashes.
+
+        Distinct lemmas are added in order of first occurrence, so ties in
+        most_common are ordered as if tokens had been counted one by one.
+
+        Args:
+            lemmas: Array of LEMMA hashes
+            weights: Optional count for each entry (default 1)
+        """
+        if len(lemmas) == 0:
+            return
+
+        unique, first, inverse = np.unique(lemmas, return_index=True, return_inverse=True)
+        if weights is None:
+            counts = np.bincount(inverse.ravel(), minlength=len(unique))
+        else:
+            counts = np.bincount(inverse.ravel(), weights=weights, minlength=len(unique)).astype(np.int64)
+        order = np.argsort(first, kind='stable')
+
+        table = self._counts
+        for lemma, count in zip(unique[order].tolist(), counts[order].tolist()):
+            key = self._lower(lemma)
+            table[key] = table.get(key, 0) + count
+
+        self._prune()
+
+    def _key(self, word: str) -> int:
+        return get_string_id(word)
+
+    def _add_key(self, word: str) -> int:
+        return self.strings.add(word)
+
+    def _decode(self, key: int) -> str:
+        return self.strings[key]
+
+    def _lower(self, lemma: int) -> int:
+        """Hash of the lowercased lemma, computed once per distinct lemma."""
+        key = self._lowercase.get(lemma)
+        if key is None:
+            key = self.strings.add(self.strings[lemma].lower())
+            self._lowercase[lemma] = key
+        return key
+
+
+def count_docs(docs: Iterable, strings, pos_filters: Dict[str, Optional[List[str]]],
+               capacity: Optional[int] = None, weights: Optional[np.ndarray] = None) -> Dict[str, LemmaCounter]:
+    """
+    Stream documents into one LemmaCounter per POS filter.
+
+    Docs are gathered into a TokenStore one batch at a time, so only the
+    token arrays of one batch are held at once.
+
+    Args:
+        docs: Iterable of parsed spaCy Doc objects
+        strings: StringStore shared with the docs
+        pos_filters: Mapping of output name to POS tags (None counts every POS)
+        capacity: Approximate number of lemmas kept per counter (None counts exactly)
+        weights: Number of times each doc is counted, in doc order (default 1)
+
+    Returns:
+        Dictionary of LemmaCounter objects keyed like pos_filters
+    """
+    # Imported here because token_store imports this module
+    from src.token_store import TokenStore
+
+    counters = {name: LemmaCounter(strings, capacity) for name in pos_filters}
+    batch = []
+    num_counted = 0
+
+    def count_batch():
+        nonlocal num_counted
+        store = TokenStore.from_docs(batch, strings, sentences=False)
+        token_weights = None
+        if weights is not None:
+            doc_weights = weights[num_counted:num_counted + len(batch)]
+            token_weights = np.repeat(doc_weights, np.diff(store.offsets))
+        for name, pos_filter in pos_filters.items():
+            mask = store.content_mask(pos_filter)
+            counters[name].update_hashes(store.lemma[mask],
+                                         None if token_weights is None else token_weights[mask])
+        num_counted += len(batch)
+        batch.clear()
+
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= _COUNT_BATCH:
+            count_batch()
+
+    if batch:
+        count_batch()
+
+    return counters
+
+
+def _count_of(item: Tuple[int, int]) -> int:
+    return item[1]
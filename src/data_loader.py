@@ -3,36 +3,253 @@ Data loader utilities for handling Google Forms CSV data
 """
 
 import pandas as pd
+import numpy as np
 import os
-from typing import Optional, List
+import json
+import hashlib
+from typing import Optional, List, Iterator, Dict, Tuple
 import config
+from src import metrics
 
 
-def load_data(file_path: str, encoding: str = 'utf-8') -> pd.DataFrame:
+# Formats accepted by save_results and ResultWriter
+EXPORT_FORMATS = ('csv', 'xlsx', 'json', 'parquet', 'feather')
+
+# Columnar input files read by load_data and iter_chunks
+COLUMNAR_EXTENSIONS = ('.parquet', '.feather', '.arrow')
+
+# What find_near_duplicates does with clusters of near-identical responses
+NEAR_DUPLICATE_MODES = ('flag', 'collapse')
+
+# Timestamp formats tried in order when TIMESTAMP_FORMAT is not set; day
+# first comes before month first, as in Spanish Google Forms exports
+TIMESTAMP_FORMATS = ('ISO8601', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y',
+                     '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M', '%m/%d/%Y')
+
+# Timestamps checked against each format by detect_timestamp_format
+_TIMESTAMP_SAMPLE = 1000
+
+# Shingles hashed at a time while computing MinHash signatures
+_SHINGLE_BATCH = 2000000
+
+# Types of the result table columns in Parquet/Feather outputs (other
+# columns keep the type inferred from the DataFrame)
+RESULT_DTYPES = {
+    'text_id': 'int64',
+    'num_tokens': 'int32',
+    'num_sentences': 'int32',
+    'num_entities': 'int32',
+    'avg_word_length': 'float64',
+    'start': 'int32',
+    'end': 'int32',
+    'frequency': 'int64',
+}
+
+
+def load_data(file_path: str, encoding: str = 'utf-8', columns: List[str] = None,
+              cache: bool = True) -> pd.DataFrame:
     """
-    Load tabulated data from a CSV or Excel file.
+    Load tabulated data from a CSV, Excel, JSON, Parquet or Feather file.
     
     Args:
         file_path: Path to the data file
         encoding: File encoding (default: utf-8)
+        columns: Only read these columns (default: all)
+        cache: Read Excel files through their cached Parquet copy (False
+            for results read back, which should not be cached)
         
     Returns:
         DataFrame with the loaded data
     """
     _, ext = os.path.splitext(file_path)
     
-    if ext.lower() == '.csv':
+    with metrics.stage('load_data') as counts:
+        if ext.lower() == '.csv':
+            try:
+                df = pd.read_csv(file_path, encoding=encoding, usecols=columns)
+            except UnicodeDecodeError:
+                # Try with latin-1 encoding if utf-8 fails
+                df = pd.read_csv(file_path, encoding='latin-1', usecols=columns)
+        elif ext.lower() in ['.xlsx', '.xls']:
+            df = read_excel(file_path, columns, cache=cache)
+        elif ext.lower() == '.json':
+            df = pd.read_json(file_path, orient='records')
+            if columns is not None:
+                df = df[columns]
+        elif ext.lower() == '.parquet':
+            df = pd.read_parquet(file_path, columns=columns)
+        elif ext.lower() in ['.feather', '.arrow']:
+            df = pd.read_feather(file_path, columns=columns)
+        else:
+            raise ValueError(f"Unsupported file format: {ext}")
+        counts['docs'] = len(df)
+    
+    return df
+
+
+def read_excel(file_path: str, columns: List[str] = None, cache: bool = True) -> pd.DataFrame:
+    """
+    Read an Excel file through its cached Parquet copy.
+    
+    The first read converts the whole first sheet to a Parquet file in
+    CACHE_DIR/excel; later reads load only the requested columns from it
+    while the Excel file is unchanged (same modification time and size,
+    or same content hash). Uses the calamine engine when python-calamine
+    is installed. Without pyarrow, or with EXCEL_CACHE disabled, the
+    Excel file is read directly every time.
+    
+    Args:
+        file_path: Path to the .xlsx/.xls file
+        columns: Only return these columns (default: all)
+        cache: Use the Parquet copy (False reads the Excel file directly)
+        
+    Returns:
+        DataFrame with the columns in file order
+    """
+    sidecar = _excel_sidecar(file_path) if cache else None
+    if sidecar is None:
+        return pd.read_excel(file_path, usecols=columns, engine=_excel_engine())
+    
+    df = None
+    if _sidecar_is_current(file_path, sidecar):
+        import pyarrow.parquet as pq
+        available = pq.read_schema(sidecar).names
+    else:
+        # Returned with the types of the copy, so every read gives the same frame
+        df = _with_parquet_types(pd.read_excel(file_path, engine=_excel_engine()))
+        _write_sidecar(df, file_path, sidecar)
+        available = df.columns.tolist()
+    
+    if columns is not None:
+        missing = [column for column in columns if column not in available]
+        if missing:
+            raise ValueError(f"Columns not found in {file_path}: {missing}")
+        # Keep the file's column order, as read_excel(usecols=...) does
+        columns = [column for column in available if column in columns]
+    
+    if df is None:
+        return pd.read_parquet(sidecar, columns=columns)
+    return df if columns is None else df[columns]
+
+
+def read_header(file_path: str, encoding: str = 'utf-8'):
+    """
+    Read only the column names of a CSV, Excel, Parquet or Feather file.
+    
+    Args:
+        file_path: Path to the data file
+        encoding: File encoding (default: utf-8)
+        
+    Returns:
+        Tuple of (column Index, encoding that worked)
+    """
+    _, ext = os.path.splitext(file_path)
+    ext = ext.lower()
+    
+    if ext == '.csv':
         try:
-            df = pd.read_csv(file_path, encoding=encoding)
+            available = pd.read_csv(file_path, nrows=0, encoding=encoding).columns
         except UnicodeDecodeError:
-            # Try with latin-1 encoding if utf-8 fails
-            df = pd.read_csv(file_path, encoding='latin-1')
-    elif ext.lower() in ['.xlsx', '.xls']:
-        df = pd.read_excel(file_path)
+            encoding = 'latin-1'
+            available = pd.read_csv(file_path, nrows=0, encoding=encoding).columns
+    elif ext in ['.xlsx', '.xls']:
+        sidecar = _excel_sidecar(file_path)
+        if sidecar is None:
+            available = pd.read_excel(file_path, nrows=0, engine=_excel_engine()).columns
+        elif _sidecar_is_current(file_path, sidecar):
+            import pyarrow.parquet as pq
+            available = pd.Index(pq.read_schema(sidecar).names)
+        else:
+            # Parsing a workbook reads all of it; convert it now so its rows
+            # are then read from the Parquet copy instead of parsing it again
+            available = read_excel(file_path).columns
+    elif ext in COLUMNAR_EXTENSIONS:
+        pa = _require_pyarrow()
+        if ext == '.parquet':
+            import pyarrow.parquet as pq
+            schema = pq.read_schema(file_path)
+        else:
+            schema = pa.ipc.open_file(pa.memory_map(file_path)).schema
+        available = pd.Index(schema.names)
     else:
         raise ValueError(f"Unsupported file format: {ext}")
     
-    return df
+    return available, encoding
+
+
+def iter_chunks(file_path: str, text_column: str = None, chunksize: int = None,
+                columns: List[str] = None, encoding: str = 'utf-8') -> Iterator[pd.DataFrame]:
+    """
+    Stream a CSV, Excel, Parquet or Feather file as preprocessed chunks.
+    
+    Only the text column and the ID/timestamp columns (if present) are
+    read, so memory use is bounded by the chunk size rather than by the
+    file size. Parquet files are read batch by batch and Feather files
+    are memory-mapped. Excel files cannot be read in chunks by pandas
+    and are loaded once and then split.
+    
+    Args:
+        file_path: Path to the data file
+        text_column: Name of the text column (uses config default if None)
+        chunksize: Rows per chunk (uses config default if None)
+        columns: Columns to read (default: text, ID and timestamp columns)
+        encoding: File encoding (default: utf-8)
+        
+    Returns:
+        Iterator over preprocessed DataFrame chunks
+    """
+    if text_column is None:
+        text_column = config.TEXT_COLUMN
+    if chunksize is None:
+        chunksize = config.CHUNK_SIZE
+    
+    _, ext = os.path.splitext(file_path)
+    ext = ext.lower()
+    
+    df = None
+    if ext in ['.xlsx', '.xls'] and _excel_sidecar(file_path) is None:
+        # Without a Parquet copy, read the workbook once and take the header from it
+        df = read_excel(file_path)
+        available = df.columns
+    else:
+        available, encoding = read_header(file_path, encoding)
+    
+    if text_column not in available:
+        raise ValueError(f"Column '{text_column}' not found. Available columns: {available.tolist()}")
+    
+    if columns is None:
+        columns = [column for column in available
+                   if column in (text_column, config.ID_COLUMN, config.TIMESTAMP_COLUMN)]
+    
+    if ext == '.csv':
+        reader = _read_csv_chunks(file_path, columns, chunksize, encoding)
+    elif ext == '.parquet':
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(file_path).iter_batches(batch_size=chunksize, columns=columns)
+        reader = (batch.to_pandas() for batch in batches)
+    elif ext in COLUMNAR_EXTENSIONS:
+        from pyarrow import feather
+        table = feather.read_table(file_path, columns=columns, memory_map=True)
+        reader = (table.slice(start, chunksize).to_pandas() for start in range(0, table.num_rows, chunksize))
+    else:
+        df = read_excel(file_path, columns) if df is None else df[columns]
+        reader = (df.iloc[start:start + chunksize] for start in range(0, len(df), chunksize))
+    
+    for chunk in metrics.timed_iter('load_data', reader):
+        yield preprocess_dataframe(chunk, text_column)
+
+
+def _read_csv_chunks(file_path: str, columns: List[str], chunksize: int, encoding: str) -> Iterator[pd.DataFrame]:
+    """Read a CSV file in chunks, retrying with latin-1 if utf-8 fails before any chunk is read."""
+    started = False
+    try:
+        for chunk in pd.read_csv(file_path, usecols=columns, chunksize=chunksize, encoding=encoding):
+            started = True
+            yield chunk
+    except UnicodeDecodeError:
+        if started or encoding == 'latin-1':
+            raise
+        yield from pd.read_csv(file_path, usecols=columns, chunksize=chunksize, encoding='latin-1')
 
 
 def get_text_column(df: pd.DataFrame, column_name: Optional[str] = None) -> pd.Series:
@@ -55,6 +272,54 @@ def get_text_column(df: pd.DataFrame, column_name: Optional[str] = None) -> pd.S
     return df[column_name]
 
 
+def detect_timestamp_format(values: pd.Series) -> str:
+    """
+    Format of a timestamp column (config.TIMESTAMP_FORMAT if set).
+    
+    Each of TIMESTAMP_FORMATS is tried on a sample of the values, and the
+    first that reads all of them is used (otherwise the one that reads the
+    most). Detect the format once and pass it to parse_timestamps for
+    every chunk, so all chunks are read the same way.
+    
+    Args:
+        values: Column values
+        
+    Returns:
+        Format for pd.to_datetime
+    """
+    if config.TIMESTAMP_FORMAT:
+        return config.TIMESTAMP_FORMAT
+    
+    sample = values.dropna().astype(str).head(_TIMESTAMP_SAMPLE)
+    best, best_parsed = TIMESTAMP_FORMATS[0], -1
+    for timestamp_format in TIMESTAMP_FORMATS:
+        parsed = pd.to_datetime(sample, format=timestamp_format, errors='coerce').notna().sum()
+        if parsed == len(sample):
+            return timestamp_format
+        if parsed > best_parsed:
+            best, best_parsed = timestamp_format, parsed
+    return best
+
+
+def parse_timestamps(values: pd.Series, timestamp_format: str = None) -> pd.Series:
+    """
+    Parse a timestamp column of a form export.
+    
+    Args:
+        values: Column values (datetime columns, e.g. from Excel, are kept)
+        timestamp_format: Format of the values (detected if None, see
+            detect_timestamp_format)
+        
+    Returns:
+        datetime64 Series (NaT where a value cannot be parsed)
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    if timestamp_format is None:
+        timestamp_format = detect_timestamp_format(values)
+    return pd.to_datetime(values, format=timestamp_format, errors='coerce')
+
+
 def clean_text(text: str) -> str:
     """
     Basic text cleaning.
@@ -75,6 +340,48 @@ def clean_text(text: str) -> str:
     return text.strip()
 
 
+# Characters other than ' ' that str.split() treats as whitespace. Listed
+# explicitly because regex \s differs between Python re and pyarrow's RE2.
+_OTHER_WHITESPACE = '\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f\x85\xa0\u1680\u2000\u2001\u2002\u2003' \
+                    '\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000'
+# Texts that clean_text would change: leading/trailing/repeated spaces or other whitespace
+_NEEDS_CLEANING = '^ | $|  |[' + _OTHER_WHITESPACE + ']'
+
+try:
+    import pyarrow  # noqa: F401
+    # Arrow strings run the search in native code instead of row by row
+    _STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    _STRING_DTYPE = "string"
+
+
+def clean_text_series(texts: pd.Series) -> pd.Series:
+    """
+    Vectorized version of clean_text for a whole column.
+    
+    A vectorized regex search finds the texts that contain whitespace to
+    normalize; only those are rebuilt with split/join, so the output is
+    identical to applying clean_text to every row.
+    
+    Args:
+        texts: Series of raw text values
+        
+    Returns:
+        Series of cleaned texts (missing values become "")
+    """
+    if not isinstance(texts.dtype, pd.StringDtype):
+        texts = texts.astype(_STRING_DTYPE)
+    
+    cleaned = texts.fillna("")
+    needs_cleaning = cleaned.str.contains(_NEEDS_CLEANING, regex=True).to_numpy(dtype=bool)
+    
+    if needs_cleaning.any():
+        dirty = cleaned[needs_cleaning].to_numpy(dtype=object)
+        cleaned[needs_cleaning] = [' '.join(text.split()) for text in dirty]
+    
+    return cleaned
+
+
 def preprocess_dataframe(df: pd.DataFrame, text_column: str = None) -> pd.DataFrame:
     """
     Preprocess the DataFrame for analysis.
@@ -86,40 +393,507 @@ def preprocess_dataframe(df: pd.DataFrame, text_column: str = None) -> pd.DataFr
     Returns:
         Preprocessed DataFrame
     """
-    df_clean = df.copy()
-    
     if text_column is None:
         text_column = config.TEXT_COLUMN
     
-    if text_column in df_clean.columns:
-        df_clean[text_column] = df_clean[text_column].apply(clean_text)
-        # Remove empty responses
-        df_clean = df_clean[df_clean[text_column].str.len() > 0]
+    with metrics.stage('preprocess') as counts:
+        df_clean = df.copy()
+        
+        if text_column in df_clean.columns:
+            df_clean[text_column] = clean_text_series(df_clean[text_column])
+            # Remove empty responses
+            df_clean = df_clean[df_clean[text_column].str.len() > 0]
+        counts['docs'] = len(df)
     
     return df_clean
 
 
-def save_results(df: pd.DataFrame, output_name: str, format: str = None):
+def find_near_duplicates(df: pd.DataFrame, text_column: str = None, mode: str = 'flag',
+                         threshold: float = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Find clusters of near-identical responses (e.g. spam from an open link).
+    
+    Responses whose estimated Jaccard similarity of character shingles is
+    at least `threshold` are clustered with MinHash and locality-sensitive
+    hashing (see near_duplicate_groups), in roughly linear time. The row
+    that appears first represents its cluster.
+    
+    Args:
+        df: Preprocessed DataFrame
+        text_column: Name of the text column (uses config default if None)
+        mode: 'flag' adds 'near_duplicate_of' (index of the representative
+            row, missing for unique responses) and 'near_duplicate_count'
+            (cluster size) columns; 'collapse' keeps only the
+            representative row of each cluster
+        threshold: Minimum similarity (uses config default if None)
+        
+    Returns:
+        Tuple of (DataFrame, clusters DataFrame with one row per response
+        that belongs to a cluster: 'cluster' (index of the representative
+        row), 'row' (index of the response), 'cluster_size' and the text)
+    """
+    if text_column is None:
+        text_column = config.TEXT_COLUMN
+    if mode not in NEAR_DUPLICATE_MODES:
+        raise ValueError(f"Unknown near-duplicate mode: {mode} (use one of {NEAR_DUPLICATE_MODES})")
+    
+    with metrics.stage('near_duplicates') as counts:
+        groups = near_duplicate_groups(df[text_column], threshold)
+        sizes = np.bincount(groups, minlength=len(groups))[groups]
+        in_cluster = sizes > 1
+        
+        clusters = pd.DataFrame({
+            'cluster': df.index[groups[in_cluster]],
+            'row': df.index[in_cluster],
+            'cluster_size': sizes[in_cluster],
+            text_column: df[text_column].to_numpy()[in_cluster],
+        })
+        
+        if mode == 'collapse':
+            df = df[groups == np.arange(len(groups))]
+        else:
+            df = df.copy()
+            representatives = pd.Series(df.index[groups], index=df.index).convert_dtypes()
+            df['near_duplicate_of'] = representatives.where(in_cluster)
+            df['near_duplicate_count'] = sizes
+        
+        counts['docs'] = len(groups)
+        counts['clusters'] = int((sizes[groups == np.arange(len(groups))] > 1).sum())
+        counts['near_duplicates'] = int((groups != np.arange(len(groups))).sum())
+    
+    return df, clusters
+
+
+def near_duplicate_groups(texts, threshold: float = None, num_perm: int = None,
+                          shingle_size: int = None) -> np.ndarray:
+    """
+    Cluster near-identical texts with MinHash and locality-sensitive hashing.
+    
+    Texts identical after normalization are signed once. Signatures are
+    split into bands; texts sharing a band are candidates, and a candidate
+    pair is kept when the fraction of equal MinHash values (the estimated
+    Jaccard similarity) reaches the threshold. Clusters are the connected
+    components of the kept pairs.
+    
+    Args:
+        texts: Sequence of texts
+        threshold: Minimum estimated similarity (uses config default if None)
+        num_perm: MinHash functions per signature (uses config default if None)
+        shingle_size: Characters per shingle (uses config default if None)
+        
+    Returns:
+        Array with the position of the first text of each text's cluster
+        (its own position for texts without near-duplicates)
+    """
+    from scipy import sparse
+    from scipy.sparse.csgraph import connected_components
+    
+    if threshold is None:
+        threshold = config.NEAR_DUPLICATE_THRESHOLD
+    num_perm = num_perm or config.MINHASH_PERMUTATIONS
+    
+    codes, unique_texts = pd.factorize(_normalize_for_shingles(texts))
+    signatures = minhash_signatures(unique_texts, num_perm, shingle_size)
+    num_texts = len(signatures)
+    
+    bands, rows = _lsh_bands(num_perm, threshold)
+    edges = []
+    for band in range(bands):
+        band_values = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        keys = band_values.view(np.dtype((np.void, band_values.dtype.itemsize * rows))).ravel()
+        # Every text is a candidate of the first text in its bucket
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        leaders = first[inverse.ravel()]
+        candidates = np.flatnonzero(leaders != np.arange(num_texts))
+        # Pairs packed into one integer so repeats across bands are cheap to drop
+        edges.append(candidates * num_texts + leaders[candidates])
+    
+    edges = np.unique(np.concatenate(edges)) if edges else np.zeros(0, dtype=np.int64)
+    sources, targets = edges // max(num_texts, 1), edges % max(num_texts, 1)
+    similarity = (signatures[sources] == signatures[targets]).mean(axis=1)
+    sources, targets = sources[similarity >= threshold], targets[similarity >= threshold]
+    
+    graph = sparse.csr_matrix((np.ones(len(sources)), (sources, targets)), shape=(num_texts, num_texts))
+    _, labels = connected_components(graph, directed=False)
+    
+    # Clusters of distinct texts mapped back to every text, represented
+    # by the first text of the cluster
+    labels = labels[codes]
+    first_of_label = np.full(labels.max() + 1 if len(labels) else 0, len(labels))
+    np.minimum.at(first_of_label, labels, np.arange(len(labels)))
+    return first_of_label[labels]
+
+
+def minhash_signatures(texts, num_perm: int = None, shingle_size: int = None,
+                       seed: int = 0) -> np.ndarray:
+    """
+    MinHash signatures of the character shingles of normalized texts.
+    
+    Texts are lowercased and reduced to letters, digits and single spaces,
+    then every run of shingle_size bytes is hashed. Hashing and the
+    minimum per text are computed on NumPy arrays over all texts at once
+    (in batches of shingles), without Python sets of shingles.
+    
+    Args:
+        texts: Sequence of texts
+        num_perm: Hash functions per signature (uses config default if None)
+        shingle_size: Bytes per shingle (uses config default if None)
+        seed: Seed of the hash functions
+        
+    Returns:
+        uint32 array with one row of num_perm values per text
+    """
+    num_perm = num_perm or config.MINHASH_PERMUTATIONS
+    shingle_size = shingle_size or config.SHINGLE_SIZE
+    
+    encoded = [text.encode('utf-8') for text in _normalize_for_shingles(texts)]
+    lengths = np.array([len(text) for text in encoded], dtype=np.int64)
+    # Texts are separated by shingle_size zero bytes, so no shingle spans
+    # two texts and texts shorter than a shingle still get one
+    separator = b'\0' * shingle_size
+    data = np.frombuffer(separator.join(encoded) + separator, dtype=np.uint8).astype(np.uint64)
+    starts = np.concatenate([[0], np.cumsum(lengths + shingle_size)[:-1]]).astype(np.int64)
+    num_shingles = np.maximum(lengths - shingle_size + 1, 1)
+    
+    rng = np.random.default_rng(seed)
+    # Multiply-shift hash functions: odd multipliers, upper 32 bits kept
+    multipliers = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    offsets = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+    
+    signatures = np.empty((len(encoded), num_perm), dtype=np.uint32)
+    first = 0
+    while first < len(encoded):
+        # Texts whose shingles fit in one batch (at least one text)
+        totals = np.cumsum(num_shingles[first:])
+        last = first + max(1, int(np.searchsorted(totals, _SHINGLE_BATCH, side='right')))
+        counts = num_shingles[first:last]
+        bounds = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        positions = np.repeat(starts[first:last] - bounds, counts) + np.arange(counts.sum())
+        
+        shingles = np.zeros(len(positions), dtype=np.uint64)
+        for offset in range(shingle_size):
+            shingles = shingles * np.uint64(257) + data[positions + offset]
+        
+        for column in range(num_perm):
+            hashes = ((shingles * multipliers[column] + offsets[column]) >> np.uint64(32)).astype(np.uint32)
+            signatures[first:last, column] = np.minimum.reduceat(hashes, bounds)
+        first = last
+    
+    return signatures
+
+
+def _normalize_for_shingles(texts) -> pd.Series:
+    """Texts lowercased and reduced to letters, digits and single spaces."""
+    return (pd.Series(texts, dtype=object).astype(str).str.lower()
+            .str.replace(r'[\W_]+', ' ', regex=True).str.strip())
+
+
+def _lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    Number of bands and rows per band whose LSH threshold, (1 / bands) **
+    (1 / rows), is closest to the similarity threshold.
+    """
+    options = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    return min(options, key=lambda option: abs((1 / option[0]) ** (1 / option[1]) - threshold))
+
+
+def save_results(df: pd.DataFrame, output_name: str, format: str = None, append: bool = False):
     """
     Save analysis results to file.
     
     Args:
         df: DataFrame to save
         output_name: Base name for output file
-        format: Output format ('csv', 'xlsx', or 'json')
+        format: Output format ('csv', 'xlsx', 'json', 'parquet' or 'feather')
+        append: Append rows to an existing CSV file instead of replacing it
+    
+    Returns:
+        Path of the saved file
     """
     if format is None:
         format = config.EXPORT_FORMAT
     
     output_path = os.path.join(config.OUTPUT_DIR, f"{output_name}.{format}")
     
-    if format == 'csv':
-        df.to_csv(output_path, index=False, encoding='utf-8')
-    elif format == 'xlsx':
-        df.to_excel(output_path, index=False)
-    elif format == 'json':
-        df.to_json(output_path, orient='records', force_ascii=False, indent=2)
-    else:
-        raise ValueError(f"Unsupported format: {format}")
+    if append and format != 'csv':
+        raise ValueError(f"Appending is only supported for csv, not {format}")
+    
+    with metrics.stage('save_results') as counts:
+        if append and os.path.exists(output_path):
+            # Keep the column layout of the existing file
+            columns = pd.read_csv(output_path, nrows=0, encoding='utf-8').columns
+            df.reindex(columns=columns).to_csv(output_path, mode='a', header=False,
+                                               index=False, encoding='utf-8')
+        elif format == 'csv':
+            df.to_csv(output_path, index=False, encoding='utf-8')
+        elif format == 'xlsx':
+            df.to_excel(output_path, index=False)
+        elif format == 'json':
+            df.to_json(output_path, orient='records', force_ascii=False, indent=2)
+        elif format == 'parquet':
+            _require_pyarrow()
+            _with_result_dtypes(df).to_parquet(output_path, index=False,
+                                               compression=config.PARQUET_COMPRESSION)
+        elif format == 'feather':
+            _require_pyarrow()
+            _with_result_dtypes(df).reset_index(drop=True).to_feather(
+                output_path, compression=config.FEATHER_COMPRESSION)
+        else:
+            raise ValueError(f"Unsupported format: {format}")
+        counts['rows'] = len(df)
     
     print(f"Results saved to: {output_path}")
+    return output_path
+
+
+class ResultWriter:
+    """
+    Writes a result table piece by piece, as chunks of the input finish.
+    
+    CSV pieces are appended to the file, Parquet pieces become row groups
+    and Feather pieces record batches of one Arrow IPC file, so memory use
+    does not grow with the number of pieces. Parquet and Feather files use
+    the column types of the first piece (see RESULT_DTYPES; columns empty
+    in it get their RESULT_DTYPES type or hold text) and are only
+    readable once the writer is closed. Excel and JSON cannot be appended
+    to and are written on close.
+    
+    Usage:
+        with ResultWriter("analysis_statistics", format='parquet') as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+    """
+    
+    def __init__(self, output_name: str, format: str = None, append: bool = False):
+        """
+        Prepare a writer; the file is created by the first write.
+        
+        Args:
+            output_name: Base name for output file
+            format: Output format (uses config default if None)
+            append: Add to an existing CSV file instead of replacing it
+        """
+        if format is None:
+            format = config.EXPORT_FORMAT
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported format: {format}")
+        if append and format != 'csv':
+            raise ValueError(f"Appending is only supported for csv, not {format}")
+        
+        self.output_name = output_name
+        self.format = format
+        self.path = os.path.join(config.OUTPUT_DIR, f"{output_name}.{format}")
+        self.append = append
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+        self._pending = []
+    
+    def write(self, df: pd.DataFrame):
+        """
+        Add rows to the output.
+        
+        Args:
+            df: Rows to write (same columns as earlier pieces)
+        """
+        with metrics.stage('save_results') as counts:
+            if self.format == 'csv':
+                appending = self.append or self.rows > 0
+                if appending and os.path.exists(self.path):
+                    # Keep the column layout of the existing file
+                    columns = pd.read_csv(self.path, nrows=0, encoding='utf-8').columns
+                    df.reindex(columns=columns).to_csv(self.path, mode='a', header=False,
+                                                       index=False, encoding='utf-8')
+                else:
+                    df.to_csv(self.path, index=False, encoding='utf-8')
+            elif self.format in ('parquet', 'feather'):
+                self._write_table(df)
+            else:
+                self._pending.append(df)
+            counts['rows'] = len(df)
+        
+        self.rows += len(df)
+    
+    def close(self) -> Optional[str]:
+        """
+        Finish the file.
+        
+        Returns:
+            Path of the saved file, or None if nothing was written
+        """
+        if self._pending:
+            save_results(pd.concat(self._pending, ignore_index=True), self.output_name, format=self.format)
+            self._pending = []
+            return self.path
+        
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        
+        if self.rows == 0:
+            return None
+        print(f"Results saved to: {self.path}")
+        return self.path
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _write_table(self, df: pd.DataFrame):
+        """Append a DataFrame as a Parquet row group or Feather record batch."""
+        pa = _require_pyarrow()
+        
+        if self._schema is not None:
+            df = df.reindex(columns=self._schema.names)
+        table = pa.Table.from_pandas(_with_result_dtypes(df), preserve_index=False)
+        
+        if self._writer is None:
+            self._schema = pa.schema([_typed_field(field) for field in table.schema],
+                                     metadata=table.schema.metadata)
+            if self.format == 'parquet':
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.path, self._schema,
+                                                compression=config.PARQUET_COMPRESSION or 'none')
+            else:
+                compression = config.FEATHER_COMPRESSION
+                options = pa.ipc.IpcWriteOptions(
+                    compression=None if compression == 'uncompressed' else compression)
+                self._writer = pa.ipc.new_file(self.path, self._schema, options=options)
+        
+        self._writer.write_table(table.cast(self._schema))
+
+
+def _typed_field(field):
+    """
+    Arrow field of a result column, typing columns that are empty in the
+    first piece: known result columns get their RESULT_DTYPES type and
+    the rest hold text.
+    """
+    import pyarrow as pa
+    
+    if not pa.types.is_null(field.type):
+        return field
+    if field.name in RESULT_DTYPES:
+        return field.with_type(pa.from_numpy_dtype(np.dtype(RESULT_DTYPES[field.name])))
+    return field.with_type(pa.string())
+
+
+def _with_result_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast the known result columns to their RESULT_DTYPES type."""
+    dtypes = {column: dtype for column, dtype in RESULT_DTYPES.items()
+              if column in df.columns and df[column].notna().all()}
+    return df.astype(dtypes) if dtypes else df
+
+
+def _with_parquet_types(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast object columns to pyarrow strings (missing values stay null).
+    
+    Excel columns often mix types, e.g. one numeric answer among texts,
+    which Parquet cannot store in one column.
+    """
+    dtypes = {column: 'string[pyarrow]' for column in df.columns if df[column].dtype == object}
+    return df.astype(dtypes) if dtypes else df
+
+
+def _excel_engine() -> Optional[str]:
+    """The configured Excel engine, or calamine if installed (None = pandas default)."""
+    if config.EXCEL_ENGINE:
+        return config.EXCEL_ENGINE
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return None
+    return 'calamine'
+
+
+def _excel_sidecar(file_path: str) -> Optional[str]:
+    """Path of the cached Parquet copy of an Excel file, or None if not cached."""
+    if not config.EXCEL_CACHE:
+        return None
+    try:
+        _require_pyarrow()
+    except ImportError:
+        return None
+    
+    # One copy per Excel path; the name keeps the file recognizable
+    source = os.path.abspath(file_path)
+    name = os.path.splitext(os.path.basename(source))[0]
+    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(config.CACHE_DIR, "excel", f"{name}-{digest}.parquet")
+
+
+def _sidecar_is_current(file_path: str, sidecar: str) -> bool:
+    """Check that a Parquet copy was made from the current contents of an Excel file."""
+    meta = _read_sidecar_meta(sidecar)
+    if meta is None or not os.path.exists(sidecar):
+        return False
+    
+    stat = os.stat(file_path)
+    if meta['mtime_ns'] == stat.st_mtime_ns and meta['size'] == stat.st_size:
+        return True
+    if meta['size'] != stat.st_size or meta['sha256'] != _file_sha256(file_path):
+        return False
+    
+    # Touched or copied but unchanged: remember the new modification time
+    meta['mtime_ns'] = stat.st_mtime_ns
+    _write_sidecar_meta(sidecar, meta)
+    return True
+
+
+def _write_sidecar(df: pd.DataFrame, file_path: str, sidecar: str):
+    """Store the Parquet copy of an Excel file and the metadata that validates it."""
+    import pyarrow as pa
+    
+    os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+    stat = os.stat(file_path)
+    temp_path = f"{sidecar}.{os.getpid()}.tmp"
+    try:
+        _with_parquet_types(df).to_parquet(temp_path, index=False, compression=config.PARQUET_COMPRESSION)
+    except (pa.ArrowException, TypeError, ValueError) as e:
+        print(f"Could not cache {file_path} as Parquet ({e}); it will be read from Excel again")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return
+    
+    os.replace(temp_path, sidecar)
+    _write_sidecar_meta(sidecar, {
+        'source': os.path.abspath(file_path),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'sha256': _file_sha256(file_path),
+    })
+
+
+def _read_sidecar_meta(sidecar: str) -> Optional[Dict]:
+    meta_path = os.path.splitext(sidecar)[0] + ".json"
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_sidecar_meta(sidecar: str, meta: Dict):
+    meta_path = os.path.splitext(sidecar)[0] + ".json"
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+def _file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _require_pyarrow():
+    """Import pyarrow, which Parquet and Feather files need."""
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        raise ImportError("Parquet and Feather files need pyarrow: pip install pyarrow")
+    return pyarrow
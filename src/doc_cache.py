@@ -0,0 +1,186 @@
+"""
+Persistent cache of parsed spaCy documents
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+from typing import Dict, Iterable, List, Set, Tuple
+import spacy
+from spacy.tokens import DocBin
+import config
+
+
+# Number of keys per SQL "IN (...)" query
+_QUERY_CHUNK = 500
+
+
+class DocCache:
+    """
+    On-disk cache of parsed documents with a size cap and LRU eviction.
+
+    Each document is stored as a serialized DocBin in a SQLite table,
+    keyed by a hash of the text, the model name and version, and the
+    active pipeline components.
+    """
+
+    def __init__(self, nlp, model_name: str = None, cache_dir: str = None, max_size_mb: float = None):
+        """
+        Open (or create) the cache for a loaded pipeline.
+
+        Args:
+            nlp: Loaded spaCy Language object
+            model_name: Name of the spaCy model (uses config default if None)
+            cache_dir: Directory for the cache database (uses config default if None)
+            max_size_mb: Maximum cache size in megabytes (uses config default if None)
+        """
+        if model_name is None:
+            model_name = config.SPACY_MODEL
+        if cache_dir is None:
+            cache_dir = config.CACHE_DIR
+        if max_size_mb is None:
+            max_size_mb = config.DOC_CACHE_MAX_MB
+
+        self.vocab = nlp.vocab
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.model_id = "|".join([
+            model_name,
+            nlp.meta.get('version', ''),
+            spacy.__version__,
+        ])
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "docs.sqlite")
+        # Several processes (batch runner workers) may share the cache; wait for locks
+        self.conn = sqlite3.connect(self.path, timeout=60)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "key TEXT PRIMARY KEY, data BLOB NOT NULL, "
+            "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS docs_last_used ON docs (last_used)")
+        self.conn.commit()
+
+        self.total_size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM docs").fetchone()[0]
+
+    def key(self, text: str, pipes: Iterable[str]) -> str:
+        """
+        Build the cache key for a text parsed with the given components.
+
+        Args:
+            text: Cleaned input text
+            pipes: Names of the pipeline components that were run
+
+        Returns:
+            Hex digest identifying the parsed document
+        """
+        digest = hashlib.sha1()
+        digest.update(self.model_id.encode('utf-8'))
+        digest.update(b"\0")
+        digest.update(",".join(pipes).encode('utf-8'))
+        digest.update(b"\0")
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def contains(self, keys: List[str]) -> Set[str]:
+        """
+        Return the subset of keys that are present in the cache.
+
+        Args:
+            keys: Cache keys to look up
+        """
+        found = set()
+        for chunk in _chunks(list(set(keys)), _QUERY_CHUNK):
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(f"SELECT key FROM docs WHERE key IN ({placeholders})", chunk)
+            found.update(row[0] for row in rows)
+        return found
+
+    def get_many(self, keys: List[str]) -> Dict:
+        """
+        Load cached documents and mark them as recently used.
+
+        Args:
+            keys: Cache keys to load
+
+        Returns:
+            Dictionary mapping each found key to its Doc
+        """
+        docs = {}
+        now = time.time()
+        for chunk in _chunks(list(set(keys)), _QUERY_CHUNK):
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(f"SELECT key, data FROM docs WHERE key IN ({placeholders})", chunk)
+            for key, data in rows:
+                docs[key] = next(iter(DocBin().from_bytes(data).get_docs(self.vocab)))
+
+        if docs:
+            self.conn.executemany("UPDATE docs SET last_used = ? WHERE key = ?",
+                                  [(now, key) for key in docs])
+            self.conn.commit()
+
+        return docs
+
+    def put_many(self, items: List[Tuple[str, object]]):
+        """
+        Store parsed documents, evicting the least recently used ones if
+        the cache grows beyond its size cap.
+
+        Args:
+            items: List of (key, Doc) pairs
+        """
+        if not items:
+            return
+
+        now = time.time()
+        rows = []
+        for key, doc in items:
+            data = DocBin(docs=[doc], store_user_data=False).to_bytes()
+            rows.append((key, data, len(data), now))
+
+        # Replaced keys are counted twice until the next full recount, which
+        # only makes eviction slightly eager
+        self.conn.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?)", rows)
+        self.conn.commit()
+        self.total_size += sum(row[2] for row in rows)
+
+        if self.total_size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used documents until the cache is below 90% of its cap."""
+        target = int(self.max_size * 0.9)
+        self.total_size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM docs").fetchone()[0]
+
+        while self.total_size > target:
+            rows = self.conn.execute("SELECT key, size FROM docs ORDER BY last_used LIMIT ?",
+                                     (_QUERY_CHUNK,)).fetchall()
+            if not rows:
+                break
+
+            evicted = []
+            for key, size in rows:
+                evicted.append((key,))
+                self.total_size -= size
+                if self.total_size <= target:
+                    break
+
+            self.conn.executemany("DELETE FROM docs WHERE key = ?", evicted)
+            self.conn.commit()
+
+    def clear(self):
+        """Remove every cached document."""
+        self.conn.execute("DELETE FROM docs")
+        self.conn.commit()
+        self.total_size = 0
+
+    def close(self):
+        """Close the underlying database connection."""
+        self.conn.close()
+
+
+def _chunks(items: List, size: int):
+    """Yield successive slices of a list."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
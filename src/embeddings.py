@@ -0,0 +1,605 @@
+"""
+Document vectors, topic clustering and similar-response search
+"""
+
+import os
+import json
+import argparse
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from scipy import sparse
+import config
+from src import metrics
+from src.keywords import document_term_matrix
+
+
+EMBEDDING_METHODS = ('auto', 'vectors', 'hashing')
+
+# Rows of a (memory-mapped) matrix processed at a time
+_BLOCK_ROWS = 65536
+
+
+def resolve_method(method: str, vectors=None) -> str:
+    """
+    The embedding method actually used for a model.
+
+    Args:
+        method: 'vectors', 'hashing' or 'auto' ('vectors' when the model
+            has word vectors, as the md and lg models do)
+        vectors: spaCy Vectors table of the model (nlp.vocab.vectors)
+
+    Returns:
+        'vectors' or 'hashing'
+    """
+    if method not in EMBEDDING_METHODS:
+        raise ValueError(f"Unknown embedding method: {method} (use one of {EMBEDDING_METHODS})")
+    if method == 'auto':
+        return 'vectors' if vectors is not None and vectors.size > 0 else 'hashing'
+    if method == 'vectors' and (vectors is None or vectors.size == 0):
+        raise ValueError("The spaCy model has no word vectors (use an md or lg model, or 'hashing')")
+    return method
+
+
+def document_vectors(store, method: str = 'auto', vectors=None, dim: int = None) -> np.ndarray:
+    """
+    One unit-length float32 vector per parsed doc of a TokenStore.
+
+    - 'vectors': average of the model's word vectors over the content
+      words of the doc (words missing from the table are looked up
+      lowercased, then left out).
+    - 'hashing': bag of lowercased content lemmas with sublinear term
+      frequency (1 + log tf), hashed into dim signed buckets.
+
+    Both are computed as one sparse (docs x words) product, without
+    per-token Python objects. Docs without any known content word get a
+    zero vector.
+
+    Args:
+        store: Parsed TokenStore (with the 'words' output)
+        method: 'vectors', 'hashing' or 'auto' (see resolve_method)
+        vectors: spaCy Vectors table of the model (nlp.vocab.vectors)
+        dim: Dimensions of hashed vectors (uses config default if None)
+
+    Returns:
+        Array of shape (store.num_docs, dim); fan it out to texts with
+        store.per_doc
+    """
+    method = resolve_method(method, vectors)
+
+    if method == 'vectors':
+        mask = store.content_mask()
+        keys, columns = np.unique(store.orth[mask], return_inverse=True)
+        counts = sparse.csr_matrix((np.ones(int(mask.sum()), dtype=np.float32),
+                                    (store.token_doc_index()[mask], columns.ravel())),
+                                   shape=(store.num_docs, len(keys)))
+        result = np.asarray(counts @ _key_vectors(vectors, keys, store.strings), dtype=np.float32)
+    else:
+        dim = dim or config.EMBEDDING_DIM
+        counts, terms = document_term_matrix(store, per_text=False)
+        counts = counts.astype(np.float32)
+        counts.data = 1 + np.log(counts.data)
+        # Bucket and sign from different bits of the (already mixed) lemma hash
+        buckets = (terms % np.uint64(dim)).astype(np.int64)
+        signs = np.where((terms >> np.uint64(32)) & np.uint64(1), -1, 1).astype(np.float32)
+        projection = sparse.csr_matrix((signs, (np.arange(len(terms)), buckets)), shape=(len(terms), dim))
+        result = (counts @ projection).toarray().astype(np.float32)
+
+    norms = np.linalg.norm(result, axis=1, keepdims=True)
+    result /= np.where(norms > 0, norms, 1)
+    return result
+
+
+class EmbeddingWriter:
+    """
+    Writes document vectors chunk by chunk into one float32 .npy matrix.
+
+    Rows are appended to the file as they arrive, and the header is
+    rewritten with the final shape on close (NumPy leaves room for the row
+    count to grow), so the matrix is never held in memory. Read it back
+    with load_embeddings, which memory-maps it. The method and model the
+    vectors came from are saved next to it (<name>.json), so later runs
+    and queries embed texts the same way.
+
+    Usage:
+        writer = EmbeddingWriter("analysis_embeddings")
+        for chunk in chunks:
+            analyzer.analyze_corpus(texts, outputs=['embeddings'], embedding_writer=writer)
+        vectors = load_embeddings(writer.close())
+    """
+
+    def __init__(self, output_name: str, method: str = None, model: str = None, append: bool = False):
+        """
+        Prepare a writer; the file is created by the first add.
+
+        Args:
+            output_name: Base name of the output file
+            method: Embedding method of the vectors (uses config default if None)
+            model: spaCy model the vectors come from (uses config default if None)
+            append: Add rows to an existing matrix instead of replacing it
+        """
+        self.path = os.path.join(config.OUTPUT_DIR, f"{output_name}.npy")
+        self.meta_path = os.path.join(config.OUTPUT_DIR, f"{output_name}.json")
+        self.method = method or config.EMBEDDING_METHOD
+        self.model = model or config.SPACY_MODEL
+        self.rows = 0
+        self.dim = None
+        self._file = None
+        self._header_size = 0
+
+        if append and os.path.exists(self.path):
+            meta = load_embedding_info(self.path)
+            if (meta['method'], meta['model']) != (self.method, self.model):
+                raise ValueError(f"{self.path} holds '{meta['method']}' vectors of {meta['model']}, "
+                                 f"not '{self.method}' vectors of {self.model}")
+            existing = load_embeddings(self.path)
+            (self.rows, self.dim), self._header_size = existing.shape, existing.offset
+            del existing
+            self._file = open(self.path, 'r+b')
+            self._file.seek(0, os.SEEK_END)
+
+    def add(self, vectors: np.ndarray, rows: Optional[np.ndarray] = None):
+        """
+        Append vectors to the matrix.
+
+        Args:
+            vectors: Array of document vectors, one row each
+            rows: Optional position in vectors of every row to write (e.g.
+                TokenStore.rows, so identical texts share one computed vector)
+        """
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Got {vectors.shape[1]}-dimensional vectors for a {self.dim}-dimensional matrix")
+
+        if self._file is None:
+            self._file = open(self.path, 'wb')
+            self._write_header()
+
+        num_rows = len(vectors) if rows is None else len(rows)
+        for offset in range(0, num_rows, _BLOCK_ROWS):
+            block = slice(offset, offset + _BLOCK_ROWS)
+            part = vectors[block] if rows is None else vectors[rows[block]]
+            self._file.write(np.ascontiguousarray(part, dtype='<f4').tobytes())
+        self.rows += num_rows
+
+    def close(self) -> Optional[str]:
+        """
+        Write the final shape and the embedding info.
+
+        Returns:
+            Path of the matrix, or None if nothing was written
+        """
+        if self._file is None:
+            return None
+
+        self._file.seek(0)
+        self._write_header()
+        self._file.close()
+        self._file = None
+
+        with open(self.meta_path, 'w', encoding='utf-8') as fp:
+            json.dump({'method': self.method, 'model': self.model, 'rows': self.rows, 'dim': self.dim}, fp, indent=2)
+        return self.path
+
+    def _write_header(self):
+        start = self._file.tell()
+        np.lib.format.write_array_header_1_0(
+            self._file, {'descr': '<f4', 'fortran_order': False, 'shape': (self.rows, self.dim)})
+        size = self._file.tell() - start
+        if self._header_size and size != self._header_size:
+            raise ValueError(f"The header of {self.path} cannot be rewritten in place")
+        self._header_size = size
+
+
+def load_embeddings(path: str) -> np.ndarray:
+    """
+    Memory-map a matrix written by EmbeddingWriter (read-only).
+
+    Args:
+        path: Path of the .npy file
+    """
+    return np.load(path, mmap_mode='r')
+
+
+def load_embedding_info(path: str) -> Dict:
+    """
+    Method, model, rows and dim of a matrix written by EmbeddingWriter.
+
+    Args:
+        path: Path of the .npy file
+    """
+    with open(os.path.splitext(path)[0] + '.json', encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+class MiniBatchKMeans:
+    """
+    Spherical k-means on unit-length vectors, trained on mini-batches.
+
+    Centers start from k-means++ on a sample and are then moved towards
+    random mini-batches with per-center learning rates 1 / (rows seen)
+    (Sculley, 2010), so training reads only batch_size rows per step and
+    works on memory-mapped matrices of any size. Rows are assigned to the
+    center with the highest cosine similarity. Zero rows (responses
+    without content words) are left out and get cluster -1.
+
+    Training stops after max_iter steps, or earlier once the smoothed
+    mean similarity of the batches stops improving.
+    """
+
+    def __init__(self, n_clusters: int, batch_size: int = None, max_iter: int = None, seed: int = 0):
+        """
+        Create an untrained model.
+
+        Args:
+            n_clusters: Number of clusters
+            batch_size: Rows per training step (uses config default if None)
+            max_iter: Maximum training steps (uses config default if None)
+            seed: Seed of the random sampling
+        """
+        self.n_clusters = n_clusters
+        self.batch_size = batch_size or config.KMEANS_BATCH_SIZE
+        self.max_iter = max_iter or config.KMEANS_MAX_ITER
+        self.seed = seed
+        self.centers: Optional[np.ndarray] = None
+        self.n_iter = 0
+
+    def fit(self, vectors: np.ndarray, patience: int = 10) -> "MiniBatchKMeans":
+        """
+        Train the centers.
+
+        Args:
+            vectors: Array or memory-mapped matrix of unit-length rows
+            patience: Steps without improvement before stopping early
+
+        Returns:
+            The trained model
+        """
+        rng = np.random.default_rng(self.seed)
+        valid = np.flatnonzero(_row_norms(vectors) > 0)
+        k = min(self.n_clusters, len(valid))
+        if k == 0:
+            self.centers = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            return self
+
+        sample_size = min(len(valid), max(3 * self.batch_size, 10 * k))
+        sample = _read_rows(vectors, rng.choice(valid, sample_size, replace=False))
+        centers = _kmeans_plusplus(sample, k, rng)
+        seen = np.zeros(k, dtype=np.float64)
+
+        best, average, stale = -np.inf, None, 0
+        for step in range(self.max_iter):
+            batch = _read_rows(vectors, valid[rng.integers(len(valid), size=min(self.batch_size, len(valid)))])
+            scores = batch @ centers.T
+            labels = scores.argmax(axis=1)
+            similarity = scores[np.arange(len(batch)), labels].mean()
+
+            # Sum the batch rows of every center: (centers x rows) indicator times rows
+            indicator = sparse.csr_matrix((np.ones(len(batch), dtype=np.float32), (labels, np.arange(len(batch)))),
+                                          shape=(k, len(batch)))
+            sums = np.asarray(indicator @ batch)
+            batch_counts = np.bincount(labels, minlength=k)
+            moved = batch_counts > 0
+            seen[moved] += batch_counts[moved]
+            centers[moved] += ((sums[moved] - batch_counts[moved, None] * centers[moved])
+                               / seen[moved, None]).astype(np.float32)
+            centers /= np.maximum(np.linalg.norm(centers, axis=1, keepdims=True), 1e-12)
+
+            average = similarity if average is None else 0.9 * average + 0.1 * similarity
+            if average > best + 1e-4:
+                best, stale = average, 0
+            else:
+                stale += 1
+                if stale >= patience:
+                    break
+
+        self.centers = centers
+        self.n_iter = step + 1
+        return self
+
+    def predict(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Assign every row to its closest center, a block of rows at a time.
+
+        Args:
+            vectors: Array or memory-mapped matrix of unit-length rows
+
+        Returns:
+            Tuple of (cluster of every row, -1 for zero rows; cosine
+            similarity of every row to its center)
+        """
+        labels = np.full(len(vectors), -1, dtype=np.int64)
+        similarity = np.zeros(len(vectors), dtype=np.float32)
+        if self.centers is None or len(self.centers) == 0:
+            return labels, similarity
+
+        for start in range(0, len(vectors), _BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + _BLOCK_ROWS], dtype=np.float32)
+            scores = block @ self.centers.T
+            best = scores.argmax(axis=1)
+            valid = block.any(axis=1)
+            labels[start:start + len(block)] = np.where(valid, best, -1)
+            similarity[start:start + len(block)] = np.where(valid, scores[np.arange(len(block)), best], 0)
+        return labels, similarity
+
+
+class SimilarityIndex:
+    """
+    Inverted-file (IVF) index for approximate nearest-neighbor search.
+
+    The rows are split into lists by a coarse MiniBatchKMeans (about
+    sqrt(rows) lists); a query only compares exactly against the rows of
+    the n_probe lists whose centers are closest to it, instead of every
+    row. The index keeps the list centers and the row numbers of every
+    list; the vectors themselves stay in their (memory-mapped) matrix.
+
+    Usage:
+        index = SimilarityIndex.build(load_embeddings(path))
+        ids, scores = index.search(analyzer.embed(["texto de consulta"]), n=10)
+    """
+
+    def __init__(self, vectors: np.ndarray, centers: np.ndarray, order: np.ndarray, offsets: np.ndarray):
+        """
+        Wrap a built index (see build and load).
+
+        Args:
+            vectors: Matrix of indexed rows
+            centers: Center of every list
+            order: Row numbers, grouped by list
+            offsets: order[offsets[i]:offsets[i + 1]] are the rows of list i
+        """
+        self.vectors = vectors
+        self.centers = centers
+        self.order = order
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, n_lists: int = None, seed: int = 0) -> "SimilarityIndex":
+        """
+        Index the rows of a matrix.
+
+        Args:
+            vectors: Array or memory-mapped matrix of unit-length rows
+            n_lists: Number of lists (default: square root of the row count)
+            seed: Seed of the coarse clustering
+
+        Returns:
+            SimilarityIndex over every non-zero row
+        """
+        with metrics.stage('similarity_index') as counts:
+            n_lists = n_lists or max(1, int(np.sqrt(len(vectors))))
+            quantizer = MiniBatchKMeans(n_lists, max_iter=config.ANN_TRAIN_ITER, seed=seed).fit(vectors)
+            labels, _ = quantizer.predict(vectors)
+
+            indexed = np.flatnonzero(labels >= 0)
+            order = indexed[np.argsort(labels[indexed], kind='stable')]
+            sizes = np.bincount(labels[indexed], minlength=len(quantizer.centers))
+            offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+            counts['rows'] = len(order)
+            counts['lists'] = len(sizes)
+
+        return cls(vectors, quantizer.centers, order, offsets)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def search(self, queries: np.ndarray, n: int = 10, n_probe: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate n most similar rows of every query.
+
+        Args:
+            queries: Array of unit-length query vectors, one row each
+            n: Number of neighbors per query
+            n_probe: Lists searched per query (uses config default if None);
+                more lists are slower but miss fewer neighbors
+
+        Returns:
+            Tuple of (row numbers, cosine similarities), both of shape
+            (queries, n), most similar first; rows without any similarity
+            (sharing no words with the query) are left out, and missing
+            neighbors are -1 and nan
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        ids = np.full((len(queries), n), -1, dtype=np.int64)
+        scores = np.full((len(queries), n), np.nan, dtype=np.float32)
+        if len(self.centers) == 0:
+            return ids, scores
+
+        n_probe = min(n_probe or config.ANN_PROBES, len(self.centers))
+        probes = np.argpartition(-(queries @ self.centers.T), n_probe - 1, axis=1)[:, :n_probe]
+
+        for i, query in enumerate(queries):
+            if not query.any():
+                # A query without content words is similar to nothing
+                continue
+            lists = probes[i]
+            starts, ends = self.offsets[lists], self.offsets[lists + 1]
+            candidates = np.sort(np.concatenate([self.order[s:e] for s, e in zip(starts.tolist(), ends.tolist())]))
+            similarity = np.asarray(self.vectors[candidates], dtype=np.float32) @ query
+            # Unrelated rows are not listed as neighbors
+            related = similarity > 0
+            candidates, similarity = candidates[related], similarity[related]
+            top = min(n, len(candidates))
+            if top == 0:
+                continue
+            best = np.argpartition(-similarity, top - 1)[:top]
+            best = best[np.argsort(-similarity[best], kind='stable')]
+            ids[i, :top] = candidates[best]
+            scores[i, :top] = similarity[best]
+
+        return ids, scores
+
+    def save(self, path: str) -> str:
+        """
+        Save the lists (not the vectors) to a .npz file.
+
+        Args:
+            path: Output path
+
+        Returns:
+            Path of the saved file
+        """
+        np.savez(path, centers=self.centers, order=self.order, offsets=self.offsets,
+                 num_rows=np.int64(len(self.vectors)))
+        return path
+
+    @classmethod
+    def load(cls, path: str, vectors: np.ndarray) -> Optional["SimilarityIndex"]:
+        """
+        Load an index saved for a matrix.
+
+        Args:
+            path: Path of the .npz file
+            vectors: The indexed matrix
+
+        Returns:
+            SimilarityIndex, or None if the file is missing or was built for
+            a matrix with a different number of rows
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data['num_rows']) != len(vectors):
+                return None
+            return cls(vectors, data['centers'], data['order'], data['offsets'])
+
+
+def cluster_responses(vectors: np.ndarray, n_clusters: int,
+                      examples: int = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Group responses into topic clusters from their document vectors.
+
+    Clusters are numbered by size, 0 being the largest.
+
+    Args:
+        vectors: Array or memory-mapped matrix with the vector of every
+            response, row i being text_id i
+        n_clusters: Number of clusters
+        examples: Responses closest to each center listed in the summary
+            (uses config default if None)
+
+    Returns:
+        Tuple of (DataFrame with text_id, cluster and similarity columns,
+        -1 for responses without content words; DataFrame with cluster,
+        size, text_id and similarity of the examples of every cluster)
+    """
+    with metrics.stage('clustering') as counts:
+        kmeans = MiniBatchKMeans(n_clusters).fit(vectors)
+        labels, similarity = kmeans.predict(vectors)
+
+        sizes = np.bincount(labels[labels >= 0], minlength=len(kmeans.centers))
+        rank = np.empty(len(sizes), dtype=np.int64)
+        rank[np.argsort(-sizes, kind='stable')] = np.arange(len(sizes))
+        labels = np.where(labels >= 0, rank[np.maximum(labels, 0)], -1)
+
+        assignments = pd.DataFrame({
+            'text_id': np.arange(len(vectors), dtype=np.int64),
+            'cluster': labels,
+            'similarity': similarity,
+        })
+        clustered = assignments.loc[assignments['cluster'] >= 0, ['cluster', 'text_id', 'similarity']]
+        summary = (clustered.sort_values(['cluster', 'similarity'], ascending=[True, False], kind='stable')
+                   .groupby('cluster').head(examples or config.CLUSTER_EXAMPLES))
+        summary.insert(1, 'size', np.sort(sizes)[::-1][summary['cluster'].to_numpy()])
+        counts['docs'] = len(vectors)
+        counts['iterations'] = kmeans.n_iter
+
+    return assignments, summary.reset_index(drop=True)
+
+
+def _key_vectors(vectors, keys: np.ndarray, strings) -> np.ndarray:
+    """
+    Word vectors of orth hashes, zero for words missing from the table.
+
+    Missing words are looked up again lowercased (e.g. at the start of a sentence).
+    """
+    if vectors.mode == 'floret':
+        # Floret tables build a vector for any word from its character n-grams
+        return np.asarray(vectors.get_batch(keys), dtype=np.float32)
+
+    found = np.asarray(vectors.find(keys=keys))
+    missing = np.flatnonzero(found < 0)
+    if len(missing):
+        lowered = np.array([strings.add(strings[key].lower()) for key in keys[missing].tolist()], dtype=np.uint64)
+        found[missing] = np.asarray(vectors.find(keys=lowered))
+
+    result = np.zeros((len(keys), vectors.shape[1]), dtype=np.float32)
+    result[found >= 0] = np.asarray(vectors.data)[found[found >= 0]]
+    return result
+
+
+def _row_norms(vectors: np.ndarray) -> np.ndarray:
+    """L2 norm of every row, reading a block of rows at a time."""
+    return np.concatenate([np.linalg.norm(np.asarray(vectors[start:start + _BLOCK_ROWS]), axis=1)
+                           for start in range(0, len(vectors), _BLOCK_ROWS)] or [np.zeros(0)])
+
+
+def _read_rows(vectors: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Rows of a (memory-mapped) matrix as float32, read in file order."""
+    order = np.argsort(rows, kind='stable')
+    result = np.empty((len(rows), vectors.shape[1]), dtype=np.float32)
+    result[order] = vectors[rows[order]]
+    return result
+
+
+def _kmeans_plusplus(sample: np.ndarray, k: int, rng) -> np.ndarray:
+    """k initial centers picked from sample rows with k-means++ (cosine distance)."""
+    centers = np.empty((k, sample.shape[1]), dtype=np.float32)
+    centers[0] = sample[rng.integers(len(sample))]
+    distance = np.maximum(1 - sample @ centers[0], 0)
+
+    for i in range(1, k):
+        total = distance.sum()
+        pick = rng.choice(len(sample), p=distance / total) if total > 0 else rng.integers(len(sample))
+        centers[i] = sample[pick]
+        distance = np.minimum(distance, np.maximum(1 - sample @ centers[i], 0))
+    return centers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the responses most similar to a text")
+    parser.add_argument("embeddings", help="Path to the _embeddings.npy file written by analyze.py --clusters")
+    parser.add_argument("queries", nargs="+", help="Texts to search for")
+    parser.add_argument("-n", type=int, default=10, help="Responses per query (default: 10)")
+    parser.add_argument("--probes", type=int, default=None,
+                        help=f"Index lists searched per query (default: {config.ANN_PROBES})")
+    parser.add_argument("--text-column", "-c", default=config.TEXT_COLUMN,
+                        help="Column of the statistics output with the responses")
+
+    args = parser.parse_args()
+
+    from src.text_analyzer import TextAnalyzer
+    from src.data_loader import load_data, EXPORT_FORMATS
+
+    info = load_embedding_info(args.embeddings)
+    matrix = load_embeddings(args.embeddings)
+    index_path = os.path.splitext(args.embeddings)[0] + '_index.npz'
+    index = SimilarityIndex.load(index_path, matrix)
+    if index is None:
+        print(f"Indexing {len(matrix)} responses...")
+        index = SimilarityIndex.build(matrix)
+        index.save(index_path)
+
+    analyzer = TextAnalyzer(info['model'], show_progress=False)
+    ids, scores = index.search(analyzer.embed(args.queries, method=info['method'], dim=info['dim']),
+                               n=args.n, n_probe=args.probes)
+
+    # Show the responses themselves when the statistics output is found
+    prefix = os.path.splitext(args.embeddings)[0][:-len('_embeddings')]
+    texts = None
+    for format in EXPORT_FORMATS:
+        if os.path.exists(f"{prefix}_statistics.{format}"):
+            texts = load_data(f"{prefix}_statistics.{format}", columns=['text_id', args.text_column], cache=False)
+            texts = texts.set_index('text_id')[args.text_column]
+            break
+
+    for query, row_ids, row_scores in zip(args.queries, ids, scores):
+        print(f"\n{query}")
+        if (row_ids < 0).all():
+            print("  (no similar responses)")
+        for text_id, score in zip(row_ids.tolist(), row_scores.tolist()):
+            if text_id < 0:
+                continue
+            text = texts.get(text_id, '') if texts is not None else ''
+            print(f"  {score:.3f}  [{text_id}] {text}")
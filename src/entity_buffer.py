@@ -0,0 +1,168 @@
+"""
+Memory-bounded collection of named entity rows
+"""
+
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+import config
+from src.data_loader import ResultWriter
+
+
+class EntityBuffer:
+    """
+    Collects the entities of parsed TokenStores and writes them out in batches.
+
+    Rows are kept as typed arrays, with entity text and label as StringStore
+    hashes (40 bytes per entity), and only decoded ENTITY_BATCH_ROWS rows at
+    a time while being written, so the DataFrame of every entity in the
+    corpus is never built. When the buffered arrays reach ENTITY_BUFFER_MB
+    they are written to the output file (CSV append, Parquet row groups, ...)
+    and freed. Label counts for plot_entity_distribution are updated as
+    entities arrive. Entities already decoded elsewhere (e.g. by the worker
+    processes of batch_runner) are buffered as DataFrames with add_frame.
+
+    Usage:
+        entities = EntityBuffer("analysis_entities", format='parquet')
+        for chunk in chunks:
+            analyzer.analyze_corpus(texts, entity_buffer=entities)
+        entities.close()
+        plot_entity_distribution(entities.label_counts)
+    """
+
+    def __init__(self, output_name: Optional[str] = None, format: str = None, append: bool = False,
+                 max_mb: float = None, batch_rows: int = None):
+        """
+        Create an empty buffer.
+
+        Args:
+            output_name: Base name of the output file; None keeps every row
+                in memory (see to_frame)
+            format: Output format (uses config default if None)
+            append: Add to an existing CSV file instead of replacing it
+            max_mb: Buffered megabytes that trigger a write (uses config default if None)
+            batch_rows: Rows decoded and written at a time (uses config default if None)
+        """
+        self.writer = ResultWriter(output_name, format, append) if output_name else None
+        self.max_bytes = (config.ENTITY_BUFFER_MB if max_mb is None else max_mb) * 1024 * 1024
+        self.batch_rows = batch_rows or config.ENTITY_BATCH_ROWS
+        self.num_entities = 0
+        self.strings = None
+
+        self._parts: List[Union[Tuple[np.ndarray, ...], pd.DataFrame]] = []
+        self._buffered_bytes = 0
+        self._label_counts: Dict[str, int] = {}
+
+    @property
+    def path(self) -> Optional[str]:
+        """Path of the output file (None when rows are kept in memory)."""
+        return self.writer.path if self.writer is not None else None
+
+    def add(self, store):
+        """
+        Buffer the entities of a TokenStore, writing rows out if the buffer is full.
+
+        Args:
+            store: TokenStore parsed with entities
+        """
+        text_index, ents = store.entity_index()
+        if len(text_index) == 0:
+            return
+
+        self.strings = store.strings
+        part = (text_index + store.start_id, store.ent_text[ents], store.ent_label[ents],
+                store.ent_start[ents], store.ent_end[ents])
+        self._parts.append(part)
+        self._buffered_bytes += sum(array.nbytes for array in part)
+        self.num_entities += len(text_index)
+
+        # Labels are counted in order of first appearance, like value_counts
+        from src.token_store import decode_hashes
+        labels, first, counts = np.unique(part[2], return_index=True, return_counts=True)
+        order = np.argsort(first)
+        self._count_labels(decode_hashes(self.strings, labels[order]), counts[order].tolist())
+
+        if self.writer is not None and self._buffered_bytes >= self.max_bytes:
+            self.spill()
+
+    def add_frame(self, frame: pd.DataFrame):
+        """
+        Buffer entity rows that are already decoded, e.g. sent by another process.
+
+        Args:
+            frame: DataFrame with at least a 'label' column (every column is written)
+        """
+        if frame.empty:
+            return
+
+        self._parts.append(frame)
+        self._buffered_bytes += int(frame.memory_usage(deep=True).sum())
+        self.num_entities += len(frame)
+
+        counts = frame['label'].value_counts(sort=False)
+        self._count_labels(counts.index.tolist(), counts.tolist())
+
+        if self.writer is not None and self._buffered_bytes >= self.max_bytes:
+            self.spill()
+
+    def spill(self):
+        """Write the buffered rows to the output file and free them."""
+        for frame in self._frames():
+            self.writer.write(frame)
+        self._parts = []
+        self._buffered_bytes = 0
+
+    def close(self) -> Optional[str]:
+        """
+        Write the remaining rows and finish the output file.
+
+        Returns:
+            Path of the saved file, or None if there were no entities
+        """
+        if self.writer is None:
+            return None
+        self.spill()
+        return self.writer.close()
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Buffered rows as one DataFrame, like TokenStore.entities.
+
+        Returns:
+            DataFrame with text_id, entity, label, start and end columns
+        """
+        frames = list(self._frames())
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    @property
+    def label_counts(self) -> pd.Series:
+        """Number of entities per label, most frequent first (like value_counts)."""
+        if not self._label_counts:
+            return pd.Series(dtype='int64', name='count')
+
+        counts = pd.Series(list(self._label_counts.values()), index=list(self._label_counts), name='count')
+        return counts.sort_values(ascending=False, kind='stable')
+
+    def _count_labels(self, labels: List[str], counts: List[int]):
+        for label, count in zip(labels, counts):
+            self._label_counts[label] = self._label_counts.get(label, 0) + count
+
+    def _frames(self) -> Iterator[pd.DataFrame]:
+        """Decoded DataFrames of at most batch_rows buffered rows each."""
+        # token_store imports spaCy, which analyze.py only loads once parsing starts
+        from src.token_store import decode_hashes
+
+        for part in self._parts:
+            if isinstance(part, pd.DataFrame):
+                yield part
+                continue
+            text_id, text, label, start, end = part
+            for offset in range(0, len(text_id), self.batch_rows):
+                rows = slice(offset, offset + self.batch_rows)
+                yield pd.DataFrame({
+                    'text_id': text_id[rows],
+                    'entity': decode_hashes(self.strings, text[rows]),
+                    'label': decode_hashes(self.strings, label[rows]),
+                    'start': start[rows],
+                    'end': end[rows],
+                })
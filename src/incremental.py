@@ -0,0 +1,155 @@
+"""
+State tracking for incremental analysis of growing form exports
+"""
+
+import os
+import json
+from collections import Counter
+from typing import Dict
+import pandas as pd
+import config
+
+
+STATE_VERSION = 1
+
+
+def get_state_path(output_prefix: str, output_dir: str = None) -> str:
+    """
+    Path of the state file for an output prefix.
+
+    Args:
+        output_prefix: Prefix used for the analysis output files
+        output_dir: Output directory (uses config default if None)
+    """
+    if output_dir is None:
+        output_dir = config.OUTPUT_DIR
+
+    return os.path.join(output_dir, f"{output_prefix}_state.json")
+
+
+def row_keys(df: pd.DataFrame, text_column: str) -> pd.Series:
+    """
+    Build a stable key for every row of a form export.
+
+    Uses config.ID_COLUMN when present, otherwise a hash of the
+    config.TIMESTAMP_COLUMN and the text, falling back to a hash of the
+    whole row.
+
+    Args:
+        df: Preprocessed DataFrame
+        text_column: Name of the text column
+
+    Returns:
+        Series of string keys aligned with df
+    """
+    if config.ID_COLUMN in df.columns:
+        return df[config.ID_COLUMN].astype(str)
+
+    if config.TIMESTAMP_COLUMN in df.columns:
+        columns = [config.TIMESTAMP_COLUMN, text_column]
+    else:
+        columns = df.columns.tolist()
+
+    hashes = pd.util.hash_pandas_object(df[columns].astype(str), index=False)
+    return hashes.map('{:016x}'.format)
+
+
+def new_state(text_column: str) -> Dict:
+    """
+    Empty state for a first incremental run.
+
+    Args:
+        text_column: Name of the analyzed text column
+    """
+    return {
+        'version': STATE_VERSION,
+        'model': config.SPACY_MODEL,
+        'text_column': text_column,
+        'num_texts': 0,
+        'processed_keys': [],
+        'word_counts': {},
+    }
+
+
+def load_state(output_prefix: str, text_column: str) -> Dict:
+    """
+    Load the state of previous runs, or a new state if there is none or
+    it was produced with a different model or text column.
+
+    Args:
+        output_prefix: Prefix used for the analysis output files
+        text_column: Name of the analyzed text column
+
+    Returns:
+        State dictionary with Counter objects in 'word_counts'
+    """
+    path = get_state_path(output_prefix)
+
+    if not os.path.exists(path):
+        return new_state(text_column)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+
+    if (state.get('version') != STATE_VERSION
+            or state.get('model') != config.SPACY_MODEL
+            or state.get('text_column') != text_column):
+        print(f"State in {path} does not match the current settings, starting over")
+        return new_state(text_column)
+
+    state['word_counts'] = {name: Counter(counts) for name, counts in state['word_counts'].items()}
+    return state
+
+
+def save_state(state: Dict, output_prefix: str):
+    """
+    Write the incremental state next to the analysis outputs.
+
+    Args:
+        state: State dictionary as returned by load_state
+        output_prefix: Prefix used for the analysis output files
+    """
+    path = get_state_path(output_prefix)
+    tmp_path = path + ".tmp"
+
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+
+    # Replace atomically so an interrupted run never leaves a broken state
+    os.replace(tmp_path, path)
+
+
+def merge_word_counts(state: Dict, word_counts: Dict[str, Counter]) -> Dict[str, Counter]:
+    """
+    Add the counts of newly analyzed texts to the stored counts.
+
+    Args:
+        state: State dictionary as returned by load_state
+        word_counts: Counters (or LemmaCounters) of the new texts
+
+    Returns:
+        The merged counters, also stored in the state
+    """
+    for name, counts in word_counts.items():
+        state['word_counts'].setdefault(name, Counter()).update(counts)
+
+    return state['word_counts']
+
+
+def filter_new_rows(df: pd.DataFrame, state: Dict, text_column: str) -> pd.DataFrame:
+    """
+    Keep only rows not processed by previous runs and record them as processed.
+
+    Args:
+        df: Preprocessed DataFrame
+        state: State dictionary as returned by load_state
+        text_column: Name of the text column
+
+    Returns:
+        DataFrame with the new rows
+    """
+    keys = row_keys(df, text_column)
+    is_new = ~keys.isin(set(state['processed_keys']))
+
+    state['processed_keys'].extend(keys[is_new].tolist())
+    return df[is_new.values]
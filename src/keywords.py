@@ -0,0 +1,235 @@
+"""
+Distinctive keywords per group of responses (TF-IDF and weighted log-odds)
+"""
+
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from scipy import sparse
+import config
+from src.data_loader import parse_timestamps
+
+
+KEYWORD_METHODS = ('log_odds', 'tfidf')
+
+
+def document_term_matrix(store, pos_filter: Optional[List[str]] = None,
+                         per_text: bool = True) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    """
+    Sparse counts of lowercased content lemmas per text of a TokenStore.
+
+    The matrix is built directly from the token arrays: one (text, lemma)
+    entry per counted token, summed by scipy, so no dense matrix or
+    per-token Python object is created.
+
+    Args:
+        store: Parsed TokenStore
+        pos_filter: List of POS tags to keep (e.g., ['NOUN', 'VERB'])
+        per_text: One row per text; False keeps one row per parsed doc,
+            so identical texts share it
+
+    Returns:
+        Tuple of (CSR matrix with one row per text (or doc) and one column per
+        term, array of the lowercased lemma hash of every column)
+    """
+    mask = store.content_mask(pos_filter)
+    terms, columns = np.unique(store.lowercase_lemmas()[mask], return_inverse=True)
+    docs = store.token_doc_index()[mask]
+
+    matrix = sparse.csr_matrix((np.ones(len(docs), dtype=np.int64), (docs, columns.ravel())),
+                               shape=(store.num_docs, len(terms)))
+    if per_text and store.rows is not None:
+        # Identical texts share the row of their doc
+        matrix = matrix[store.rows]
+    return matrix, terms
+
+
+class KeywordScorer:
+    """
+    Accumulates term counts per group and ranks the terms that distinguish
+    each group from the rest.
+
+    Only group-by-term sums are kept between chunks, as sparse triplets
+    over a growing vocabulary of lemma hashes, so chunked runs use memory
+    proportional to the number of (group, term) pairs and not to the
+    number of responses. Two scores are computed at the end:
+
+    - 'tfidf': mean over the group's responses of the term frequency
+      (normalized by response length) times the smoothed inverse
+      document frequency, log((1 + N) / (1 + df)) + 1.
+    - 'log_odds': z-score of the weighted log-odds ratio of the term in
+      the group versus all other groups, with the whole corpus counts as
+      informative Dirichlet prior (Monroe, Colaresi and Quinn, 2008).
+
+    Usage:
+        scorer = KeywordScorer()
+        for chunk in chunks:
+            store = analyzer.parse(chunk[text_column].tolist(), outputs=['words'])
+            scorer.add(store, chunk[group_column])
+        keywords = scorer.keywords(top_n=15)
+    """
+
+    def __init__(self, pos_filter: Optional[List[str]] = None):
+        """
+        Create an empty scorer.
+
+        Args:
+            pos_filter: List of POS tags counted as terms (None counts every
+                content word)
+        """
+        self.pos_filter = pos_filter
+        self.strings = None
+        self.num_texts = 0
+
+        self._groups: Dict = {}
+        self._terms: Dict[int, int] = {}
+        self._group_sizes = np.zeros(0, dtype=np.int64)
+        self._doc_freq = np.zeros(0, dtype=np.int64)
+        self._triplets: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+
+    def add(self, store, groups):
+        """
+        Count the texts of a TokenStore into their groups.
+
+        Args:
+            store: Parsed TokenStore (with the 'words' output)
+            groups: Group label of every text of the store (missing
+                labels are left out)
+        """
+        groups = pd.Series(groups).reset_index(drop=True)
+        if len(groups) != len(store):
+            raise ValueError(f"Got {len(groups)} group labels for {len(store)} texts")
+
+        self.strings = store.strings
+        counts, terms = document_term_matrix(store, self.pos_filter)
+
+        keep = groups.notna().to_numpy()
+        counts = counts[keep]
+        codes, labels = pd.factorize(groups[keep])
+        # Local group and term numbers mapped to the scorer's own
+        group_index = np.array([_index_of(self._groups, label) for label in labels.tolist()], dtype=np.int64)
+        term_index = np.array([_index_of(self._terms, term) for term in terms.tolist()], dtype=np.int64)
+        rows = group_index[codes]
+
+        self.num_texts += len(rows)
+        self._group_sizes = _grow(self._group_sizes, len(self._groups))
+        self._group_sizes += np.bincount(rows, minlength=len(self._groups))
+        self._doc_freq = _grow(self._doc_freq, len(self._terms))
+        self._doc_freq += np.bincount(term_index[counts.indices], minlength=len(self._terms))
+
+        lengths = np.asarray(counts.sum(axis=1)).ravel()
+        frequencies = sparse.diags(1 / np.maximum(lengths, 1)) @ counts
+
+        # Sum rows by group: (groups x texts) indicator times (texts x terms);
+        # both products have the same nonzero entries
+        indicator = sparse.csr_matrix((np.ones(len(rows)), (rows, np.arange(len(rows)))),
+                                      shape=(len(self._groups), len(rows)))
+        group_counts = (indicator @ counts).tocsr()
+        group_frequencies = (indicator @ frequencies).tocsr()
+        group_counts.sort_indices()
+        group_frequencies.sort_indices()
+        self._triplets.append((np.repeat(np.arange(len(self._groups)), np.diff(group_counts.indptr)),
+                               term_index[group_counts.indices], group_counts.data, group_frequencies.data))
+
+    def keywords(self, top_n: int = 20, method: str = 'log_odds', min_count: int = 1) -> pd.DataFrame:
+        """
+        Top distinctive terms of every group.
+
+        Args:
+            top_n: Number of terms per group
+            method: Ranking score, 'log_odds' or 'tfidf'
+            min_count: Leave out terms used fewer times in the group
+
+        Returns:
+            DataFrame with group, keyword, frequency, tfidf and log_odds
+            columns, top_n rows per group ordered by the chosen score
+        """
+        if method not in KEYWORD_METHODS:
+            raise ValueError(f"Unknown keyword method: {method} (use one of {KEYWORD_METHODS})")
+
+        columns = ['group', 'keyword', 'frequency', 'tfidf', 'log_odds']
+        if not self._triplets:
+            return pd.DataFrame(columns=columns)
+
+        shape = (len(self._groups), len(self._terms))
+        rows, cols, counts, frequencies = (np.concatenate(parts) for parts in zip(*self._triplets))
+        counts = sparse.csr_matrix((counts, (rows, cols)), shape=shape)
+        frequencies = sparse.csr_matrix((frequencies, (rows, cols)), shape=shape)
+        counts.sort_indices()
+        frequencies.sort_indices()
+
+        group_of_entry = np.repeat(np.arange(shape[0]), np.diff(counts.indptr))
+        term_of_entry = counts.indices
+        y = counts.data.astype(np.float64)
+
+        idf = np.log((1 + self.num_texts) / (1 + self._doc_freq)) + 1
+        tfidf = frequencies.data / self._group_sizes[group_of_entry] * idf[term_of_entry]
+
+        # Weighted log-odds of group vs rest, with corpus counts as prior
+        term_totals = np.asarray(counts.sum(axis=0)).ravel().astype(np.float64)
+        group_totals = np.asarray(counts.sum(axis=1)).ravel().astype(np.float64)
+        total = term_totals.sum()
+        prior = term_totals[term_of_entry]
+        y_rest = prior - y
+        n_group = group_totals[group_of_entry]
+        n_rest = total - n_group
+        delta = (np.log((y + prior) / (n_group + total - y - prior))
+                 - np.log((y_rest + prior) / (n_rest + total - y_rest - prior)))
+        log_odds = delta / np.sqrt(1 / (y + prior) + 1 / (y_rest + prior))
+
+        score = log_odds if method == 'log_odds' else tfidf
+        labels = list(self._groups)
+        term_hashes = np.fromiter(self._terms, dtype=np.uint64, count=len(self._terms))
+
+        parts = []
+        for group in range(shape[0]):
+            entries = np.arange(counts.indptr[group], counts.indptr[group + 1])
+            entries = entries[y[entries] >= min_count]
+            if len(entries) > top_n:
+                entries = entries[np.argpartition(-score[entries], top_n - 1)[:top_n]]
+            entries = entries[np.argsort(-score[entries], kind='stable')]
+            parts.append(pd.DataFrame({
+                'group': [labels[group]] * len(entries),
+                'keyword': [self.strings[key] for key in term_hashes[term_of_entry[entries]].tolist()],
+                'frequency': y[entries].astype(np.int64),
+                'tfidf': tfidf[entries],
+                'log_odds': log_odds[entries],
+            }))
+
+        return pd.concat(parts, ignore_index=True)
+
+
+def group_labels(values: pd.Series, column: str = None, timestamp_format: str = None) -> pd.Series:
+    """
+    Group label of every response from a column of the form export.
+
+    Timestamps (config.TIMESTAMP_COLUMN) are grouped by day; any other
+    column is used as is.
+
+    Args:
+        values: Column values
+        column: Name of the column
+        timestamp_format: Format of the timestamps (detected if None; pass
+            the same format for every chunk, see detect_timestamp_format)
+
+    Returns:
+        Series of labels (missing where the value is missing)
+    """
+    if column == config.TIMESTAMP_COLUMN:
+        days = parse_timestamps(values, timestamp_format).dt.strftime('%Y-%m-%d')
+        return days.where(days.notna(), None)
+    return values.astype(object).where(values.notna(), None)
+
+
+def _index_of(index: Dict, key) -> int:
+    """Number of a key in an insertion-ordered index, adding it if new."""
+    if key not in index:
+        index[key] = len(index)
+    return index[key]
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    """Array padded with zeros to the given size."""
+    if len(array) >= size:
+        return array
+    return np.concatenate([array, np.zeros(size - len(array), dtype=array.dtype)])
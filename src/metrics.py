@@ -0,0 +1,278 @@
+"""
+Run metrics and profiling for the analysis pipeline
+"""
+
+import os
+import sys
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional
+
+
+# Recorder that stage() and timed_iter() report to (None disables recording)
+_active = None
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+
+class MetricsRecorder:
+    """
+    Collects per-stage and per-component measurements of one run.
+
+    Each stage accumulates, over all of its calls, wall time, CPU time of
+    this process and of finished child processes, item counts (docs,
+    tokens, ...) and the resident memory high-water mark seen when the
+    stage last finished. Stages may be nested; times are inclusive.
+    """
+
+    def __init__(self):
+        """Create an empty recorder and start the run clock."""
+        self.stages: Dict[str, Dict] = {}
+        self.components: Dict[str, Dict] = {}
+        self.info: Dict = {'started': datetime.now().isoformat(timespec='seconds')}
+        self._start = time.perf_counter()
+        self._start_cpu = os.times()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Measure a block of code as one call of a stage.
+
+        Args:
+            name: Stage name
+
+        Yields:
+            Dictionary where the block can set counts such as 'docs' or 'tokens'
+        """
+        counts = {}
+        start = time.perf_counter()
+        start_cpu = os.times()
+        try:
+            yield counts
+        finally:
+            end_cpu = os.times()
+            entry = self.stages.setdefault(name, {
+                'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'child_cpu_seconds': 0.0,
+            })
+            entry['calls'] += 1
+            entry['wall_seconds'] += time.perf_counter() - start
+            entry['cpu_seconds'] += _cpu(end_cpu) - _cpu(start_cpu)
+            entry['child_cpu_seconds'] += _child_cpu(end_cpu) - _child_cpu(start_cpu)
+            for key, value in counts.items():
+                entry[key] = entry.get(key, 0) + value
+            entry['peak_rss_mb'] = peak_rss_mb()
+
+    def add_component(self, name: str, seconds: float, docs: int):
+        """
+        Add the time a pipeline component spent on a batch of docs.
+
+        Args:
+            name: Component name ('tokenizer' for the tokenizer)
+            seconds: Wall time spent on the batch
+            docs: Number of docs in the batch
+        """
+        entry = self.components.setdefault(name, {'seconds': 0.0, 'docs': 0})
+        entry['seconds'] += seconds
+        entry['docs'] += docs
+
+    def report(self) -> Dict:
+        """
+        Build the metrics report.
+
+        Returns:
+            Dictionary with run info, totals, stages and components
+        """
+        end_cpu = os.times()
+        stages = {}
+        for name, entry in self.stages.items():
+            stages[name] = {key: _round(value) for key, value in entry.items()}
+            if entry.get('docs') and entry['wall_seconds'] > 0:
+                stages[name]['docs_per_sec'] = round(entry['docs'] / entry['wall_seconds'], 1)
+            if entry.get('docs') and 'unique_docs' in entry:
+                stages[name]['duplicate_ratio'] = round(1 - entry['unique_docs'] / entry['docs'], 4)
+
+        components = {}
+        for name, entry in self.components.items():
+            components[name] = {
+                'seconds': _round(entry['seconds']),
+                'docs': entry['docs'],
+                'docs_per_sec': round(entry['docs'] / entry['seconds'], 1) if entry['seconds'] > 0 else None,
+            }
+
+        return {
+            'info': self.info,
+            'total': {
+                'wall_seconds': _round(time.perf_counter() - self._start),
+                'cpu_seconds': _round(_cpu(end_cpu) - _cpu(self._start_cpu)),
+                'child_cpu_seconds': _round(_child_cpu(end_cpu) - _child_cpu(self._start_cpu)),
+                'peak_rss_mb': peak_rss_mb(),
+                'children_peak_rss_mb': peak_rss_mb(children=True),
+            },
+            'stages': stages,
+            'components': components,
+        }
+
+    def save(self, path: str) -> str:
+        """
+        Write the report as JSON.
+
+        Args:
+            path: Output file path
+
+        Returns:
+            The path written
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+        return path
+
+
+def start_recording(**info) -> MetricsRecorder:
+    """
+    Make a new recorder the active one.
+
+    Args:
+        **info: Run settings stored in the report (model, input file, ...)
+
+    Returns:
+        The active MetricsRecorder
+    """
+    global _active
+    _active = MetricsRecorder()
+    _active.info.update(info)
+    return _active
+
+
+def stop_recording() -> Optional[MetricsRecorder]:
+    """Deactivate recording and return the recorder that was active."""
+    global _active
+    recorder, _active = _active, None
+    return recorder
+
+
+def active_recorder() -> Optional[MetricsRecorder]:
+    """The active recorder, or None when metrics are not being recorded."""
+    return _active
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Measure a block of code on the active recorder (no-op if there is none).
+
+    Args:
+        name: Stage name
+
+    Yields:
+        Dictionary where the block can set counts such as 'docs' or 'tokens'
+    """
+    if _active is None:
+        yield {}
+        return
+
+    with _active.stage(name) as counts:
+        yield counts
+
+
+def timed_iter(name: str, items: Iterable) -> Iterator:
+    """
+    Yield from an iterable, measuring the time spent producing each item
+    as a call of a stage. The length of every item is counted as 'docs'.
+
+    Args:
+        name: Stage name
+        items: Iterable of sized items (e.g. DataFrame chunks)
+    """
+    iterator = iter(items)
+    while True:
+        with stage(name) as counts:
+            item = next(iterator, None)
+            if item is not None:
+                counts['docs'] = len(item)
+        if item is None:
+            return
+        yield item
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """
+    High-water mark of the resident set size, in megabytes.
+
+    Args:
+        children: Report the largest finished child process instead
+
+    Returns:
+        Peak RSS, or None where the resource module is unavailable (Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / scale, 1)
+
+
+@contextmanager
+def profile(kind: str, path_prefix: str):
+    """
+    Profile a block of code and write the profile next to the outputs.
+
+    cProfile writes <path_prefix>.prof (open with pstats or snakeviz) and
+    prints the slowest functions; pyinstrument writes <path_prefix>.html.
+    Falls back to cProfile if pyinstrument is not installed.
+
+    Args:
+        kind: 'cprofile' or 'pyinstrument'
+        path_prefix: Output path without extension
+    """
+    if kind == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("pyinstrument is not installed (pip install pyinstrument), using cProfile")
+            kind = 'cprofile'
+
+    if kind == 'pyinstrument':
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            path = path_prefix + ".html"
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+            print(f"Profile saved to: {path}")
+        return
+
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        path = path_prefix + ".prof"
+        profiler.dump_stats(path)
+        print(f"\nProfile saved to: {path}")
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+
+def _cpu(times) -> float:
+    return times.user + times.system
+
+
+def _child_cpu(times) -> float:
+    return times.children_user + times.children_system
+
+
+def _round(value):
+    return round(value, 4) if isinstance(value, float) else value
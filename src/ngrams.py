@@ -0,0 +1,238 @@
+"""
+Phrase and n-gram counting on StringStore hashes
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from spacy.parts_of_speech import IDS as POS_IDS
+from spacy.strings import get_string_id
+from src.counting import HashCounter
+
+
+# Multiplier used to combine the lemma hashes of a phrase into one key
+_KEY_PRIME = np.uint64(0x100000001B3)
+
+
+class NgramCounter(HashCounter):
+    """
+    Counter of phrases (sequences of lowercased lemmas) keyed by one integer.
+
+    Each phrase is counted under a 64-bit key combined from the StringStore
+    hashes of its lemmas, so counting is done on NumPy arrays and the same
+    phrase gets the same key in every chunk and process. The lemma hashes
+    of a phrase are kept once per distinct phrase, and only decoded into
+    "lemma lemma" strings to build a result. See HashCounter for the
+    capacity and `error`.
+    """
+
+    def __init__(self, strings, capacity: Optional[int] = None):
+        """
+        Create an empty counter.
+
+        Args:
+            strings: spaCy StringStore the lemma hashes belong to
+            capacity: Approximate number of phrases to keep (None counts exactly)
+        """
+        super().__init__(strings, capacity)
+        self._lemmas: Dict[int, Tuple[int, ...]] = {}
+
+    def update_keys(self, keys: np.ndarray, lemmas: np.ndarray, weights: Optional[np.ndarray] = None,
+                    min_count: int = 1):
+        """
+        Count phrases given as keys and lemma hash rows.
+
+        Distinct phrases are added in order of first occurrence, so ties
+        in most_common are ordered as if phrases had been counted one by one.
+
+        Args:
+            keys: Array with the phrase_keys of every occurrence
+            lemmas: Array with the lowercased lemma hashes of every
+                occurrence, one row each (rows of shorter phrases are
+                padded with 0)
+            weights: Optional count for each occurrence (default 1)
+            min_count: Skip phrases counted fewer times in this update
+        """
+        if len(keys) == 0:
+            return
+
+        unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        if weights is None:
+            counts = np.bincount(inverse.ravel(), minlength=len(unique))
+        else:
+            counts = np.bincount(inverse.ravel(), weights=weights, minlength=len(unique)).astype(np.int64)
+
+        order = np.argsort(first, kind='stable')
+        if min_count > 1:
+            order = order[counts[order] >= min_count]
+
+        table = self._counts
+        for key, position, count in zip(unique[order].tolist(), first[order].tolist(), counts[order].tolist()):
+            if key not in table:
+                table[key] = 0
+                self._lemmas[key] = tuple(lemma for lemma in lemmas[position].tolist() if lemma)
+            table[key] += count
+
+        self._prune()
+
+    def _key(self, phrase: str) -> int:
+        return _phrase_key([get_string_id(word) for word in phrase.split(' ')])
+
+    def _add_key(self, phrase: str) -> int:
+        lemmas = tuple(self.strings.add(word) for word in phrase.split(' '))
+        key = _phrase_key(lemmas)
+        self._lemmas.setdefault(key, lemmas)
+        return key
+
+    def _decode(self, key: int) -> str:
+        return ' '.join(self.strings[lemma] for lemma in self._lemmas[key])
+
+    def _merge_keys(self, other: 'NgramCounter'):
+        for key in other._counts:
+            if key not in self._lemmas:
+                self._lemmas[key] = other._lemmas[key]
+
+    def _pruned(self):
+        self._lemmas = {key: self._lemmas[key] for key in self._counts}
+
+
+def phrase_keys(lemmas: np.ndarray) -> np.ndarray:
+    """
+    Combine rows of lemma hashes into one 64-bit key per row.
+
+    Args:
+        lemmas: Array of lowercased lemma hashes, one phrase per row
+
+    Returns:
+        uint64 array with one key per row
+    """
+    keys = lemmas[:, 0].copy()
+    for column in range(1, lemmas.shape[1]):
+        # uint64 arithmetic wraps around, which is what a hash needs
+        keys *= _KEY_PRIME
+        keys ^= lemmas[:, column]
+    return keys
+
+
+def count_ngrams(store, sizes: Iterable[int] = (2, 3), patterns: Dict[str, List[str]] = None,
+                 min_count: int = 1, capacity: Optional[int] = None) -> Dict[str, NgramCounter]:
+    """
+    Count lemma n-grams and POS-pattern phrases of a TokenStore.
+
+    An n-gram is a run of n consecutive tokens of one text with no
+    punctuation or space inside, that neither starts nor ends with a stop
+    word ("desarrollo sostenible", "calidad de vida"). Windows are taken
+    from the flat lemma arrays of the store, so no per-token Python
+    objects are created.
+
+    Args:
+        store: TokenStore with lemmas and POS tags
+        sizes: Lengths of the n-grams to count
+        patterns: Mapping of output name to a sequence of POS tags, e.g.
+            {'noun_adj': ['NOUN', 'ADJ']}; each counts the n-grams whose
+            tokens have exactly these tags
+        min_count: Skip phrases counted fewer times in this store (only
+            exact when the store holds the whole corpus)
+        capacity: Approximate number of phrases kept per counter (None counts exactly)
+
+    Returns:
+        Dictionary of NgramCounter objects keyed by '<n>-grams' for every
+        size and by the pattern names
+    """
+    patterns = patterns or {}
+    lower = store.lowercase_lemmas()
+    breaks = store.is_punct | store.is_space
+    weights = store.token_weights()
+    doc_ends = np.repeat(store.offsets[1:], np.diff(store.offsets))
+    break_totals = np.concatenate([[0], np.cumsum(breaks)])
+
+    counters = {}
+    wanted = {len(tags) for tags in patterns.values()} | set(sizes)
+    for n in sorted(wanted):
+        num_windows = len(lower) - n + 1
+        if num_windows <= 0:
+            starts = np.zeros(0, dtype=np.int64)
+        else:
+            starts = np.arange(num_windows)
+            valid = ((starts + n <= doc_ends[:num_windows])
+                     & (break_totals[n:] - break_totals[:num_windows] == 0)
+                     & ~store.is_stop[:num_windows] & ~store.is_stop[n - 1:])
+            starts = starts[valid]
+
+        windows = starts[:, None] + np.arange(n)
+        lemmas = lower[windows]
+        keys = phrase_keys(lemmas) if len(starts) else np.zeros(0, dtype=np.uint64)
+        window_weights = None if weights is None else weights[starts]
+
+        if n in sizes:
+            counter = NgramCounter(store.strings, capacity)
+            counter.update_keys(keys, lemmas, window_weights, min_count)
+            counters[f"{n}-grams"] = counter
+
+        for name, tags in patterns.items():
+            if len(tags) != n:
+                continue
+            pos_ids = np.array([POS_IDS.get(tag, -1) for tag in tags])
+            match = np.all(store.pos[windows] == pos_ids, axis=1)
+            counter = NgramCounter(store.strings, capacity)
+            counter.update_keys(keys[match], lemmas[match],
+                                None if window_weights is None else window_weights[match], min_count)
+            counters[name] = counter
+
+    return counters
+
+
+def count_noun_chunks(store, min_count: int = 1, capacity: Optional[int] = None) -> NgramCounter:
+    """
+    Count the noun chunks of a TokenStore by the lemmas of their content words.
+
+    Determiners and other stop words are left out ("la educación pública"
+    counts as "educación público"); chunks with fewer than two content
+    words are not counted, since they are already in the noun counts.
+
+    Args:
+        store: TokenStore parsed with noun chunks
+        min_count: Skip phrases counted fewer times in this store
+        capacity: Approximate number of phrases kept (None counts exactly)
+
+    Returns:
+        NgramCounter of noun chunk phrases
+    """
+    counter = NgramCounter(store.strings, capacity)
+    if len(store.chunk_doc) == 0:
+        return counter
+
+    lower = store.lowercase_lemmas()
+    weights = store.token_weights()
+    chunk_of_token, tokens = store.noun_chunk_index()
+
+    content = store.content_mask()[tokens]
+    tokens = tokens[content]
+    chunk_of_token = chunk_of_token[content]
+    sizes = np.bincount(chunk_of_token, minlength=len(store.chunk_doc))
+    counted = sizes >= 2
+    if not counted.any():
+        return counter
+
+    # Content lemmas of every counted chunk, one row each, padded with 0
+    tokens = tokens[counted[chunk_of_token]]
+    chunk_of_token = chunk_of_token[counted[chunk_of_token]]
+    sizes = sizes[counted]
+    row_of_token = np.repeat(np.arange(len(sizes)), sizes)
+    column_of_token = np.arange(len(tokens)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    lemmas = np.zeros((len(sizes), sizes.max()), dtype=np.uint64)
+    lemmas[row_of_token, column_of_token] = lower[tokens]
+
+    keys = np.empty(len(sizes), dtype=np.uint64)
+    for size in np.unique(sizes).tolist():
+        same_size = sizes == size
+        keys[same_size] = phrase_keys(lemmas[same_size, :size])
+
+    first_tokens = tokens[np.cumsum(sizes) - sizes]
+    counter.update_keys(keys, lemmas, None if weights is None else weights[first_tokens], min_count)
+    return counter
+
+
+def _phrase_key(lemmas) -> int:
+    """phrase_keys of a single phrase."""
+    return int(phrase_keys(np.array([lemmas], dtype=np.uint64))[0])
+
@@ -0,0 +1,322 @@
+"""
+Local analysis server that keeps a warm spaCy model in memory
+Run with: python -m src.server --port 8765
+"""
+
+import json
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Tuple
+import pandas as pd
+import config
+from src import metrics
+from src.data_loader import load_data, preprocess_dataframe, clean_text_series
+
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class ServerOverloaded(RuntimeError):
+    """Raised when accepting a request would exceed the pending text limit."""
+
+
+class _Pending(NamedTuple):
+    """A request waiting in the batch queue."""
+    texts: List[str]
+    outputs: Tuple[str, ...]
+    top_n: int
+    future: asyncio.Future
+
+
+class AnalysisServer:
+    """
+    Serves analyses over HTTP from one warm TextAnalyzer.
+
+    Concurrent requests are queued and parsed together: the batcher waits
+    at most max_latency_ms after the first queued request (or until
+    max_batch_texts texts are queued), runs a single parse over all of
+    their texts and splits the resulting TokenStore back per request.
+    Requests that would push the queue above max_pending_texts are
+    rejected with HTTP 503 so clients can back off.
+    """
+
+    def __init__(self, analyzer=None, max_batch_texts: int = None, max_latency_ms: float = None,
+                 max_pending_texts: int = None):
+        """
+        Create a server around an analyzer.
+
+        Args:
+            analyzer: TextAnalyzer to use (a default one if None)
+            max_batch_texts: Texts parsed together (uses config default if None)
+            max_latency_ms: Longest wait for more requests before parsing
+                (uses config default if None)
+            max_pending_texts: Queued texts above which requests are rejected
+                (uses config default if None)
+        """
+        if analyzer is None:
+            from src.text_analyzer import TextAnalyzer
+            analyzer = TextAnalyzer(show_progress=False)
+
+        self.analyzer = analyzer
+        self.max_batch_texts = max_batch_texts or config.SERVER_MAX_BATCH_TEXTS
+        self.max_latency = (config.SERVER_MAX_BATCH_LATENCY_MS if max_latency_ms is None
+                            else max_latency_ms) / 1000
+        self.max_pending_texts = max_pending_texts or config.SERVER_MAX_PENDING_TEXTS
+        self.pending_texts = 0
+        self.queue = None
+        # spaCy runs in a single thread so the event loop keeps accepting requests
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def submit(self, texts: List[str], outputs=None, top_n: int = config.TOP_N) -> Dict:
+        """
+        Queue texts for the next batch and wait for their results.
+
+        Args:
+            texts: Cleaned input texts
+            outputs: Outputs to compute ('statistics', 'words', 'entities')
+            top_n: Number of top words per POS filter
+
+        Returns:
+            Result dictionary of this request
+
+        Raises:
+            ServerOverloaded: If the queue already holds too many texts
+        """
+        from src.text_analyzer import ALL_OUTPUTS
+
+        outputs = tuple(ALL_OUTPUTS if outputs is None else outputs)
+        unknown = set(outputs) - set(ALL_OUTPUTS)
+        if unknown:
+            raise ValueError(f"Unknown outputs: {sorted(unknown)}")
+
+        # A single request larger than the limit is accepted when the queue is empty
+        if self.pending_texts and self.pending_texts + len(texts) > self.max_pending_texts:
+            raise ServerOverloaded(f"{self.pending_texts} texts already pending")
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending_texts += len(texts)
+        await self.queue.put(_Pending(texts, outputs, top_n, future))
+        return await future
+
+    async def run_batches(self):
+        """Collect queued requests into batches and analyze them, forever."""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self.queue.get()]
+            num_texts = len(batch[0].texts)
+            deadline = loop.time() + self.max_latency
+
+            while num_texts < self.max_batch_texts:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(pending)
+                num_texts += len(pending.texts)
+
+            try:
+                results = await loop.run_in_executor(self.executor, self.analyze_batch, batch)
+            except Exception as e:
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+            else:
+                for pending, result in zip(batch, results):
+                    if not pending.future.done():
+                        pending.future.set_result(result)
+            finally:
+                self.pending_texts -= num_texts
+
+    def analyze_batch(self, batch: List[_Pending]) -> List[Dict]:
+        """
+        Parse the texts of several requests at once and split the results.
+
+        Args:
+            batch: Queued requests
+
+        Returns:
+            One result dictionary per request, in batch order
+        """
+        from src.text_analyzer import ALL_OUTPUTS
+
+        texts = [text for pending in batch for text in pending.texts]
+        requested = {output for pending in batch for output in pending.outputs}
+        outputs = [output for output in ALL_OUTPUTS if output in requested]
+
+        with metrics.stage('server_batch') as counts:
+            store = self.analyzer.parse(texts, outputs=outputs)
+            counts['docs'] = len(texts)
+            counts['requests'] = len(batch)
+
+        results = []
+        start = 0
+        for pending in batch:
+            part = store.subset(start, start + len(pending.texts))
+            start += len(pending.texts)
+            results.append(_request_result(part, pending.outputs, pending.top_n))
+
+        return results
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one HTTP request on a connection."""
+        try:
+            status, payload = await self._respond(reader)
+        except ValueError as e:
+            status, payload = 400, {'error': str(e)}
+        except Exception as e:
+            status, payload = 500, {'error': f"{type(e).__name__}: {e}"}
+
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                + ("Retry-After: 1\r\n" if status == 503 else "")
+                + "Connection: close\r\n\r\n")
+        try:
+            writer.write(head.encode('latin-1') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, reader: asyncio.StreamReader) -> Tuple[int, Dict]:
+        """Read a request and route it; returns (status, JSON payload)."""
+        request_line = await reader.readline()
+        if not request_line:
+            raise ValueError("Empty request")
+        method, path = request_line.decode('latin-1').split()[:2]
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0))
+        if length > config.SERVER_MAX_BODY_MB * 1024 * 1024:
+            return 413, {'error': f"Request body larger than {config.SERVER_MAX_BODY_MB} MB"}
+        body = await reader.readexactly(length) if length else b''
+
+        if path == '/health':
+            return 200, {'status': 'ok', 'model': self.analyzer.model_name,
+                         'pending_texts': self.pending_texts}
+        if path == '/metrics':
+            recorder = metrics.active_recorder()
+            return 200, recorder.report() if recorder is not None else {}
+        if path != '/analyze':
+            return 404, {'error': f"Unknown path: {path}"}
+        if method != 'POST':
+            return 405, {'error': "Use POST for /analyze"}
+
+        request = json.loads(body or b'{}')
+        texts = await self._request_texts(request)
+        try:
+            result = await self.submit(texts, request.get('outputs'), int(request.get('top_n', config.TOP_N)))
+        except ServerOverloaded as e:
+            return 503, {'error': str(e)}
+        return 200, result
+
+    async def _request_texts(self, request: Dict) -> List[str]:
+        """Cleaned texts of a request, given inline ('texts') or as a file ('csv')."""
+        if 'texts' in request:
+            texts = request['texts']
+            if not isinstance(texts, list):
+                raise ValueError("'texts' must be a list of strings")
+            return clean_text_series(pd.Series(texts, dtype=object)).tolist()
+
+        if 'csv' in request:
+            text_column = request.get('text_column', config.TEXT_COLUMN)
+            try:
+                df = await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: preprocess_dataframe(load_data(request['csv']), text_column))
+            except OSError as e:
+                raise ValueError(f"Cannot read {request['csv']}: {e}")
+            if text_column not in df.columns:
+                raise ValueError(f"Column '{text_column}' not found. Available columns: {df.columns.tolist()}")
+            return df[text_column].tolist()
+
+        raise ValueError("Request needs 'texts' or 'csv'")
+
+    async def serve(self, host: str = None, port: int = None, socket_path: str = None):
+        """
+        Load the model and serve requests until cancelled.
+
+        Args:
+            host: Interface to listen on (uses config default if None)
+            port: TCP port (uses config default if None)
+            socket_path: Listen on this Unix socket instead of TCP
+        """
+        self.queue = asyncio.Queue()
+
+        print(f"Loading spaCy model: {self.analyzer.model_name}")
+        await asyncio.get_running_loop().run_in_executor(self.executor, lambda: self.analyzer.nlp)
+
+        if socket_path:
+            server = await asyncio.start_unix_server(self.handle, path=socket_path)
+            print(f"Serving on unix socket {socket_path}")
+        else:
+            host = host or config.SERVER_HOST
+            port = port or config.SERVER_PORT
+            server = await asyncio.start_server(self.handle, host, port)
+            print(f"Serving on http://{host}:{port}")
+
+        batcher = asyncio.create_task(self.run_batches())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+def _request_result(store, outputs: Tuple[str, ...], top_n: int) -> Dict:
+    """JSON-ready results of one request from its part of the batch."""
+    result = {'num_texts': len(store)}
+
+    if 'statistics' in outputs:
+        result['statistics'] = store.statistics().to_dict(orient='records')
+    if 'words' in outputs:
+        for name, pos_filter in config.POS_FILTERS.items():
+            result[f"top_{name}"] = store.word_counts(pos_filter).most_common(top_n)
+    if 'entities' in outputs:
+        result['entities'] = store.entities().to_dict(orient='records')
+
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve text analyses over HTTP with a warm spaCy model")
+    parser.add_argument("--host", default=None, help=f"Interface to listen on (default: {config.SERVER_HOST})")
+    parser.add_argument("--port", "-p", type=int, default=None, help=f"TCP port (default: {config.SERVER_PORT})")
+    parser.add_argument("--socket", help="Listen on a Unix socket instead of TCP")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                        help=f"Number of processes for spaCy parsing (default: {config.N_PROCESS})")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false", default=None,
+                        help="Do not reuse or store parsed documents in the cache")
+    parser.add_argument("--max-batch-texts", type=int, default=None,
+                        help=f"Texts parsed together (default: {config.SERVER_MAX_BATCH_TEXTS})")
+    parser.add_argument("--max-latency-ms", type=float, default=None,
+                        help=f"Longest wait for more requests before parsing (default: {config.SERVER_MAX_BATCH_LATENCY_MS})")
+    parser.add_argument("--max-pending-texts", type=int, default=None,
+                        help=f"Queued texts above which requests get HTTP 503 (default: {config.SERVER_MAX_PENDING_TEXTS})")
+
+    args = parser.parse_args()
+
+    from src.text_analyzer import TextAnalyzer
+
+    metrics.start_recording(server=True, model=config.SPACY_MODEL)
+    server = AnalysisServer(TextAnalyzer(n_process=args.workers, use_cache=args.use_cache, show_progress=False),
+                            max_batch_texts=args.max_batch_texts, max_latency_ms=args.max_latency_ms,
+                            max_pending_texts=args.max_pending_texts)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        print("\nServer stopped")
@@ -2,12 +2,131 @@
 Text analysis utilities using spaCy
 """
 
+import os
+import time
+import threading
 import spacy
-from typing import List, Dict, Tuple
+from contextlib import contextmanager
+from spacy.language import Language
+from typing import List, Dict, Tuple, Optional
+import numpy as np
 import pandas as pd
 from collections import Counter
 import config
 from tqdm import tqdm
+from src import metrics
+from src.doc_cache import DocCache
+from src.token_store import TokenStore
+from src.counting import LemmaCounter, count_docs
+from src.ngrams import NgramCounter, count_ngrams, count_noun_chunks
+
+
+# Texts per cache lookup while streaming cached and newly parsed docs
+_CACHE_WINDOW = 1000
+
+# Name prefix of the components added to time the pipeline (see _component_timing)
+_TIMER_PREFIX = '_timer_'
+
+# Pipeline components each output depends on. Known components that no
+# requested output needs are disabled while parsing; unknown (custom)
+# components always run.
+OUTPUT_COMPONENTS = {
+    'statistics': ['parser', 'senter', 'sentencizer', 'ner', 'entity_ruler'],
+    'words': ['tagger', 'morphologizer', 'attribute_ruler', 'lemmatizer'],
+    'entities': ['ner', 'entity_ruler'],
+    'phrases': ['tagger', 'morphologizer', 'attribute_ruler', 'lemmatizer', 'parser'],
+    'embeddings': ['tagger', 'morphologizer', 'attribute_ruler', 'lemmatizer'],
+}
+ALL_OUTPUTS = ('statistics', 'words', 'entities')
+# Outputs computed only when requested
+EXTRA_OUTPUTS = ('phrases', 'embeddings')
+# Embedding layers shared through listeners; kept only while a listener runs
+_SHARED_COMPONENTS = ['tok2vec', 'transformer']
+
+# Process-wide registry of loaded pipelines, shared by every TextAnalyzer
+_MODELS = {}
+_BLANK_MODELS = {}
+_MODELS_LOCK = threading.Lock()
+
+
+def get_model(model_name: str = None):
+    """
+    Load a spaCy model once per process and return the shared instance.
+    
+    Args:
+        model_name: Name or path of the spaCy model (uses config default if None)
+        
+    Returns:
+        spaCy Language object
+    """
+    if model_name is None:
+        model_name = config.SPACY_MODEL
+    
+    with _MODELS_LOCK:
+        if model_name not in _MODELS:
+            try:
+                with metrics.stage('load_model'):
+                    nlp = spacy.load(model_name)
+            except OSError:
+                print(f"Model '{model_name}' not found. Please install it using:")
+                print(f"python -m spacy download {model_name}")
+                raise
+            
+            # Set max length for processing
+            nlp.max_length = config.MAX_TEXT_LENGTH
+            _MODELS[model_name] = nlp
+    
+    return _MODELS[model_name]
+
+
+def get_fast_model(lang: str):
+    """
+    Shared blank pipeline with a rule-based sentencizer for a language.
+    
+    Args:
+        lang: Language code (e.g., 'es')
+        
+    Returns:
+        spaCy Language object with only the tokenizer and sentencizer
+    """
+    with _MODELS_LOCK:
+        if lang not in _BLANK_MODELS:
+            nlp = spacy.blank(lang)
+            nlp.add_pipe('sentencizer')
+            nlp.max_length = config.MAX_TEXT_LENGTH
+            _BLANK_MODELS[lang] = nlp
+    
+    return _BLANK_MODELS[lang]
+
+
+def unload_models():
+    """Drop every shared pipeline, e.g. to free memory in a notebook."""
+    with _MODELS_LOCK:
+        _MODELS.clear()
+        _BLANK_MODELS.clear()
+
+
+def model_lang(model_name: str) -> str:
+    """
+    Language code of a model, read from its meta.json when it is not loaded.
+    
+    Args:
+        model_name: Name or path of the spaCy model
+    """
+    if model_name in _MODELS:
+        return _MODELS[model_name].lang
+    
+    if os.path.isdir(model_name):
+        meta_path = os.path.join(model_name, 'meta.json')
+    elif spacy.util.is_package(model_name):
+        meta_path = os.path.join(str(spacy.util.get_package_path(model_name)), 'meta.json')
+    else:
+        meta_path = None
+    
+    if meta_path is not None and os.path.exists(meta_path):
+        return spacy.util.load_meta(meta_path)['lang']
+    
+    return get_model(model_name).lang
 
 
 class TextAnalyzer:
@@ -15,25 +134,205 @@ class TextAnalyzer:
     Main class for text analysis using spaCy
     """
     
-    def __init__(self, model_name: str = None):
+    def __init__(self, model_name: str = None, n_process: int = None, batch_size: int = None,
+                 use_cache: bool = None, show_progress: bool = True, dedupe: bool = None):
         """
         Initialize the analyzer with a spaCy model.
         
+        The model is loaded on first use and shared with every other
+        analyzer of the same model in this process (see get_model).
+        
         Args:
             model_name: Name of the spaCy model to use
+            n_process: Number of worker processes for parsing (uses config default if None)
+            batch_size: Texts per batch (uses config default if None, which
+                picks a size from the average text length)
+            use_cache: Whether to reuse parsed docs from the on-disk cache
+                (uses config default if None)
+            show_progress: Show tqdm progress bars while parsing
+            dedupe: Parse each distinct text once and share its results with
+                identical texts (uses config default if None)
         """
         if model_name is None:
             model_name = config.SPACY_MODEL
         
+        self.model_name = model_name
+        self.n_process = config.N_PROCESS if n_process is None else n_process
+        self.batch_size = config.BATCH_SIZE if batch_size is None else batch_size
+        
+        if use_cache is None:
+            use_cache = config.USE_DOC_CACHE
+        self.use_cache = use_cache
+        self._cache = None
+        self.show_progress = show_progress
+        self.dedupe = config.DEDUPLICATE_TEXTS if dedupe is None else dedupe
+    
+    @property
+    def nlp(self):
+        """The shared spaCy pipeline, loaded on first access."""
+        return get_model(self.model_name)
+    
+    @property
+    def cache(self):
+        """On-disk cache of parsed docs (None when disabled), opened on first access."""
+        if self.use_cache and self._cache is None:
+            self._cache = DocCache(self.nlp, self.model_name)
+        return self._cache
+    
+    @property
+    def fast_nlp(self):
+        """
+        Tokenizer plus rule-based sentencizer, used for fast statistics.
+        
+        Built from the model's language without loading the model itself.
+        """
+        return get_fast_model(model_lang(self.model_name))
+    
+    def disabled_components(self, outputs=ALL_OUTPUTS) -> List[str]:
+        """
+        Names of the pipeline components not needed for the given outputs.
+        
+        Args:
+            outputs: Requested outputs ('statistics', 'words', 'entities')
+            
+        Returns:
+            List of component names that can be disabled
+        """
+        needed = {name for output in outputs for name in OUTPUT_COMPONENTS[output]}
+        known = {name for names in OUTPUT_COMPONENTS.values() for name in names}
+        
+        disabled = [name for name in self.nlp.pipe_names
+                    if name in known and name not in needed]
+        enabled = [name for name in self.nlp.pipe_names if name not in disabled]
+        
+        for name in _SHARED_COMPONENTS:
+            if name not in self.nlp.pipe_names:
+                continue
+            listeners = getattr(self.nlp.get_pipe(name), 'listening_components', None)
+            if listeners and not set(listeners) & set(enabled):
+                disabled.append(name)
+        
+        return disabled
+    
+    def _pipe(self, texts: List[str], desc: str, outputs=ALL_OUTPUTS):
+        """
+        Parse texts with nlp.pipe using the configured workers and batch size.
+        
+        spaCy returns the documents in input order even when several
+        processes are used, so the enumeration index is always the text_id.
+        Only the components needed for the requested outputs are run.
+        
+        Args:
+            texts: List of input texts
+            desc: Progress bar description
+            outputs: Outputs the docs will be used for
+            
+        Returns:
+            Iterator over parsed Doc objects
+        """
+        docs = self._parse(texts, self.disabled_components(outputs))
+        return tqdm(docs, total=len(texts), desc=desc, disable=not self.show_progress)
+    
+    def _parse(self, texts: List[str], disabled: List[str]):
+        """Yield parsed docs with the given components disabled."""
+        with self.nlp.select_pipes(disable=disabled):
+            if self.cache is not None:
+                yield from self._pipe_cached(texts)
+            else:
+                batch_size = self.batch_size or auto_batch_size(texts)
+                yield from self._run_pipe(self.nlp, texts, batch_size)
+    
+    def _run_pipe(self, nlp, texts: List[str], batch_size: int):
+        """
+        Run nlp.pipe with the configured workers.
+        
+        Args:
+            nlp: spaCy Language object (with the wanted components enabled)
+            texts: List of input texts
+            batch_size: Texts per batch
+            
+        Returns:
+            Iterator over parsed Doc objects, in input order
+        """
+        return nlp.pipe(texts, batch_size=batch_size, n_process=self.n_process)
+    
+    @contextmanager
+    def _component_timing(self, nlp):
+        """
+        Time the tokenizer and each component of nlp while the block parses.
+        
+        Only when metrics are recorded and parsing happens in this process.
+        A timer component is added after the tokenizer and after every
+        component with nlp.add_pipe; parsing still goes through nlp.pipe
+        with the same batches, and the timers are removed when the block
+        ends, even if it stops early.
+        
+        Args:
+            nlp: spaCy Language object the block parses with
+            
+        Yields:
+            _ComponentClock to pass the parsed docs through (clock.track),
+            or None when components are not timed
+        """
+        recorder = metrics.active_recorder()
+        if recorder is None or self.n_process != 1 or any(_is_timer(name) for name in nlp.component_names):
+            yield None
+            return
+        
+        clock = _ComponentClock(nlp)
+        timers = []
         try:
-            self.nlp = spacy.load(model_name)
-        except OSError:
-            print(f"Model '{model_name}' not found. Please install it using:")
-            print(f"python -m spacy download {model_name}")
-            raise
+            for component in ['tokenizer'] + list(nlp.component_names):
+                name = f"{_TIMER_PREFIX}{component}"
+                if component == 'tokenizer':
+                    timer = nlp.add_pipe('component_timer', name=name, first=True, config={'component': component})
+                else:
+                    timer = nlp.add_pipe('component_timer', name=name, after=component, config={'component': component})
+                timer.clock = clock
+                timers.append(name)
+            yield clock
+        finally:
+            for name in timers:
+                nlp.remove_pipe(name)
+            clock.report(recorder)
+    
+    def _pipe_cached(self, texts: List[str]):
+        """
+        Yield parsed docs in input order, parsing only the cache misses.
         
-        # Set max length for processing
-        self.nlp.max_length = config.MAX_TEXT_LENGTH
+        Args:
+            texts: List of input texts
+            
+        Returns:
+            Iterator over Doc objects
+        """
+        pipes = [name for name in self.nlp.pipe_names if not _is_timer(name)]
+        keys = [self.cache.key(text, pipes) for text in texts]
+        cached = self.cache.contains(keys)
+        misses = [text for text, key in zip(texts, keys) if key not in cached]
+        
+        batch_size = self.batch_size or auto_batch_size(misses)
+        parsed = iter(self._run_pipe(self.nlp, misses, batch_size))
+        
+        for start in range(0, len(texts), _CACHE_WINDOW):
+            window = keys[start:start + _CACHE_WINDOW]
+            hits = self.cache.get_many([key for key in window if key in cached])
+            new_docs = []
+            
+            for offset, key in enumerate(window):
+                if key in hits:
+                    yield hits[key]
+                    continue
+                
+                if key in cached:
+                    # Evicted while this run was storing new docs
+                    doc = self.nlp(texts[start + offset])
+                else:
+                    doc = next(parsed)
+                new_docs.append((key, doc))
+                yield doc
+            
+            self.cache.put_many(new_docs)
     
     def analyze_text(self, text: str) -> Dict:
         """
@@ -45,17 +344,7 @@ class TextAnalyzer:
         Returns:
             Dictionary with analysis results
         """
-        doc = self.nlp(text)
-        
-        return {
-            'text': text,
-            'num_tokens': len([token for token in doc if not token.is_space]),
-            'num_sentences': len(list(doc.sents)),
-            'entities': [(ent.text, ent.label_) for ent in doc.ents],
-            'nouns': [token.text for token in doc if token.pos_ == 'NOUN'],
-            'verbs': [token.text for token in doc if token.pos_ == 'VERB'],
-            'adjectives': [token.text for token in doc if token.pos_ == 'ADJ'],
-        }
+        return _doc_summary(self.nlp(text))
     
     def analyze_batch(self, texts: List[str]) -> List[Dict]:
         """
@@ -67,23 +356,9 @@ class TextAnalyzer:
         Returns:
             List of analysis results
         """
-        results = []
-        
-        for doc in tqdm(self.nlp.pipe(texts, batch_size=config.BATCH_SIZE), 
-                       total=len(texts), 
-                       desc="Analyzing texts"):
-            result = {
-                'text': doc.text,
-                'num_tokens': len([token for token in doc if not token.is_space]),
-                'num_sentences': len(list(doc.sents)),
-                'entities': [(ent.text, ent.label_) for ent in doc.ents],
-                'nouns': [token.text for token in doc if token.pos_ == 'NOUN'],
-                'verbs': [token.text for token in doc if token.pos_ == 'VERB'],
-                'adjectives': [token.text for token in doc if token.pos_ == 'ADJ'],
-            }
-            results.append(result)
+        store = self.parse(texts, desc="Analyzing texts")
         
-        return results
+        return [{'text': text, **summary} for text, summary in zip(texts, store.summaries())]
     
     def extract_entities(self, texts: List[str]) -> pd.DataFrame:
         """
@@ -95,21 +370,7 @@ class TextAnalyzer:
         Returns:
             DataFrame with entity information
         """
-        entities_list = []
-        
-        for i, doc in enumerate(tqdm(self.nlp.pipe(texts, batch_size=config.BATCH_SIZE),
-                                    total=len(texts),
-                                    desc="Extracting entities")):
-            for ent in doc.ents:
-                entities_list.append({
-                    'text_id': i,
-                    'entity': ent.text,
-                    'label': ent.label_,
-                    'start': ent.start_char,
-                    'end': ent.end_char
-                })
-        
-        return pd.DataFrame(entities_list)
+        return self.analyze_corpus(texts, outputs=['entities'])['entities']
     
     def get_top_words(self, texts: List[str], n: int = 20, pos_filter: List[str] = None) -> List[Tuple[str, int]]:
         """
@@ -123,40 +384,434 @@ class TextAnalyzer:
         Returns:
             List of (word, count) tuples
         """
-        words = []
+        return self.count_lemmas(texts, {'words': pos_filter})['words'].most_common(n)
+    
+    def get_top_phrases(self, texts: List[str], n: int = 20, min_count: int = None) -> Dict[str, List[Tuple[str, int]]]:
+        """
+        Get the most common n-grams, POS-pattern phrases and noun chunks.
         
-        for doc in tqdm(self.nlp.pipe(texts, batch_size=config.BATCH_SIZE),
-                       total=len(texts),
-                       desc="Extracting words"):
-            for token in doc:
-                if not token.is_stop and not token.is_punct and not token.is_space:
-                    if pos_filter is None or token.pos_ in pos_filter:
-                        words.append(token.lemma_.lower())
+        Args:
+            texts: List of input texts
+            n: Number of top phrases per kind
+            min_count: Leave out phrases seen fewer times (uses config default if None)
+            
+        Returns:
+            Dictionary of (phrase, count) lists keyed like count_phrases
+        """
+        if min_count is None:
+            min_count = config.NGRAM_MIN_COUNT
+        phrases = self.analyze_corpus(texts, outputs=['phrases'], min_count=min_count)['phrases']
+        return {name: counter.most_common(n, min_count=min_count) for name, counter in phrases.items()}
+    
+    def get_group_keywords(self, texts: List[str], groups, n: int = None, method: str = None,
+                           pos_filter: List[str] = None) -> pd.DataFrame:
+        """
+        Get the words that distinguish each group of texts from the others.
         
-        return Counter(words).most_common(n)
+        Args:
+            texts: List of input texts
+            groups: Group label of every text (e.g. a categorical column)
+            n: Number of keywords per group (uses config default if None)
+            method: 'log_odds' or 'tfidf' (uses config default if None)
+            pos_filter: List of POS tags to filter (e.g., ['NOUN', 'ADJ'])
+            
+        Returns:
+            DataFrame with group, keyword, frequency, tfidf and log_odds columns
+        """
+        # scipy is only imported when keywords are scored
+        from src.keywords import KeywordScorer
+        scorer = KeywordScorer(pos_filter)
+        scorer.add(self.parse(texts, outputs=['words']), groups)
+        return scorer.keywords(n or config.KEYWORD_TOP_N, method or config.KEYWORD_METHOD,
+                               config.KEYWORD_MIN_COUNT)
     
-    def get_sentiment_statistics(self, texts: List[str]) -> pd.DataFrame:
+    def embed(self, texts: List[str], method: str = None, dim: int = None) -> np.ndarray:
+        """
+        Get one unit-length document vector per text.
+        
+        Args:
+            texts: List of input texts
+            method: 'vectors' (the model's word vectors), 'hashing' (hashed
+                bag of lemmas) or 'auto' (uses config default if None)
+            dim: Dimensions of hashed vectors (uses config default if None)
+            
+        Returns:
+            float32 array with one row per text (zero for texts without
+            content words)
+        """
+        # scipy is only imported when vectors are computed
+        from src.embeddings import document_vectors
+        
+        store = self.parse(texts, outputs=['embeddings'])
+        with metrics.stage('embeddings') as counts:
+            vectors = store.per_doc(document_vectors(store, method or config.EMBEDDING_METHOD,
+                                                     self.nlp.vocab.vectors, dim))
+            counts['docs'] = len(store)
+        return vectors
+    
+    @property
+    def embedding_method(self) -> str:
+        """Embedding method used for config.EMBEDDING_METHOD with this model ('vectors' or 'hashing')."""
+        from src.embeddings import resolve_method
+        return resolve_method(config.EMBEDDING_METHOD, self.nlp.vocab.vectors)
+    
+    def get_clusters(self, texts: List[str], n_clusters: int, examples: int = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Group texts into topic clusters with mini-batch k-means on their vectors.
+        
+        Args:
+            texts: List of input texts
+            n_clusters: Number of clusters
+            examples: Texts closest to each center listed in the summary
+                (uses config default if None)
+            
+        Returns:
+            Tuple of (DataFrame with text_id, cluster and similarity
+            columns; DataFrame with cluster, size, text_id, similarity and
+            text of the examples), as returned by cluster_responses
+        """
+        from src.embeddings import cluster_responses
+        assignments, summary = cluster_responses(self.embed(texts), n_clusters, examples)
+        summary['text'] = [texts[i] for i in summary['text_id'].tolist()]
+        return assignments, summary
+    
+    def find_similar(self, texts: List[str], queries: List[str], n: int = 10) -> pd.DataFrame:
+        """
+        Find the texts most similar to each query with an approximate
+        nearest-neighbor index.
+        
+        Args:
+            texts: List of texts to search
+            queries: List of query texts
+            n: Number of similar texts per query
+            
+        Returns:
+            DataFrame with query, text_id, similarity and text columns,
+            most similar first
+        """
+        from src.embeddings import SimilarityIndex
+        index = SimilarityIndex.build(self.embed(texts))
+        ids, scores = index.search(self.embed(queries), n)
+        rows = [(query, text_id, score, texts[text_id])
+                for query, row_ids, row_scores in zip(queries, ids.tolist(), scores.tolist())
+                for text_id, score in zip(row_ids, row_scores) if text_id >= 0]
+        return pd.DataFrame(rows, columns=['query', 'text_id', 'similarity', 'text'])
+    
+    def count_words(self, texts: List[str], pos_filter: List[str] = None) -> Counter:
+        """
+        Count lemmas of content words in texts.
+        
+        Unlike get_top_words, the full Counter is returned so counts from
+        different runs can be merged with Counter.update.
+        
+        Args:
+            texts: List of input texts
+            pos_filter: List of POS tags to filter (e.g., ['NOUN', 'VERB'])
+            
+        Returns:
+            Counter of lowercased lemmas
+        """
+        return self.count_lemmas(texts, {'words': pos_filter})['words'].to_counter()
+    
+    def count_lemmas(self, texts: List[str], pos_filters: Dict[str, Optional[List[str]]]) -> Dict[str, LemmaCounter]:
+        """
+        Stream texts into hash-based lemma counters without keeping tokens.
+        
+        Args:
+            texts: List of input texts
+            pos_filters: Mapping of output name to the POS tags to count
+                (None counts every POS)
+            
+        Returns:
+            Dictionary of LemmaCounter objects keyed like pos_filters
+        """
+        with metrics.stage('count_lemmas') as counts:
+            weights = None
+            if self.dedupe:
+                texts, rows = deduplicate(texts)
+                weights = np.bincount(rows, minlength=len(texts))
+            with self._component_timing(self.nlp) as clock:
+                docs = self._pipe(texts, "Extracting words", outputs=['words'])
+                if clock is not None:
+                    docs = clock.track(docs)
+                counters = count_docs(docs, self.nlp.vocab.strings, pos_filters,
+                                      capacity=config.MAX_TRACKED_LEMMAS, weights=weights)
+            counts['docs'] = len(texts) if weights is None else len(rows)
+            counts['unique_docs'] = len(texts)
+        
+        return counters
+    
+    def get_sentiment_statistics(self, texts: List[str], fast: bool = False) -> pd.DataFrame:
         """
         Get basic statistics for each text.
         
         Args:
             texts: List of input texts
+            fast: Use only the tokenizer and a rule-based sentencizer. Much
+                faster, but sentence splitting is punctuation based and the
+                'num_entities' column is not computed.
             
         Returns:
             DataFrame with statistics
         """
-        stats = []
-        
-        for i, doc in enumerate(tqdm(self.nlp.pipe(texts, batch_size=config.BATCH_SIZE),
-                                     total=len(texts),
-                                     desc="Computing statistics")):
-            non_space_tokens = [token for token in doc if not token.is_space]
-            stats.append({
-                'text_id': i,
-                'num_tokens': len(non_space_tokens),
-                'num_sentences': len(list(doc.sents)),
-                'num_entities': len(doc.ents),
-                'avg_word_length': sum(len(token.text) for token in non_space_tokens) / max(len(non_space_tokens), 1)
-            })
-        
-        return pd.DataFrame(stats)
+        return self.analyze_corpus(texts, outputs=['statistics'], fast=fast)['statistics']
+    
+    def analyze_corpus(self, texts: List[str], pos_filters: Dict[str, Optional[List[str]]] = None,
+                       start_id: int = 0, outputs=ALL_OUTPUTS, fast: bool = False,
+                       entity_buffer=None, min_count: int = 1, embedding_writer=None) -> Dict:
+        """
+        Analyze a corpus with a single pass of the spaCy pipeline.
+        
+        Statistics, word counts and entities are all computed from the
+        same parsed documents, so each text goes through the tagger,
+        parser and NER only once. Components not needed for the requested
+        outputs are disabled.
+        
+        Args:
+            texts: List of input texts
+            pos_filters: Mapping of output name to the POS tags to count
+                (None counts every POS), e.g. {'nouns': ['NOUN']}
+            start_id: text_id of the first text, used when appending to
+                results of earlier runs
+            outputs: Outputs to compute ('statistics', 'words', 'entities',
+                and optionally 'phrases' and 'embeddings')
+            fast: Compute statistics with the tokenizer and sentencizer only
+                (see get_sentiment_statistics); requires outputs=['statistics']
+            entity_buffer: EntityBuffer that receives the entities instead of
+                an 'entities' DataFrame, keeping memory bounded on large corpora
+            min_count: Drop phrases seen fewer times in these texts before
+                keeping them (only when texts are the whole corpus)
+            embedding_writer: EmbeddingWriter that receives the document
+                vectors instead of an 'embeddings' array
+            
+        Returns:
+            Dictionary with the 'statistics' and 'entities' DataFrames,
+            'word_counts', a dictionary of LemmaCounter objects keyed like
+            pos_filters, 'phrases', a dictionary of NgramCounter objects
+            keyed like count_phrases, 'embeddings', an array with one
+            document vector per text (only the requested outputs are
+            included), and 'store', the TokenStore they were derived from
+        """
+        if pos_filters is None:
+            pos_filters = {'words': None}
+        
+        if fast and set(outputs) != {'statistics'}:
+            raise ValueError("Fast mode only computes statistics")
+        
+        store = self.parse(texts, start_id=start_id, outputs=outputs, fast=fast)
+        
+        results = {'store': store}
+        if 'statistics' in outputs:
+            with metrics.stage('statistics') as counts:
+                results['statistics'] = store.statistics(with_entities=not fast)
+                counts['docs'] = len(store)
+        if 'entities' in outputs:
+            with metrics.stage('entities') as counts:
+                if entity_buffer is not None:
+                    before = entity_buffer.num_entities
+                    entity_buffer.add(store)
+                    counts['entities'] = entity_buffer.num_entities - before
+                else:
+                    results['entities'] = store.entities()
+                    counts['entities'] = len(results['entities'])
+        if 'words' in outputs:
+            with metrics.stage('word_counts') as counts:
+                results['word_counts'] = {name: store.word_counts(pos_filter, capacity=config.MAX_TRACKED_LEMMAS)
+                                          for name, pos_filter in pos_filters.items()}
+                counts['tokens'] = store.num_tokens
+        if 'phrases' in outputs:
+            with metrics.stage('phrases') as counts:
+                results['phrases'] = count_phrases(store, min_count)
+                counts['phrases'] = sum(len(counter) for counter in results['phrases'].values())
+        if 'embeddings' in outputs:
+            from src.embeddings import document_vectors
+            with metrics.stage('embeddings') as counts:
+                vectors = document_vectors(store, config.EMBEDDING_METHOD, self.nlp.vocab.vectors)
+                if embedding_writer is not None:
+                    # Identical texts are written from the vector of their shared doc
+                    embedding_writer.add(vectors, store.rows)
+                else:
+                    results['embeddings'] = store.per_doc(vectors)
+                counts['docs'] = len(store)
+        
+        return results
+    
+    def parse(self, texts: List[str], start_id: int = 0, outputs=ALL_OUTPUTS,
+              fast: bool = False, desc: str = "Analyzing corpus") -> TokenStore:
+        """
+        Parse texts into a columnar TokenStore.
+        
+        Args:
+            texts: List of input texts
+            start_id: text_id of the first text
+            outputs: Outputs the store will be used for (selects pipeline components)
+            fast: Use the tokenizer and sentencizer only
+            desc: Progress bar description
+            
+        Returns:
+            TokenStore with token and entity attributes of every text
+        """
+        rows = None
+        if self.dedupe:
+            # Identical texts (e.g. "Sí", repeated submissions) are parsed once
+            texts, rows = deduplicate(texts)
+        
+        nlp = self.fast_nlp if fast else self.nlp
+        with metrics.stage('parse') as counts, self._component_timing(nlp) as clock:
+            if fast:
+                batch_size = self.batch_size or auto_batch_size(texts)
+                docs = tqdm(self._run_pipe(nlp, texts, batch_size),
+                            total=len(texts), desc=desc, disable=not self.show_progress)
+            else:
+                docs = self._pipe(texts, desc, outputs=outputs)
+            strings = nlp.vocab.strings
+            if clock is not None:
+                docs = clock.track(docs)
+            
+            store = TokenStore.from_docs(docs, strings, start_id=start_id,
+                                         sentences='statistics' in outputs,
+                                         noun_chunks='phrases' in outputs)
+            if rows is not None and len(texts) < len(rows):
+                store.rows = rows
+            counts['docs'] = len(store)
+            counts['unique_docs'] = store.num_docs
+            counts['tokens'] = store.num_tokens
+        
+        return store
+
+
+def count_phrases(store: TokenStore, min_count: int = 1) -> Dict[str, NgramCounter]:
+    """
+    Count the phrases configured in config (NGRAM_SIZES, PHRASE_PATTERNS)
+    and the noun chunks of a parsed store.
+    
+    Args:
+        store: TokenStore parsed with outputs including 'phrases'
+        min_count: Drop phrases seen fewer times in this store
+        
+    Returns:
+        Dictionary of NgramCounter objects keyed by '<n>-grams', by the
+        PHRASE_PATTERNS names and by 'noun_chunks'
+    """
+    phrases = count_ngrams(store, config.NGRAM_SIZES, config.PHRASE_PATTERNS,
+                           min_count=min_count, capacity=config.MAX_TRACKED_LEMMAS)
+    phrases['noun_chunks'] = count_noun_chunks(store, min_count=min_count,
+                                               capacity=config.MAX_TRACKED_LEMMAS)
+    return phrases
+
+
+def auto_batch_size(texts: List[str]) -> int:
+    """
+    Choose a batch size so each batch holds about config.TARGET_BATCH_CHARS.
+    
+    Short form answers get large batches, which keeps inter-process
+    communication from dominating when several workers are used.
+    
+    Args:
+        texts: List of input texts
+        
+    Returns:
+        Batch size between config.MIN_BATCH_SIZE and config.MAX_BATCH_SIZE
+    """
+    if not texts:
+        return config.MIN_BATCH_SIZE
+    
+    avg_length = max(sum(len(text) for text in texts) / len(texts), 1)
+    batch_size = int(config.TARGET_BATCH_CHARS / avg_length)
+    
+    return min(max(batch_size, config.MIN_BATCH_SIZE), config.MAX_BATCH_SIZE)
+
+
+def deduplicate(texts: List[str]) -> Tuple[List[str], np.ndarray]:
+    """
+    Distinct texts in order of first occurrence.
+    
+    Args:
+        texts: List of input texts
+        
+    Returns:
+        Tuple of (distinct texts, position of every input text among them)
+    """
+    positions = {}
+    rows = np.fromiter((positions.setdefault(text, len(positions)) for text in texts),
+                       dtype=np.int64, count=len(texts))
+    return list(positions), rows
+
+
+class _ComponentClock:
+    """
+    Splits the parse time of nlp.pipe between the tokenizer and components.
+    
+    Every timer component charges the time since the previous timer fired
+    to the component just before it. nlp.pipe chains the components as
+    lazy generators, so the interval ending at a component's timer is the
+    time that component spent since docs last moved on; the time the
+    consumer spends between docs is left out by track.
+    """
+    
+    def __init__(self, nlp):
+        self.nlp = nlp
+        self.seconds = Counter()
+        self.docs = Counter()
+        self._enabled = None
+        self._last = time.perf_counter()
+    
+    def track(self, docs):
+        """Yield docs, leaving out the time spent between them by the consumer."""
+        self._last = time.perf_counter()
+        for doc in docs:
+            yield doc
+            self._last = time.perf_counter()
+    
+    def charge(self, component: str):
+        """Charge the time since the previous timer to a component."""
+        now = time.perf_counter()
+        if self._enabled is None:
+            # Components disabled for this parse are skipped (their timer still runs)
+            self._enabled = {'tokenizer'} | set(self.nlp.pipe_names)
+        if component in self._enabled:
+            self.seconds[component] += now - self._last
+            self.docs[component] += 1
+        self._last = now
+    
+    def report(self, recorder):
+        """Add the component times to a MetricsRecorder, in pipeline order."""
+        for name in ['tokenizer'] + [name for name in self.nlp.component_names if not _is_timer(name)]:
+            if name in self.docs:
+                recorder.add_component(name, self.seconds[name], self.docs[name])
+
+
+class _ComponentTimer:
+    """Pipeline component that reports to a _ComponentClock when a doc reaches it."""
+    
+    def __init__(self, component: str):
+        self.component = component
+        self.clock: Optional[_ComponentClock] = None
+    
+    def __call__(self, doc):
+        if self.clock is not None:
+            self.clock.charge(self.component)
+        return doc
+
+
+@Language.factory('component_timer', default_config={'component': 'tokenizer'})
+def make_component_timer(nlp, name: str, component: str):
+    """Factory of the timer components added by TextAnalyzer._component_timing."""
+    return _ComponentTimer(component)
+
+
+def _is_timer(name: str) -> bool:
+    return name.startswith(_TIMER_PREFIX)
+
+
+def _doc_summary(doc) -> Dict:
+    """Per-text summary used by analyze_text and analyze_batch."""
+    return {
+        'text': doc.text,
+        'num_tokens': len([token for token in doc if not token.is_space]),
+        'num_sentences': len(list(doc.sents)),
+        'entities': [(ent.text, ent.label_) for ent in doc.ents],
+        'nouns': [token.text for token in doc if token.pos_ == 'NOUN'],
+        'verbs': [token.text for token in doc if token.pos_ == 'VERB'],
+        'adjectives': [token.text for token in doc if token.pos_ == 'ADJ'],
+    }
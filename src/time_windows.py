@@ -0,0 +1,323 @@
+"""
+Rolling per-window aggregates of responses over the timestamp column
+"""
+
+from collections import Counter
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+import config
+from src.data_loader import detect_timestamp_format, parse_timestamps
+
+
+# Window length of every frequency
+WINDOW_FREQUENCIES = {
+    'hour': pd.Timedelta(hours=1),
+    'day': pd.Timedelta(days=1),
+    'week': pd.Timedelta(weeks=1),
+}
+
+# Columns of the time series table, before the entities_<LABEL> columns
+SERIES_COLUMNS = ['window', 'responses', 'num_tokens', 'num_sentences', 'num_entities',
+                  'avg_tokens', 'avg_word_length', 'top_lemmas', 'open']
+
+
+def window_starts(timestamps: pd.Series, freq: str = 'day') -> pd.Series:
+    """
+    Start of the window every timestamp falls in.
+
+    Args:
+        timestamps: datetime64 Series
+        freq: 'hour', 'day' or 'week' (weeks start on Monday)
+
+    Returns:
+        datetime64 Series of window starts
+    """
+    if freq not in WINDOW_FREQUENCIES:
+        raise ValueError(f"Unknown window: {freq} (use one of {tuple(WINDOW_FREQUENCIES)})")
+    if freq == 'week':
+        days = timestamps.dt.floor('D')
+        return days - pd.to_timedelta(days.dt.dayofweek, unit='D')
+    return timestamps.dt.floor('h' if freq == 'hour' else 'D')
+
+
+class _Window:
+    """Running totals of one window."""
+
+    def __init__(self):
+        self.responses = 0
+        self.num_tokens = 0
+        self.num_sentences = 0
+        self.num_entities = 0
+        self.num_chars = 0.0
+        # LemmaCounter once hashes are added; a Counter of words when loaded from a state
+        self.words = Counter()
+        self.entities: Dict[str, int] = {}
+
+
+class WindowAggregator:
+    """
+    Per-window statistics, top lemmas and entity counts, updated chunk by chunk.
+
+    Responses are bucketed by the hour, day or week of their timestamp.
+    Every chunk only adds to the totals of its windows: statistics and
+    entity labels are summed, and lemmas go into one LemmaCounter per
+    window (bounded by MAX_TRACKED_LEMMAS). Only the `keep` most recent
+    windows are open; older ones are evicted into a finished row of the
+    time series and their counters are freed. Responses falling before the
+    oldest open window arrive too late to be counted and are only
+    reported in `late`.
+
+    The open windows can be saved in the incremental state (to_state /
+    load_state), so later runs continue them without reading the rows of
+    earlier runs again.
+
+    Usage:
+        windows = WindowAggregator('day')
+        for chunk in chunks:
+            store = analyzer.analyze_corpus(texts)['store']
+            windows.add(store, chunk[config.TIMESTAMP_COLUMN])
+        series = windows.to_frame()
+    """
+
+    def __init__(self, freq: str = 'day', keep: int = None, top_n: int = None):
+        """
+        Create an aggregator without windows.
+
+        Args:
+            freq: Window length, 'hour', 'day' or 'week'
+            keep: Most recent windows kept open (uses config default if None)
+            top_n: Lemmas listed per window (uses config default if None)
+        """
+        if freq not in WINDOW_FREQUENCIES:
+            raise ValueError(f"Unknown window: {freq} (use one of {tuple(WINDOW_FREQUENCIES)})")
+        self.freq = freq
+        self.keep = keep or config.TIME_WINDOW_KEEP
+        self.top_n = top_n or config.TIME_WINDOW_TOP_N
+        self.watermark: Optional[pd.Timestamp] = None
+        # Detected on the first timestamps, then used for every chunk and later run
+        self.timestamp_format: Optional[str] = None
+        self.late = 0
+        self.missing = 0
+
+        self._windows: Dict[pd.Timestamp, _Window] = {}
+        self._closed: List[Dict] = []
+
+    def add(self, store, timestamps):
+        """
+        Add the texts of a TokenStore to their windows and evict old windows.
+
+        Args:
+            store: Parsed TokenStore (with the 'statistics', 'words' and
+                'entities' outputs)
+            timestamps: Timestamp of every text of the store
+        """
+        # Imported here so WINDOW_FREQUENCIES can be read without loading spaCy
+        from src.counting import LemmaCounter
+        from src.token_store import decode_hashes
+
+        timestamps = pd.Series(timestamps).reset_index(drop=True)
+        if self.timestamp_format is None and timestamps.notna().any():
+            self.timestamp_format = detect_timestamp_format(timestamps)
+        starts = window_starts(parse_timestamps(timestamps, self.timestamp_format), self.freq)
+        if len(starts) != len(store):
+            raise ValueError(f"Got {len(starts)} timestamps for {len(store)} texts")
+
+        self.missing += int(starts.isna().sum())
+        counted = starts.notna().to_numpy().copy()
+        if self.watermark is not None:
+            late = counted & (starts < self.watermark).to_numpy()
+            self.late += int(late.sum())
+            counted &= ~late
+        if not counted.any():
+            return
+
+        codes, labels = pd.factorize(starts[counted])
+        windows = [self._windows.setdefault(label, _Window()) for label in labels]
+        # Window position of every text (-1 for texts not counted)
+        text_window = np.full(len(store), -1, dtype=np.int64)
+        text_window[counted] = codes
+
+        stats = store.statistics()
+        totals = {column: np.bincount(codes, weights=stats[column].to_numpy()[counted], minlength=len(labels))
+                  for column in ('num_tokens', 'num_sentences', 'num_entities')}
+        chars = np.bincount(codes, weights=(stats['avg_word_length'] * stats['num_tokens']).to_numpy()[counted],
+                            minlength=len(labels))
+        responses = np.bincount(codes, minlength=len(labels))
+        for i, window in enumerate(windows):
+            window.responses += int(responses[i])
+            window.num_tokens += int(totals['num_tokens'][i])
+            window.num_sentences += int(totals['num_sentences'][i])
+            window.num_entities += int(totals['num_entities'][i])
+            window.num_chars += float(chars[i])
+
+        # Content lemmas of every counted text, grouped by window in text order
+        text_of_token, tokens = store.token_index(np.flatnonzero(counted))
+        content = store.content_mask()[tokens]
+        token_window = codes[text_of_token[content]]
+        lemmas = store.lemma[tokens[content]]
+        order = np.argsort(token_window, kind='stable')
+        bounds = np.searchsorted(token_window[order], np.arange(len(labels) + 1))
+        for i, window in enumerate(windows):
+            if not isinstance(window.words, LemmaCounter):
+                words = LemmaCounter(store.strings, config.MAX_TRACKED_LEMMAS)
+                words.update(window.words)
+                window.words = words
+            window.words.update_hashes(lemmas[order[bounds[i]:bounds[i + 1]]])
+
+        # Entity labels per window
+        text_index, ents = store.entity_index()
+        entity_window = text_window[text_index]
+        entity_labels = store.ent_label[ents][entity_window >= 0]
+        entity_window = entity_window[entity_window >= 0]
+        if len(entity_window):
+            pairs, pair_counts = np.unique(np.stack([entity_window.astype(np.uint64), entity_labels]),
+                                           axis=1, return_counts=True)
+            names = decode_hashes(store.strings, pairs[1])
+            for position, label, count in zip(pairs[0].tolist(), names, pair_counts.tolist()):
+                entities = windows[position].entities
+                entities[label] = entities.get(label, 0) + count
+
+        self._evict()
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Time series of every evicted and open window, oldest first.
+
+        Returns:
+            DataFrame with window (start timestamp), responses, num_tokens,
+            num_sentences, num_entities, avg_tokens, avg_word_length,
+            top_lemmas ("lemma (count); ..."), open (window may still
+            change) and one entities_<LABEL> column per entity label
+        """
+        rows = self._closed + [self._row(start, window, True) for start, window in sorted(self._windows.items())]
+        return series_frame(rows)
+
+    def to_state(self) -> Dict:
+        """Open windows and settings, as a JSON-serializable dictionary."""
+        from src.counting import LemmaCounter
+
+        return {
+            'freq': self.freq,
+            'watermark': None if self.watermark is None else self.watermark.isoformat(),
+            'timestamp_format': self.timestamp_format,
+            'late': self.late,
+            'missing': self.missing,
+            'windows': {start.isoformat(): {
+                'responses': window.responses,
+                'num_tokens': window.num_tokens,
+                'num_sentences': window.num_sentences,
+                'num_entities': window.num_entities,
+                'num_chars': window.num_chars,
+                'words': dict(window.words.to_counter() if isinstance(window.words, LemmaCounter) else window.words),
+                'entities': window.entities,
+            } for start, window in self._windows.items()},
+        }
+
+    def load_state(self, state: Optional[Dict]) -> bool:
+        """
+        Continue the open windows of an earlier run.
+
+        Args:
+            state: Dictionary returned by to_state (None starts empty)
+
+        Returns:
+            True if the state was loaded, False if it was missing or
+            used another window length
+        """
+        if not state or state.get('freq') != self.freq:
+            return False
+
+        self.watermark = pd.Timestamp(state['watermark']) if state['watermark'] else None
+        self.timestamp_format = state.get('timestamp_format')
+        self.late = state['late']
+        self.missing = state['missing']
+        self._windows = {}
+        for start, saved in state['windows'].items():
+            window = _Window()
+            window.responses = saved['responses']
+            window.num_tokens = saved['num_tokens']
+            window.num_sentences = saved['num_sentences']
+            window.num_entities = saved['num_entities']
+            window.num_chars = saved['num_chars']
+            window.words = Counter(saved['words'])
+            window.entities = dict(saved['entities'])
+            self._windows[pd.Timestamp(start)] = window
+        return True
+
+    def _evict(self):
+        """Close every window older than the `keep` most recent ones."""
+        if not self._windows:
+            return
+
+        cutoff = max(self._windows) - (self.keep - 1) * WINDOW_FREQUENCIES[self.freq]
+        for start in sorted(start for start in self._windows if start < cutoff):
+            self._closed.append(self._row(start, self._windows.pop(start), False))
+        if self.watermark is None or cutoff > self.watermark:
+            self.watermark = cutoff
+
+    def _row(self, start: pd.Timestamp, window: _Window, is_open: bool) -> Dict:
+        """Time series row of a window."""
+        row = {
+            'window': start,
+            'responses': window.responses,
+            'num_tokens': window.num_tokens,
+            'num_sentences': window.num_sentences,
+            'num_entities': window.num_entities,
+            'avg_tokens': window.num_tokens / max(window.responses, 1),
+            'avg_word_length': window.num_chars / max(window.num_tokens, 1),
+            'top_lemmas': '; '.join(f"{word} ({count})" for word, count in window.words.most_common(self.top_n)),
+            'open': is_open,
+        }
+        for label, count in sorted(window.entities.items()):
+            row[f"entities_{label}"] = count
+        return row
+
+
+def series_frame(rows) -> pd.DataFrame:
+    """
+    Time series table from window rows (dictionaries or a DataFrame, e.g.
+    read back from an earlier output), with 0 for entity labels a window
+    did not have.
+
+    Args:
+        rows: Window rows
+
+    Returns:
+        DataFrame with SERIES_COLUMNS and entities_<LABEL> columns, oldest
+        window first
+    """
+    series = pd.DataFrame(rows)
+    if series.empty:
+        return pd.DataFrame(columns=SERIES_COLUMNS)
+
+    series['window'] = pd.to_datetime(series['window'])
+    series['top_lemmas'] = series['top_lemmas'].fillna('')
+    labels = sorted(column for column in series.columns if column.startswith('entities_'))
+    series[labels] = series[labels].fillna(0).astype(np.int64)
+    return series[SERIES_COLUMNS + labels].sort_values('window', kind='stable').reset_index(drop=True)
+
+
+def lemma_trends(series: pd.DataFrame, n: int = 5) -> pd.DataFrame:
+    """
+    Counts of the overall most listed lemmas in every window.
+
+    Counts come from the top_lemmas column, so a lemma outside the top of
+    a window counts 0 there.
+
+    Args:
+        series: Time series table (see WindowAggregator.to_frame)
+        n: Number of lemmas
+
+    Returns:
+        DataFrame indexed by window with one column per lemma
+    """
+    listed = series['top_lemmas'].str.extractall(r'(?:^|; )(?P<lemma>.+?) \((?P<count>\d+)\)')
+    if listed.empty:
+        return pd.DataFrame(index=series['window'])
+
+    listed['count'] = listed['count'].astype(np.int64)
+    listed['window'] = series['window'].to_numpy()[listed.index.get_level_values(0)]
+    counts = listed.pivot_table(index='window', columns='lemma', values='count', aggfunc='sum', fill_value=0)
+    top = counts.sum().sort_values(ascending=False, kind='stable').index[:n]
+    return counts[top].reindex(series['window'], fill_value=0)
@@ -0,0 +1,509 @@
+"""
+Columnar storage of parsed corpus attributes
+"""
+
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+from spacy.attrs import ORTH, LEMMA, POS, IS_STOP, IS_PUNCT, IS_SPACE, LENGTH
+from spacy.parts_of_speech import IDS as POS_IDS
+from src.counting import LemmaCounter
+
+
+# Columns of Doc.to_array, in this order
+TOKEN_ATTRS = [ORTH, LEMMA, POS, IS_STOP, IS_PUNCT, IS_SPACE, LENGTH]
+
+# Docs collected before their per-doc arrays are merged into one block
+_FLUSH_EVERY = 10000
+
+
+class TokenStore:
+    """
+    Flat NumPy arrays of token and entity attributes for a whole corpus.
+
+    Every token attribute is one array over all tokens of all parsed docs,
+    and offsets[i]:offsets[i + 1] selects the tokens of the i-th doc.
+    Strings (orth, lemma, entity text and label) are stored as spaCy
+    StringStore hashes and only decoded when a result is built.
+
+    When identical texts were parsed once, rows[j] is the position of the
+    doc of the j-th text; per-text results are fanned out through it and
+    word counts weight each doc by the number of texts it stands for.
+    Every doc is used by at least one text.
+    """
+
+    def __init__(self, strings, start_id: int = 0):
+        """
+        Create an empty store.
+
+        Args:
+            strings: spaCy StringStore used to decode hashes (usually nlp.vocab.strings)
+            start_id: text_id of the first text
+        """
+        self.strings = strings
+        self.start_id = start_id
+
+        self.orth = np.zeros(0, dtype=np.uint64)
+        self.lemma = np.zeros(0, dtype=np.uint64)
+        self.pos = np.zeros(0, dtype=np.uint16)
+        self.is_stop = np.zeros(0, dtype=bool)
+        self.is_punct = np.zeros(0, dtype=bool)
+        self.is_space = np.zeros(0, dtype=bool)
+        self.length = np.zeros(0, dtype=np.int32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.num_sentences = np.zeros(0, dtype=np.int32)
+
+        self.ent_doc = np.zeros(0, dtype=np.int64)
+        self.ent_text = np.zeros(0, dtype=np.uint64)
+        self.ent_label = np.zeros(0, dtype=np.uint64)
+        self.ent_start = np.zeros(0, dtype=np.int64)
+        self.ent_end = np.zeros(0, dtype=np.int64)
+
+        # Noun chunks, as token positions within their doc
+        self.chunk_doc = np.zeros(0, dtype=np.int64)
+        self.chunk_start = np.zeros(0, dtype=np.int32)
+        self.chunk_end = np.zeros(0, dtype=np.int32)
+
+        # Doc position of every text (None = one doc per text)
+        self.rows: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_docs(cls, docs: Iterable, strings, start_id: int = 0, sentences: bool = True,
+                  noun_chunks: bool = False) -> "TokenStore":
+        """
+        Build a store from parsed documents.
+
+        Args:
+            docs: Iterable of spaCy Doc objects, in text_id order
+            strings: spaCy StringStore shared with the docs
+            start_id: text_id of the first document
+            sentences: Count sentences (requires sentence boundaries)
+            noun_chunks: Record noun chunks (requires a dependency parse;
+                docs without one have none)
+
+        Returns:
+            TokenStore holding every document
+        """
+        store = cls(strings, start_id)
+        builder = _Builder(store, sentences, noun_chunks)
+
+        for doc in docs:
+            builder.add(doc)
+
+        builder.flush()
+        return store
+
+    def __len__(self) -> int:
+        return self.num_docs if self.rows is None else len(self.rows)
+
+    @property
+    def num_docs(self) -> int:
+        """Number of parsed docs (fewer than texts when duplicates share one)."""
+        return len(self.offsets) - 1
+
+    @property
+    def num_tokens(self) -> int:
+        """Total number of tokens of all texts, duplicates included."""
+        if self.rows is None:
+            return int(self.offsets[-1])
+        return int(np.diff(self.offsets)[self.rows].sum())
+
+    @property
+    def duplicate_ratio(self) -> float:
+        """Fraction of texts that reuse the doc of an identical earlier text."""
+        return 1 - self.num_docs / len(self) if len(self) else 0.0
+
+    def text_ids(self) -> np.ndarray:
+        """text_id of every text in the store."""
+        return np.arange(self.start_id, self.start_id + len(self), dtype=np.int64)
+
+    def token_slice(self, text_id: int) -> slice:
+        """
+        Slice of the token arrays belonging to one text.
+
+        Args:
+            text_id: Identifier of the text
+        """
+        i = text_id - self.start_id
+        if self.rows is not None:
+            i = int(self.rows[i])
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def subset(self, start: int, stop: int, start_id: int = 0) -> "TokenStore":
+        """
+        Store holding texts start:stop (positions, not text_ids), sharing
+        the arrays of this store where possible.
+        
+        Args:
+            start: Position of the first text
+            stop: Position after the last text
+            start_id: text_id of the first text in the new store
+        """
+        if self.rows is not None:
+            return self._take(self.rows[start:stop], start_id)
+
+        part = TokenStore(self.strings, start_id)
+        tokens = slice(int(self.offsets[start]), int(self.offsets[stop]))
+        for column in ('orth', 'lemma', 'pos', 'is_stop', 'is_punct', 'is_space', 'length'):
+            setattr(part, column, getattr(self, column)[tokens])
+        part.offsets = self.offsets[start:stop + 1] - self.offsets[start]
+        part.num_sentences = self.num_sentences[start:stop]
+        
+        # Entities are stored in document order
+        ent_start, ent_stop = np.searchsorted(self.ent_doc, [start, stop])
+        ents = slice(int(ent_start), int(ent_stop))
+        part.ent_doc = self.ent_doc[ents] - start
+        for column in ('ent_text', 'ent_label', 'ent_start', 'ent_end'):
+            setattr(part, column, getattr(self, column)[ents])
+        
+        chunk_start, chunk_stop = np.searchsorted(self.chunk_doc, [start, stop])
+        chunks = slice(int(chunk_start), int(chunk_stop))
+        part.chunk_doc = self.chunk_doc[chunks] - start
+        part.chunk_start = self.chunk_start[chunks]
+        part.chunk_end = self.chunk_end[chunks]
+        
+        return part
+
+    def _take(self, positions: np.ndarray, start_id: int) -> "TokenStore":
+        """
+        Store holding the docs at the given positions as its texts, each
+        doc copied once and in order of first use.
+        """
+        unique, first, inverse = np.unique(positions, return_index=True, return_inverse=True)
+        order = np.argsort(first, kind='stable')
+        docs = unique[order]
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+
+        part = TokenStore(self.strings, start_id)
+        lengths = np.diff(self.offsets)[docs]
+        tokens = _gather(self.offsets[docs], lengths)
+        for column in ('orth', 'lemma', 'pos', 'is_stop', 'is_punct', 'is_space', 'length'):
+            setattr(part, column, getattr(self, column)[tokens])
+        part.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        part.num_sentences = self.num_sentences[docs]
+
+        ent_bounds = np.searchsorted(self.ent_doc, np.arange(self.num_docs + 1))
+        ent_counts = np.diff(ent_bounds)[docs]
+        ents = _gather(ent_bounds[docs], ent_counts)
+        part.ent_doc = np.repeat(np.arange(len(docs), dtype=np.int64), ent_counts)
+        for column in ('ent_text', 'ent_label', 'ent_start', 'ent_end'):
+            setattr(part, column, getattr(self, column)[ents])
+
+        chunk_bounds = np.searchsorted(self.chunk_doc, np.arange(self.num_docs + 1))
+        chunk_counts = np.diff(chunk_bounds)[docs]
+        chunks = _gather(chunk_bounds[docs], chunk_counts)
+        part.chunk_doc = np.repeat(np.arange(len(docs), dtype=np.int64), chunk_counts)
+        part.chunk_start = self.chunk_start[chunks]
+        part.chunk_end = self.chunk_end[chunks]
+
+        if len(docs) < len(positions):
+            part.rows = rank[inverse.ravel()]
+        return part
+
+    def token_doc_index(self) -> np.ndarray:
+        """Position (0-based, not text_id) of the doc every token belongs to."""
+        return np.repeat(np.arange(self.num_docs, dtype=np.int64), np.diff(self.offsets))
+
+    def per_doc(self, values: np.ndarray) -> np.ndarray:
+        """
+        Fan a per-doc array out to one value per text.
+
+        Args:
+            values: Array with one value per parsed doc
+        """
+        return values if self.rows is None else values[self.rows]
+
+    def token_weights(self) -> Optional[np.ndarray]:
+        """
+        Number of texts every token stands for, or None when each doc is
+        a single text.
+        """
+        if self.rows is None:
+            return None
+        doc_weights = np.bincount(self.rows, minlength=self.num_docs)
+        return np.repeat(doc_weights, np.diff(self.offsets))
+
+    def per_text_sum(self, values: np.ndarray) -> np.ndarray:
+        """
+        Sum a per-token array over the tokens of each text.
+
+        Args:
+            values: Array aligned with the token arrays
+
+        Returns:
+            Array with one sum per text
+        """
+        totals = np.concatenate([[0], np.cumsum(values, dtype=np.int64)])
+        return self.per_doc(totals[self.offsets[1:]] - totals[self.offsets[:-1]])
+
+    def content_mask(self, pos_filter: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Tokens counted as words: not stop words, punctuation or spaces,
+        optionally restricted to some POS tags.
+
+        Args:
+            pos_filter: List of POS tags to keep (e.g., ['NOUN', 'VERB'])
+        """
+        mask = ~(self.is_stop | self.is_punct | self.is_space)
+        if pos_filter is not None:
+            pos_ids = [POS_IDS[tag] for tag in pos_filter if tag in POS_IDS]
+            mask &= np.isin(self.pos, pos_ids)
+        return mask
+
+    def statistics(self, with_entities: bool = True) -> pd.DataFrame:
+        """
+        Per-text statistics, as returned by TextAnalyzer.get_sentiment_statistics.
+
+        Args:
+            with_entities: Include the 'num_entities' column
+        """
+        not_space = ~self.is_space
+        num_tokens = self.per_text_sum(not_space)
+        total_length = self.per_text_sum(np.where(not_space, self.length, 0))
+
+        stats = {
+            'text_id': self.text_ids(),
+            'num_tokens': num_tokens,
+            'num_sentences': self.per_doc(self.num_sentences).astype(np.int64),
+        }
+        if with_entities:
+            stats['num_entities'] = self.per_doc(np.bincount(self.ent_doc, minlength=self.num_docs)).astype(np.int64)
+        stats['avg_word_length'] = total_length / np.maximum(num_tokens, 1)
+
+        return pd.DataFrame(stats)
+
+    def entities(self) -> pd.DataFrame:
+        """
+        One row per entity, as returned by TextAnalyzer.extract_entities.
+        """
+        if len(self.ent_doc) == 0:
+            return pd.DataFrame()
+
+        text_index, ents = self.entity_index()
+        return pd.DataFrame({
+            'text_id': text_index + self.start_id,
+            'entity': self.decode(self.ent_text[ents]),
+            'label': self.decode(self.ent_label[ents]),
+            'start': self.ent_start[ents],
+            'end': self.ent_end[ents],
+        })
+
+    def entity_index(self):
+        """
+        Entity rows in text order.
+
+        Returns:
+            Tuple of (position of the text of every entity row, index into
+            the ent_* arrays); entities of a doc shared by several texts
+            are repeated for each of them
+        """
+        if self.rows is None:
+            return self.ent_doc, slice(None)
+
+        ent_bounds = np.searchsorted(self.ent_doc, np.arange(self.num_docs + 1))
+        ent_counts = np.diff(ent_bounds)[self.rows]
+        ents = _gather(ent_bounds[self.rows], ent_counts)
+        text_index = np.repeat(np.arange(len(self), dtype=np.int64), ent_counts)
+        return text_index, ents
+
+    def token_index(self, texts: np.ndarray):
+        """
+        Tokens of some texts, in text order.
+
+        Args:
+            texts: Positions (0-based, not text_id) of the texts
+
+        Returns:
+            Tuple of (index into texts of every token, index into the
+            token arrays); tokens of a doc shared by several of the texts
+            are repeated for each of them
+        """
+        docs = texts if self.rows is None else self.rows[texts]
+        lengths = np.diff(self.offsets)[docs]
+        return np.repeat(np.arange(len(texts), dtype=np.int64), lengths), _gather(self.offsets[docs], lengths)
+
+    def noun_chunk_index(self):
+        """
+        Tokens of every noun chunk.
+
+        Returns:
+            Tuple of (position of the chunk of every token, index into the
+            token arrays), in chunk order
+        """
+        lengths = (self.chunk_end - self.chunk_start).astype(np.int64)
+        tokens = _gather(self.offsets[self.chunk_doc] + self.chunk_start, lengths)
+        return np.repeat(np.arange(len(lengths), dtype=np.int64), lengths), tokens
+
+    def lowercase_lemmas(self) -> np.ndarray:
+        """Hashes of the lowercased lemma of every token, lowercasing each distinct lemma once."""
+        unique, inverse = np.unique(self.lemma, return_inverse=True)
+        lowered = np.array([self.strings.add(self.strings[lemma].lower()) if lemma else 0
+                            for lemma in unique.tolist()], dtype=np.uint64)
+        return lowered[inverse.ravel()]
+
+    def word_counts(self, pos_filter: Optional[List[str]] = None, capacity: Optional[int] = None) -> LemmaCounter:
+        """
+        Counts of lowercased lemmas of content words.
+
+        Args:
+            pos_filter: List of POS tags to filter (e.g., ['NOUN', 'VERB'])
+            capacity: Approximate number of lemmas to keep (None counts exactly)
+
+        Returns:
+            LemmaCounter of lowercased lemmas
+        """
+        counter = LemmaCounter(self.strings, capacity)
+        mask = self.content_mask(pos_filter)
+        # Each doc counts once for every text it stands for
+        weights = self.token_weights()
+        counter.update_hashes(self.lemma[mask], None if weights is None else weights[mask])
+        return counter
+
+    def summaries(self) -> Iterable[Dict]:
+        """
+        Yield the per-text dictionaries returned by TextAnalyzer.analyze_batch
+        (without the 'text' key).
+        """
+        ent_bounds = np.searchsorted(self.ent_doc, np.arange(self.num_docs + 1))
+        noun, verb, adj = POS_IDS['NOUN'], POS_IDS['VERB'], POS_IDS['ADJ']
+        positions = self.per_doc(np.arange(self.num_docs))
+
+        for i in positions.tolist():
+            tokens = slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+            ents = slice(int(ent_bounds[i]), int(ent_bounds[i + 1]))
+            pos = self.pos[tokens]
+            orth = self.orth[tokens]
+
+            yield {
+                'num_tokens': int((~self.is_space[tokens]).sum()),
+                'num_sentences': int(self.num_sentences[i]),
+                'entities': list(zip(self.decode(self.ent_text[ents]), self.decode(self.ent_label[ents]))),
+                'nouns': self.decode(orth[pos == noun]),
+                'verbs': self.decode(orth[pos == verb]),
+                'adjectives': self.decode(orth[pos == adj]),
+            }
+
+    def decode(self, hashes: np.ndarray) -> List[str]:
+        """
+        Decode an array of string hashes, looking up each distinct hash once.
+
+        Args:
+            hashes: Array of StringStore hashes
+        """
+        return decode_hashes(self.strings, hashes)
+
+
+def decode_hashes(strings, hashes: np.ndarray) -> List[str]:
+    """
+    Decode an array of StringStore hashes, looking up each distinct hash once.
+
+    Args:
+        strings: spaCy StringStore the hashes belong to
+        hashes: Array of hashes
+    """
+    if len(hashes) == 0:
+        return []
+
+    unique, inverse = np.unique(hashes, return_inverse=True)
+    decoded = np.array([strings[key] for key in unique.tolist()], dtype=object)
+    return decoded[inverse.ravel()].tolist()
+
+
+def _gather(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Indices of the concatenated ranges starts[k]:starts[k] + lengths[k]."""
+    ends = np.cumsum(lengths)
+    return np.repeat(starts - (ends - lengths), lengths) + np.arange(ends[-1] if len(ends) else 0)
+
+
+class _Builder:
+    """Accumulates per-doc arrays in blocks and concatenates them once at the end."""
+
+    _COLUMNS = ['orth', 'lemma', 'pos', 'is_stop', 'is_punct', 'is_space', 'length',
+                'num_sentences', 'doc_lengths', 'ent_doc', 'ent_text', 'ent_label',
+                'ent_start', 'ent_end', 'chunk_doc', 'chunk_start', 'chunk_end']
+
+    def __init__(self, store: TokenStore, sentences: bool, noun_chunks: bool = False):
+        self.store = store
+        self.sentences = sentences
+        self.noun_chunks = noun_chunks
+        self.blocks = {column: [] for column in self._COLUMNS}
+        self.num_docs = 0
+        self._reset_pending()
+
+    def _reset_pending(self):
+        self.token_arrays = []
+        self.doc_lengths = []
+        self.sentence_counts = []
+        self.ents = []
+        self.chunks = []
+
+    def add(self, doc):
+        strings = self.store.strings
+
+        self.token_arrays.append(doc.to_array(TOKEN_ATTRS).reshape(-1, len(TOKEN_ATTRS)))
+        self.doc_lengths.append(len(doc))
+        self.sentence_counts.append(sum(1 for _ in doc.sents) if self.sentences else 0)
+        for ent in doc.ents:
+            self.ents.append((self.num_docs, strings.add(ent.text), ent.label,
+                              ent.start_char, ent.end_char))
+        if self.noun_chunks and doc.has_annotation("DEP"):
+            try:
+                for chunk in doc.noun_chunks:
+                    self.chunks.append((self.num_docs, chunk.start, chunk.end))
+            except NotImplementedError:
+                # The language has no noun chunk rules
+                self.noun_chunks = False
+
+        self.num_docs += 1
+        if len(self.doc_lengths) >= _FLUSH_EVERY:
+            self._close_block()
+
+    def _close_block(self):
+        """Turn the pending per-doc data into one typed block per column."""
+        if not self.doc_lengths:
+            return
+
+        tokens = np.concatenate(self.token_arrays)
+        blocks = self.blocks
+        blocks['orth'].append(tokens[:, 0].copy())
+        blocks['lemma'].append(tokens[:, 1].copy())
+        blocks['pos'].append(tokens[:, 2].astype(np.uint16))
+        blocks['is_stop'].append(tokens[:, 3].astype(bool))
+        blocks['is_punct'].append(tokens[:, 4].astype(bool))
+        blocks['is_space'].append(tokens[:, 5].astype(bool))
+        blocks['length'].append(tokens[:, 6].astype(np.int32))
+        blocks['num_sentences'].append(np.array(self.sentence_counts, dtype=np.int32))
+        blocks['doc_lengths'].append(np.array(self.doc_lengths, dtype=np.int64))
+
+        if self.ents:
+            ents = np.array(self.ents, dtype=np.uint64)
+            blocks['ent_doc'].append(ents[:, 0].astype(np.int64))
+            blocks['ent_text'].append(ents[:, 1])
+            blocks['ent_label'].append(ents[:, 2])
+            blocks['ent_start'].append(ents[:, 3].astype(np.int64))
+            blocks['ent_end'].append(ents[:, 4].astype(np.int64))
+
+        if self.chunks:
+            chunks = np.array(self.chunks, dtype=np.int64)
+            blocks['chunk_doc'].append(chunks[:, 0])
+            blocks['chunk_start'].append(chunks[:, 1].astype(np.int32))
+            blocks['chunk_end'].append(chunks[:, 2].astype(np.int32))
+
+        self._reset_pending()
+
+    def flush(self):
+        """Concatenate all blocks into the store's arrays."""
+        self._close_block()
+        store = self.store
+
+        for column, blocks in self.blocks.items():
+            if not blocks:
+                continue
+            if column == 'doc_lengths':
+                lengths = np.concatenate(blocks)
+                store.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+            else:
+                setattr(store, column, np.concatenate(blocks))
+
+        self.blocks = {column: [] for column in self._COLUMNS}
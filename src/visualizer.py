@@ -2,18 +2,66 @@
 Visualization utilities for text analysis results
 """
 
-import matplotlib.pyplot as plt
-import seaborn as sns
+import os
+import json
+import pickle
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
 import pandas as pd
-from wordcloud import WordCloud
-from typing import List, Tuple
 import config
+from src import metrics
 
 
-# Set style
-sns.set_style("whitegrid")
-plt.rcParams['figure.figsize'] = config.FIGURE_SIZE
-plt.rcParams['figure.dpi'] = config.DPI
+# matplotlib, seaborn and wordcloud are imported on first use, so that
+# runs that skip plotting never load them
+_style_applied = False
+
+# How analyze.py renders its plots
+PLOT_MODES = ('parallel', 'serial', 'defer', 'skip')
+
+
+class PlotJob(NamedTuple):
+    """A plot to render: plot function, its arguments and the output filename."""
+    function: Callable
+    args: Tuple
+    filename: str
+
+
+def apply_style():
+    """Set the seaborn style and the configured figure defaults (once per process)."""
+    global _style_applied
+    if _style_applied:
+        return
+    
+    import matplotlib
+    import seaborn as sns
+    
+    sns.set_style("whitegrid")
+    matplotlib.rcParams['figure.figsize'] = config.FIGURE_SIZE
+    matplotlib.rcParams['figure.dpi'] = config.DPI
+    _style_applied = True
+
+
+def new_figure(figsize: Tuple[float, float] = None):
+    """
+    Create a figure drawn by the non-GUI Agg canvas, outside pyplot's
+    global figure registry.
+    
+    Args:
+        figsize: Figure size in inches (uses config default if None)
+        
+    Returns:
+        matplotlib Figure
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    
+    apply_style()
+    fig = Figure(figsize=figsize or config.FIGURE_SIZE)
+    FigureCanvasAgg(fig)
+    return fig
 
 
 def plot_word_frequency(word_counts: List[Tuple[str, int]], title: str = "Most Frequent Words", top_n: int = 20):
@@ -27,63 +75,115 @@ def plot_word_frequency(word_counts: List[Tuple[str, int]], title: str = "Most F
     """
     words, counts = zip(*word_counts[:top_n])
     
-    plt.figure(figsize=config.FIGURE_SIZE)
-    plt.barh(range(len(words)), counts)
-    plt.yticks(range(len(words)), words)
-    plt.xlabel('Frequency')
-    plt.title(title)
-    plt.gca().invert_yaxis()
-    plt.tight_layout()
+    fig = new_figure()
+    ax = fig.subplots()
+    ax.barh(range(len(words)), counts)
+    ax.set_yticks(range(len(words)), words)
+    ax.set_xlabel('Frequency')
+    ax.set_title(title)
+    ax.invert_yaxis()
+    fig.tight_layout()
     
-    return plt.gcf()
+    return fig
 
 
-def create_wordcloud(word_counts: List[Tuple[str, int]], title: str = "Word Cloud"):
+def create_wordcloud(word_counts: List[Tuple[str, int]], title: str = "Word Cloud", preview: bool = False):
     """
     Create a word cloud from word frequencies.
     
     Args:
         word_counts: List of (word, count) tuples
         title: Plot title
+        preview: Smaller canvas and fewer words (see wordcloud_image)
+    """
+    wordcloud = wordcloud_image(word_counts, preview)
+    
+    figsize = config.FIGURE_SIZE
+    if preview:
+        figsize = tuple(size * config.WORDCLOUD_PREVIEW_SCALE for size in figsize)
+    
+    fig = new_figure(figsize)
+    ax = fig.subplots()
+    ax.imshow(wordcloud, interpolation='bilinear')
+    ax.axis('off')
+    ax.set_title(title, fontsize=16)
+    fig.tight_layout()
+    
+    return fig
+
+
+def wordcloud_image(word_counts: List[Tuple[str, int]], preview: bool = False):
+    """
+    Lay out a word cloud without matplotlib.
+    
+    The layout (position, size, orientation and color of every word) is
+    the slow part of a word cloud; it is stored in CACHE_DIR/wordcloud,
+    keyed by the frequencies and the settings, and reused when the same
+    word cloud is requested again. The returned object can be saved
+    directly with save_plot / render_plots, which write it with
+    WordCloud.to_file instead of drawing it in a figure.
+    
+    Args:
+        word_counts: List of (word, count) tuples
+        preview: Use a canvas scaled by WORDCLOUD_PREVIEW_SCALE and at
+            most WORDCLOUD_PREVIEW_MAX_WORDS words
+        
+    Returns:
+        wordcloud.WordCloud with its layout computed
     """
+    from wordcloud import WordCloud
+    
+    settings = _wordcloud_settings(preview)
     word_freq = dict(word_counts)
+    wordcloud = WordCloud(**settings)
+    
+    cache_path = _wordcloud_cache_path(word_freq, settings) if config.WORDCLOUD_CACHE else None
+    if cache_path is not None and os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            wordcloud.words_, wordcloud.layout_ = pickle.load(f)
+        return wordcloud
     
-    wordcloud = WordCloud(width=800, height=400, 
-                         background_color='white',
-                         colormap='viridis').generate_from_frequencies(word_freq)
+    wordcloud.generate_from_frequencies(word_freq)
     
-    plt.figure(figsize=config.FIGURE_SIZE)
-    plt.imshow(wordcloud, interpolation='bilinear')
-    plt.axis('off')
-    plt.title(title, fontsize=16)
-    plt.tight_layout()
+    if cache_path is not None:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump((wordcloud.words_, wordcloud.layout_), f)
+        os.replace(temp_path, cache_path)
     
-    return plt.gcf()
+    return wordcloud
 
 
-def plot_entity_distribution(entities_df: pd.DataFrame, title: str = "Named Entity Distribution"):
+def plot_entity_distribution(entities_df, title: str = "Named Entity Distribution"):
     """
     Plot distribution of named entity types.
     
     Args:
-        entities_df: DataFrame with entity information
+        entities_df: DataFrame with entity information, or a Series of
+            entity counts per label (e.g. EntityBuffer.label_counts)
         title: Plot title
     """
     if entities_df.empty:
         print("No entities found to plot")
         return None
     
-    entity_counts = entities_df['label'].value_counts()
+    if isinstance(entities_df, pd.DataFrame):
+        entity_counts = entities_df['label'].value_counts()
+    else:
+        entity_counts = entities_df
     
-    plt.figure(figsize=config.FIGURE_SIZE)
-    entity_counts.plot(kind='bar')
-    plt.xlabel('Entity Type')
-    plt.ylabel('Count')
-    plt.title(title)
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
+    fig = new_figure()
+    ax = fig.subplots()
+    ax.bar(range(len(entity_counts)), entity_counts.values, width=0.5)
+    ax.set_xticks(range(len(entity_counts)), entity_counts.index.astype(str),
+                  rotation=45, ha='right')
+    ax.set_xlabel('Entity Type')
+    ax.set_ylabel('Count')
+    ax.set_title(title)
+    fig.tight_layout()
     
-    return plt.gcf()
+    return fig
 
 
 def plot_text_statistics(stats_df: pd.DataFrame, column: str = 'num_tokens', title: str = None):
@@ -98,14 +198,15 @@ def plot_text_statistics(stats_df: pd.DataFrame, column: str = 'num_tokens', tit
     if title is None:
         title = f"Distribution of {column.replace('_', ' ').title()}"
     
-    plt.figure(figsize=config.FIGURE_SIZE)
-    plt.hist(stats_df[column], bins=30, edgecolor='black', alpha=0.7)
-    plt.xlabel(column.replace('_', ' ').title())
-    plt.ylabel('Frequency')
-    plt.title(title)
-    plt.tight_layout()
+    fig = new_figure()
+    ax = fig.subplots()
+    ax.hist(stats_df[column], bins=30, edgecolor='black', alpha=0.7)
+    ax.set_xlabel(column.replace('_', ' ').title())
+    ax.set_ylabel('Frequency')
+    ax.set_title(title)
+    fig.tight_layout()
     
-    return plt.gcf()
+    return fig
 
 
 def plot_multiple_statistics(stats_df: pd.DataFrame):
@@ -115,7 +216,8 @@ def plot_multiple_statistics(stats_df: pd.DataFrame):
     Args:
         stats_df: DataFrame with text statistics
     """
-    fig, axes = plt.subplots(2, 2, figsize=(15, 10))
+    fig = new_figure(figsize=(15, 10))
+    axes = fig.subplots(2, 2)
     
     # Number of tokens
     axes[0, 0].hist(stats_df['num_tokens'], bins=30, edgecolor='black', alpha=0.7)
@@ -129,10 +231,14 @@ def plot_multiple_statistics(stats_df: pd.DataFrame):
     axes[0, 1].set_ylabel('Frequency')
     axes[0, 1].set_title('Sentence Distribution')
     
-    # Number of entities
-    axes[1, 0].hist(stats_df['num_entities'], bins=30, edgecolor='black', alpha=0.7, color='orange')
-    axes[1, 0].set_xlabel('Number of Entities')
-    axes[1, 0].set_ylabel('Frequency')
+    # Number of entities (not computed by fast statistics)
+    if 'num_entities' in stats_df.columns:
+        axes[1, 0].hist(stats_df['num_entities'], bins=30, edgecolor='black', alpha=0.7, color='orange')
+        axes[1, 0].set_xlabel('Number of Entities')
+        axes[1, 0].set_ylabel('Frequency')
+    else:
+        axes[1, 0].text(0.5, 0.5, 'Not computed', ha='center', va='center')
+        axes[1, 0].set_axis_off()
     axes[1, 0].set_title('Entity Count Distribution')
     
     # Average word length
@@ -141,25 +247,229 @@ def plot_multiple_statistics(stats_df: pd.DataFrame):
     axes[1, 1].set_ylabel('Frequency')
     axes[1, 1].set_title('Word Length Distribution')
     
-    plt.tight_layout()
+    fig.tight_layout()
     
     return fig
 
 
-def save_plot(fig, filename: str, output_dir: str = None):
+def plot_time_series(series_df: pd.DataFrame, title: str = "Responses over Time"):
     """
-    Save a plot to file.
+    Create a multi-panel plot of per-window trends.
+    
+    Args:
+        series_df: Time series table (see WindowAggregator.to_frame)
+        title: Figure title
+    """
+    from src.time_windows import lemma_trends
+    
+    if series_df.empty:
+        print("No time windows to plot")
+        return None
+    
+    windows = pd.to_datetime(series_df['window'])
+    fig = new_figure(figsize=(15, 10))
+    axes = fig.subplots(2, 2, sharex=True)
+    
+    # Responses per window
+    axes[0, 0].plot(windows, series_df['responses'], marker='o')
+    axes[0, 0].set_ylabel('Responses')
+    axes[0, 0].set_title('Responses per Window')
+    
+    # Average length
+    axes[0, 1].plot(windows, series_df['avg_tokens'], marker='o', color='green')
+    axes[0, 1].set_ylabel('Tokens')
+    axes[0, 1].set_title('Average Tokens per Response')
+    
+    # Entities per label
+    labels = [column for column in series_df.columns if column.startswith('entities_')]
+    for column in labels:
+        axes[1, 0].plot(windows, series_df[column], marker='o', label=column[len('entities_'):])
+    if labels:
+        axes[1, 0].legend()
+    axes[1, 0].set_ylabel('Count')
+    axes[1, 0].set_title('Entities per Window')
+    
+    # Top lemmas of the whole period
+    trends = lemma_trends(series_df)
+    for lemma in trends.columns:
+        axes[1, 1].plot(windows, trends[lemma].to_numpy(), marker='o', label=lemma)
+    if len(trends.columns):
+        axes[1, 1].legend()
+    axes[1, 1].set_ylabel('Count')
+    axes[1, 1].set_title('Top Lemmas per Window')
+    
+    for ax in axes[1]:
+        ax.tick_params(axis='x', labelrotation=45)
+    fig.suptitle(title)
+    fig.tight_layout()
+    
+    return fig
+
+
+def close_figure(fig):
+    """
+    Release the memory held by a figure.
     
     Args:
         fig: Matplotlib figure
+    """
+    if not hasattr(fig, 'canvas'):
+        # Word cloud image: nothing held outside the object itself
+        return
+    if fig.canvas.manager is not None:
+        # Figure created through pyplot: drop it from the global registry too
+        import matplotlib.pyplot as plt
+        plt.close(fig)
+    else:
+        fig.clear()
+
+
+def save_plot(fig, filename: str, output_dir: str = None, close: bool = True) -> str:
+    """
+    Save a plot to file.
+    
+    Args:
+        fig: Matplotlib figure, or a WordCloud from wordcloud_image
         filename: Output filename (without extension)
         output_dir: Output directory (uses config default if None)
+        close: Release the figure after saving it
+    
+    Returns:
+        Path of the saved image
+    """
+    output_path = _write_figure(fig, filename, output_dir, close)
+    print(f"Plot saved to: {output_path}")
+    return output_path
+
+
+def render_plots(jobs: List[PlotJob], output_dir: str = None, parallel: bool = True,
+                 workers: int = None) -> List[str]:
+    """
+    Render and save independent plots, in a process pool if requested.
+    
+    Args:
+        jobs: Plots to render
+        output_dir: Output directory (uses config default if None)
+        parallel: Render each plot in its own worker process
+        workers: Maximum number of worker processes (uses config default if None)
+    
+    Returns:
+        Paths of the saved images, in job order (plots returning no figure are skipped)
+    """
+    if output_dir is None:
+        output_dir = config.OUTPUT_DIR
+    if workers is None:
+        workers = config.PLOT_WORKERS or os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+    
+    with metrics.stage('render_plots') as counts:
+        if parallel and workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                paths = list(pool.map(_render_job, jobs, [output_dir] * len(jobs)))
+        else:
+            paths = [_render_job(job, output_dir) for job in jobs]
+        counts['plots'] = len(jobs)
+    
+    for path in paths:
+        if path is not None:
+            print(f"Plot saved to: {path}")
+    
+    return [path for path in paths if path is not None]
+
+
+def save_plot_jobs(jobs: List[PlotJob], filename: str, output_dir: str = None) -> str:
+    """
+    Store plots to be rendered later with `python -m src.visualizer FILE`.
+    
+    Args:
+        jobs: Plots to render
+        filename: Output filename (without extension)
+        output_dir: Output directory for the job file and the images (uses config default if None)
+    
+    Returns:
+        Path of the job file
     """
-    import os
+    if output_dir is None:
+        output_dir = config.OUTPUT_DIR
+    
+    path = os.path.join(output_dir, f"{filename}.pkl")
+    with open(path, 'wb') as f:
+        pickle.dump({'output_dir': output_dir, 'jobs': list(jobs)}, f)
     
+    print(f"Plot jobs saved to: {path}")
+    return path
+
+
+def load_plot_jobs(path: str) -> Dict:
+    """
+    Load plots stored by save_plot_jobs.
+    
+    Args:
+        path: Path of the job file
+    
+    Returns:
+        Dictionary with 'output_dir' and 'jobs'
+    """
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _render_job(job: PlotJob, output_dir: str) -> Optional[str]:
+    """Render one plot and save it, returning the image path."""
+    fig = job.function(*job.args)
+    if fig is None:
+        return None
+    return _write_figure(fig, job.filename, output_dir, close=True)
+
+
+def _write_figure(fig, filename: str, output_dir: str = None, close: bool = True) -> str:
+    """Write a figure as PNG, optionally releasing it."""
     if output_dir is None:
         output_dir = config.OUTPUT_DIR
     
     output_path = os.path.join(output_dir, f"{filename}.png")
-    fig.savefig(output_path, bbox_inches='tight', dpi=config.DPI)
-    print(f"Plot saved to: {output_path}")
+    if hasattr(fig, 'to_file'):
+        # Word cloud image, written by PIL at its own resolution
+        fig.to_file(output_path)
+    else:
+        fig.savefig(output_path, bbox_inches='tight', dpi=config.DPI)
+    if close:
+        close_figure(fig)
+    return output_path
+
+
+def _wordcloud_settings(preview: bool) -> Dict:
+    """WordCloud arguments for a full-size or preview word cloud."""
+    scale = config.WORDCLOUD_PREVIEW_SCALE if preview else 1
+    width, height = config.WORDCLOUD_SIZE
+    return {
+        'width': int(width * scale),
+        'height': int(height * scale),
+        'max_words': config.WORDCLOUD_PREVIEW_MAX_WORDS if preview else config.WORDCLOUD_MAX_WORDS,
+        'background_color': 'white',
+        'colormap': 'viridis',
+    }
+
+
+def _wordcloud_cache_path(word_freq: Dict[str, int], settings: Dict) -> str:
+    """Cache file of the layout for these frequencies and settings."""
+    import wordcloud
+    
+    key = json.dumps([wordcloud.__version__, settings, sorted(word_freq.items())], ensure_ascii=False)
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(config.CACHE_DIR, "wordcloud", f"{digest}.pkl")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render plots deferred by analyze.py --plots defer")
+    parser.add_argument("job_file", help="Path to the .pkl file written by analyze.py")
+    parser.add_argument("--output-dir", help="Directory for the images (default: the one stored in the job file)")
+    parser.add_argument("--serial", action="store_true", help="Render in this process instead of a process pool")
+    parser.add_argument("--workers", "-w", type=int, default=None, help="Maximum number of worker processes")
+    
+    args = parser.parse_args()
+    
+    stored = load_plot_jobs(args.job_file)
+    output_dir = args.output_dir or stored['output_dir']
+    os.makedirs(output_dir, exist_ok=True)
+    render_plots(stored['jobs'], output_dir, parallel=not args.serial, workers=args.workers)
@@ -22,6 +22,18 @@ def test_project_structure():
         'src/data_loader.py',
         'src/text_analyzer.py',
         'src/visualizer.py',
+        'src/doc_cache.py',
+        'src/incremental.py',
+        'src/token_store.py',
+        'src/counting.py',
+        'src/metrics.py',
+        'src/server.py',
+        'src/batch_runner.py',
+        'src/entity_buffer.py',
+        'src/ngrams.py',
+        'src/keywords.py',
+        'src/embeddings.py',
+        'src/time_windows.py',
         'data/ejemplo_formulario.csv',
         'notebooks/analisis_interactivo.ipynb',
     ]
@@ -101,6 +113,20 @@ def test_python_syntax():
         'src/data_loader.py',
         'src/text_analyzer.py',
         'src/visualizer.py',
+        'src/doc_cache.py',
+        'src/incremental.py',
+        'src/token_store.py',
+        'src/counting.py',
+        'src/metrics.py',
+        'src/server.py',
+        'src/batch_runner.py',
+        'src/entity_buffer.py',
+        'src/ngrams.py',
+        'src/keywords.py',
+        'src/embeddings.py',
+        'src/time_windows.py',
+        'benchmarks/bench_clean_text.py',
+        'benchmarks/bench_pipeline.py',
     ]
     
     import py_compile
@@ -144,6 +170,315 @@ def test_data_file():
         return False
 
 
+def test_day_first_time_windows():
+    """Test that dd/mm/yyyy timestamps go to the right windows in every chunk"""
+    print("\nTesting day-first time windows...")
+    
+    import spacy
+    import pandas as pd
+    from src.token_store import TokenStore
+    from src.time_windows import WindowAggregator
+    
+    nlp = spacy.blank('es')
+    nlp.add_pipe('sentencizer')
+    
+    # The first chunk alone is ambiguous (day <= 12) and read month first by pandas
+    chunks = [['01/02/2024 10:00:00', '03/02/2024 11:00:00'],
+              ['05/02/2024 09:00:00', '20/02/2024 12:00:00']]
+    windows = WindowAggregator('day', keep=30)
+    for timestamps in chunks:
+        store = TokenStore.from_docs(nlp.pipe(["Hola mundo."] * len(timestamps)), nlp.vocab.strings)
+        windows.add(store, pd.Series(timestamps))
+    
+    days = windows.to_frame()['window'].dt.strftime('%Y-%m-%d').tolist()
+    expected = ['2024-02-01', '2024-02-03', '2024-02-05', '2024-02-20']
+    assert days == expected, f"Windows {days}, expected {expected}"
+    assert windows.missing == 0 and windows.late == 0, "Timestamps were dropped"
+    
+    print(f"✓ Day-first timestamps read as {windows.timestamp_format}")
+    return True
+
+
+def test_near_duplicates_with_clusters():
+    """Test that --near-duplicates and --clusters run together"""
+    print("\nTesting --near-duplicates flag with --clusters...")
+    
+    import tempfile
+    import contextlib
+    import io
+    import spacy
+    import pandas as pd
+    import config
+    import analyze
+    
+    texts = ["Me gusta mucho la clase de programación",
+             "Me gusta mucho la clase de programacion!",
+             "Las tareas fueron demasiado largas",
+             "El profesor explica muy bien los temas",
+             "Faltó tiempo para el proyecto final",
+             "Las tareas fueron demasiado largas."]
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # A blank pipeline stands in for the Spanish model
+        model_dir = os.path.join(tmp_dir, "model")
+        nlp = spacy.blank('es')
+        nlp.add_pipe('sentencizer')
+        nlp.to_disk(model_dir)
+        input_file = os.path.join(tmp_dir, "respuestas.csv")
+        pd.DataFrame({'Respuesta': texts}).to_csv(input_file, index=False)
+        
+        settings = {'SPACY_MODEL': model_dir, 'OUTPUT_DIR': tmp_dir, 'USE_DOC_CACHE': False}
+        saved = {name: getattr(config, name) for name in settings}
+        for name, value in settings.items():
+            setattr(config, name, value)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                analyze.main(input_file, 'Respuesta', 'test', plots='skip',
+                             near_duplicates='flag', clusters=3)
+        finally:
+            for name, value in saved.items():
+                setattr(config, name, value)
+        
+        clusters = pd.read_csv(os.path.join(tmp_dir, "test_clusters.csv"))
+        duplicates = pd.read_csv(os.path.join(tmp_dir, "test_near_duplicates.csv"))
+    
+    assert len(clusters) == len(texts), f"{len(clusters)} cluster rows for {len(texts)} texts"
+    assert len(duplicates) == 4, f"{len(duplicates)} near-duplicate rows, expected 4"
+    
+    print(f"✓ {len(duplicates)} near-duplicates flagged and {clusters['cluster'].nunique()} clusters found")
+    return True
+
+
+def test_lemma_counter_matches_counter():
+    """Test LemmaCounter against collections.Counter, exact and with a capacity"""
+    print("\nTesting LemmaCounter counts...")
+    
+    import random
+    from collections import Counter
+    import numpy as np
+    import spacy
+    from src.counting import LemmaCounter
+    
+    strings = spacy.blank('es').vocab.strings
+    
+    def hashes(words):
+        return np.array([strings.add(word) for word in words], dtype=np.uint64)
+    
+    # Ties keep the order of first occurrence, also across updates
+    chunks = [['sol', 'luna', 'Mar', 'luna', 'sol'], ['rio', 'mar', 'cielo', 'rio']]
+    counter = LemmaCounter(strings)
+    for chunk in chunks:
+        counter.update_hashes(hashes(chunk))
+    expected = Counter(word.lower() for chunk in chunks for word in chunk).most_common()
+    assert counter.most_common() == expected, f"{counter.most_common()} != {expected}"
+    assert counter.most_common(2) == expected[:2], f"Top 2 {counter.most_common(2)}"
+    
+    # With a capacity, counts are underestimated by at most the error bound
+    random.seed(0)
+    words = [f"w{int(random.paretovariate(1.2))}" for _ in range(20000)]
+    exact = Counter(words)
+    counter = LemmaCounter(strings, capacity=20)
+    for start in range(0, len(words), 1000):
+        counter.update_hashes(hashes(words[start:start + 1000]))
+    assert len(counter) <= 40, f"{len(counter)} entries kept with capacity 20"
+    for word, count in counter.items():
+        assert exact[word] - counter.error <= count <= exact[word], \
+            f"{word}: {count} counted, {exact[word]} true, error {counter.error}"
+    for word, count in exact.items():
+        assert count <= counter.error or word in counter, f"{word} ({count}) dropped, error {counter.error}"
+    
+    print(f"✓ Ties match Counter; pruned counts within error {counter.error}")
+    return True
+
+
+def test_ngram_counts():
+    """Test n-gram counts of a TokenStore against counting windows of the docs"""
+    print("\nTesting n-gram counts...")
+    
+    from collections import Counter
+    import spacy
+    from src.token_store import TokenStore
+    from src.ngrams import count_ngrams
+    
+    nlp = spacy.blank('es')
+    nlp.add_pipe('sentencizer')
+    texts = ["La calidad de vida mejoró en la ciudad.",
+             "Queremos más calidad de vida y desarrollo sostenible.",
+             "El desarrollo sostenible importa, y la calidad de vida también."]
+    docs = list(nlp.pipe(texts))
+    # A blank pipeline has no lemmatizer; use the lowercased text
+    for doc in docs:
+        for token in doc:
+            token.lemma_ = token.lower_
+    
+    store = TokenStore.from_docs(docs, nlp.vocab.strings)
+    counters = count_ngrams(store, sizes=(2, 3))
+    
+    for n in (2, 3):
+        expected = Counter()
+        for doc in docs:
+            for start in range(len(doc) - n + 1):
+                window = doc[start:start + n]
+                if (any(token.is_punct or token.is_space for token in window)
+                        or window[0].is_stop or window[-1].is_stop):
+                    continue
+                expected[' '.join(token.lemma_ for token in window)] += 1
+        counted = counters[f"{n}-grams"].to_counter()
+        assert counted == expected, f"{n}-grams {dict(counted)} != {dict(expected)}"
+    
+    assert counters['3-grams']['calidad de vida'] == 3, "Expected 'calidad de vida' 3 times"
+    assert counters['2-grams'].most_common(1) == [('desarrollo sostenible', 2)], \
+        f"Top 2-gram {counters['2-grams'].most_common(1)}"
+    
+    print(f"✓ {len(counters['2-grams'])} distinct 2-grams and {len(counters['3-grams'])} 3-grams")
+    return True
+
+
+def test_near_duplicate_groups():
+    """Test that MinHash LSH groups known near-duplicates and nothing else"""
+    print("\nTesting near-duplicate groups...")
+    
+    from src.data_loader import near_duplicate_groups
+    
+    texts = ["Me gusta mucho la clase de programación",
+             "Las tareas fueron demasiado largas",
+             "Me gusta mucho la clase de programacion!",
+             "El profesor explica muy bien los temas",
+             "Faltó tiempo para el proyecto final",
+             "Las tareas fueron demasiado largas.",
+             "ME GUSTA MUCHO LA CLASE DE PROGRAMACIÓN"]
+    
+    groups = near_duplicate_groups(texts, threshold=0.8).tolist()
+    expected = [0, 1, 0, 3, 4, 1, 0]
+    assert groups == expected, f"Groups {groups}, expected {expected}"
+    
+    print(f"✓ {len(set(groups))} groups for {len(texts)} texts")
+    return True
+
+
+def test_doc_cache():
+    """Test that DocCache returns stored docs and evicts the least recently used"""
+    print("\nTesting the parsed document cache...")
+    
+    import tempfile
+    import time
+    import spacy
+    from src.doc_cache import DocCache
+    
+    nlp = spacy.blank('es')
+    nlp.add_pipe('sentencizer')
+    texts = [f"Respuesta número {i}. Tiene dos oraciones." for i in range(6)]
+    docs = list(nlp.pipe(texts))
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DocCache(nlp, 'test', cache_dir=tmp_dir)
+        keys = [cache.key(text, nlp.pipe_names) for text in texts]
+        assert len(set(keys)) == len(texts), "Different texts share a cache key"
+        assert cache.key(texts[0], []) != keys[0], "Cache key ignores the pipeline components"
+        
+        cache.put_many(list(zip(keys, docs)))
+        loaded = cache.get_many(keys)
+        assert set(loaded) == set(keys), f"{len(loaded)} of {len(keys)} docs loaded"
+        for key, doc in zip(keys, docs):
+            assert loaded[key].text == doc.text, f"{loaded[key].text!r} != {doc.text!r}"
+            assert len(list(loaded[key].sents)) == 2, "Sentence boundaries were not stored"
+        
+        # Room for about four docs; the docs not used since are evicted first
+        doc_size = cache.total_size / len(texts)
+        cache.clear()
+        cache.close()
+        cache = DocCache(nlp, 'test', cache_dir=tmp_dir, max_size_mb=4.5 * doc_size / 1024 / 1024)
+        for key, doc in zip(keys[:4], docs):
+            cache.put_many([(key, doc)])
+            time.sleep(0.01)
+        cache.get_many([keys[0]])
+        time.sleep(0.01)
+        cache.put_many(list(zip(keys[4:], docs[4:])))
+        kept = cache.contains(keys)
+        cache.close()
+    
+    assert keys[0] in kept, "Recently used doc was evicted"
+    assert keys[1] not in kept, "Least recently used doc was kept"
+    assert set(keys[4:]) <= kept, "Newly stored docs were evicted"
+    
+    print(f"✓ Docs round-trip; {len(kept)} of {len(keys)} kept after eviction")
+    return True
+
+
+def test_incremental_runs():
+    """Test that a second incremental run only analyzes new rows and adds their counts"""
+    print("\nTesting incremental runs...")
+    
+    import tempfile
+    from collections import Counter
+    import pandas as pd
+    import config
+    from src import incremental
+    
+    first = pd.DataFrame({config.ID_COLUMN: [1, 2, 3], 'Respuesta': ["uno", "dos", "tres"]})
+    second = pd.DataFrame({config.ID_COLUMN: [2, 3, 4, 5], 'Respuesta': ["dos", "tres", "cuatro", "cinco"]})
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        saved = config.OUTPUT_DIR
+        config.OUTPUT_DIR = tmp_dir
+        try:
+            state = incremental.load_state('test', 'Respuesta')
+            new_rows = incremental.filter_new_rows(first, state, 'Respuesta')
+            incremental.merge_word_counts(state, {'words': Counter(new_rows['Respuesta'])})
+            incremental.save_state(state, 'test')
+            
+            state = incremental.load_state('test', 'Respuesta')
+            new_rows = incremental.filter_new_rows(second, state, 'Respuesta')
+            counts = incremental.merge_word_counts(state, {'words': Counter(new_rows['Respuesta'])})
+        finally:
+            config.OUTPUT_DIR = saved
+    
+    assert new_rows[config.ID_COLUMN].tolist() == [4, 5], f"New rows {new_rows[config.ID_COLUMN].tolist()}"
+    expected = Counter(["uno", "dos", "tres", "cuatro", "cinco"])
+    assert counts['words'] == expected, f"Merged counts {dict(counts['words'])}"
+    assert len(state['processed_keys']) == 5, f"{len(state['processed_keys'])} processed keys"
+    
+    print(f"✓ Second run analyzed {len(new_rows)} new rows")
+    return True
+
+
+def test_result_writer_round_trip():
+    """Test that ResultWriter pieces with different column types read back as one table"""
+    print("\nTesting Parquet and Feather result files...")
+    
+    import tempfile
+    import pandas as pd
+    import config
+    from src.data_loader import ResultWriter, load_data
+    
+    # The first piece has no entities, so its 'entity' column is all null
+    pieces = [pd.DataFrame({'text_id': [0, 1], 'entity': [None, None], 'start': [None, None]}),
+              pd.DataFrame({'text_id': [2, 3], 'entity': ["Chile", "Santiago"], 'start': [0, 5]})]
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        saved = config.OUTPUT_DIR
+        config.OUTPUT_DIR = tmp_dir
+        try:
+            for export_format in ('parquet', 'feather'):
+                with ResultWriter("test_entities", format=export_format) as writer:
+                    for piece in pieces:
+                        writer.write(piece)
+                
+                result = load_data(writer.path, cache=False)
+                assert result['text_id'].tolist() == [0, 1, 2, 3], \
+                    f"{export_format}: text_id {result['text_id'].tolist()}"
+                assert result['entity'].isna().tolist() == [True, True, False, False], \
+                    f"{export_format}: entity {result['entity'].tolist()}"
+                assert result['entity'].tolist()[2:] == ["Chile", "Santiago"], \
+                    f"{export_format}: entity {result['entity'].tolist()}"
+                assert result['start'].tolist()[2:] == [0, 5], f"{export_format}: start {result['start'].tolist()}"
+        finally:
+            config.OUTPUT_DIR = saved
+    
+    print("✓ Parquet and Feather pieces read back in order")
+    return True
+
+
 def main():
     """Run all tests"""
     print("=" * 60)
@@ -155,11 +490,23 @@ def main():
         test_config,
         test_python_syntax,
         test_data_file,
+        test_day_first_time_windows,
+        test_near_duplicates_with_clusters,
+        test_lemma_counter_matches_counter,
+        test_ngram_counts,
+        test_near_duplicate_groups,
+        test_doc_cache,
+        test_incremental_runs,
+        test_result_writer_round_trip,
     ]
     
     results = []
     for test in tests:
-        results.append(test())
+        try:
+            results.append(test())
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append(False)
     
     print("\n" + "=" * 60)
     if all(results):